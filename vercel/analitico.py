@@ -0,0 +1,381 @@
+import threading
+
+try:
+    import numpy as np
+except ImportError:  # Opcional: sem NumPy as rotas /api/analytics respondem 503
+    np = None
+
+def numpy_disponivel():
+    return np is not None
+
+# ===== CONFIGURAÇÕES =====
+
+SEGUNDOS_GRANULARIDADE = {"minuto": 60, "hora": 3600, "dia": 86400, "semana": 7 * 86400}
+DESLOCAMENTO_GRANULARIDADE = {"semana": 3 * 86400}  # 01/01/1970 foi quinta: semanas começam na segunda
+DIAS_SEMANA = ("seg", "ter", "qua", "qui", "sex", "sab", "dom")
+LIMITES_USO_PADRAO = (1, 2, 3, 5, 10, 20, 50, 100, 200, 500, 1000)  # Faixas de acessos por cartão
+MAX_INTERVALOS_SERIE = 10000  # Intervalos por série antes de exigir granularidade maior
+MAX_TOP_CARTOES = 100
+
+# Opções aceitas por consulta, além de desde/ate/dispositivo/resultado
+CONSULTAS = {
+    "mapa_calor": (),
+    "dispositivos": ("granularidade",),
+    "cartoes": ("limites", "top")
+}
+
+# ===== CONVERSÃO =====
+
+def segundos(timestamp):
+    """Timestamp ISO (horário local, sem fuso) em segundos; ValueError se inválido."""
+    instante = np.datetime64(timestamp[:19], 's')
+    if np.isnat(instante):
+        raise ValueError(f"timestamp inválido: {timestamp}")
+    return int(instante.astype(np.int64))
+
+def _segundos_vetor(timestamps):
+    """Segundos de cada timestamp; os inválidos ficam como NaT (mínimo do int64)."""
+    try:
+        return np.array([timestamp[:19] for timestamp in timestamps], dtype='datetime64[s]').astype(np.int64)
+    except (TypeError, ValueError):
+        valores = np.empty(len(timestamps), np.int64)
+        for posicao, timestamp in enumerate(timestamps):
+            try:
+                valores[posicao] = np.datetime64(timestamp[:19], 's').astype(np.int64)
+            except (TypeError, ValueError):
+                valores[posicao] = np.iinfo(np.int64).min
+        return valores
+
+class _Codigos:
+    """Nomes internados como códigos inteiros sequenciais."""
+
+    def __init__(self):
+        self.codigos = {}
+        self.nomes = []
+
+    def codigo(self, nome):
+        codigo = self.codigos.get(nome)
+        if codigo is None:
+            codigo = self.codigos[nome] = len(self.nomes)
+            self.nomes.append(nome)
+        return codigo
+
+# ===== HISTÓRICO EM COLUNAS =====
+
+class ColunasAcessos:
+    """Histórico completo de acessos em colunas NumPy, para agregações vetorizadas.
+
+    Uma linha por acesso: instante (int64, segundos do horário local), e
+    cartão, dispositivo e resultado como códigos inteiros. As colunas
+    crescem por duplicação e ficam ordenadas por instante; um acesso fora
+    de ordem (lote remoto atrasado) só marca a ordenação como pendente,
+    refeita na próxima consulta.
+
+    A versão de um período é (geração, linhas no período): linhas nunca
+    são removidas, então ela só muda quando entra um acesso no período ou
+    a ordenação é refeita, e serve de chave para o cache de resultados.
+    """
+
+    NOMES_COLUNAS = ("_ts", "_uid", "_disp", "_res")
+    TIPOS_COLUNAS = ("int64", "int32", "int32", "int16")
+
+    def __init__(self, capacidade=1024):
+        self._lock = threading.Lock()
+        self._n = 0
+        self._ts = np.empty(capacidade, np.int64)
+        self._uid = np.empty(capacidade, np.int32)
+        self._disp = np.empty(capacidade, np.int32)
+        self._res = np.empty(capacidade, np.int16)
+        self._uids = _Codigos()
+        self._dispositivos = _Codigos()
+        self._resultados = _Codigos()
+        self._ordenado = True
+        self._pendentes = None
+        self.geracao = 0
+        self.pronto = False
+
+    # ----- Escrita -----
+
+    def _garantir_capacidade(self, extra):
+        """Realoca as colunas se necessário (chamado com o lock adquirido).
+
+        Colunas novas em vez de redimensionar no lugar: fatias entregues a
+        consultas em andamento continuam válidas.
+        """
+        necessario = self._n + extra
+        capacidade = len(self._ts)
+        if necessario <= capacidade:
+            return
+        capacidade = max(capacidade * 2, necessario)
+        for nome, tipo in zip(self.NOMES_COLUNAS, self.TIPOS_COLUNAS):
+            nova = np.empty(capacidade, tipo)
+            nova[:self._n] = getattr(self, nome)[:self._n]
+            setattr(self, nome, nova)
+
+    def _anexar(self, acessos):
+        """Anexa [(uid, dados_acesso)] (chamado com o lock adquirido); ignora timestamps inválidos."""
+        if not acessos:
+            return
+        instantes = _segundos_vetor([dados_acesso.get("timestamp") or "" for _, dados_acesso in acessos])
+        validos = instantes != np.iinfo(np.int64).min
+        if not validos.all():
+            acessos = [acesso for acesso, valido in zip(acessos, validos) if valido]
+            instantes = instantes[validos]
+            if not acessos:
+                return
+
+        inicio = self._n
+        fim = inicio + len(acessos)
+        self._garantir_capacidade(len(acessos))
+        self._ts[inicio:fim] = instantes
+        self._uid[inicio:fim] = [self._uids.codigo(uid) for uid, _ in acessos]
+        self._disp[inicio:fim] = [self._dispositivos.codigo(dados.get("dispositivo")) for _, dados in acessos]
+        self._res[inicio:fim] = [self._resultados.codigo(dados.get("resultado")) for _, dados in acessos]
+
+        if self._ordenado:
+            anterior = self._ts[inicio - 1:fim] if inicio else instantes
+            self._ordenado = bool((anterior[1:] >= anterior[:-1]).all())
+        self._n = fim
+
+    def adicionar(self, acessos):
+        """Registra um lote de acessos novos [(uid, dados_acesso)] (ignorado até a construção começar)."""
+        with self._lock:
+            if self._pendentes is not None:
+                self._pendentes.extend(acessos)
+            elif self.pronto:
+                self._anexar(list(acessos))
+
+    def iniciar_construcao(self):
+        """A partir daqui, acessos novos aguardam o fim de construir()."""
+        with self._lock:
+            self._pendentes = []
+
+    def construir(self, em_memoria, arquivados):
+        """Preenche as colunas com o histórico: acessos em memória + arquivados.
+
+        `em_memoria` é a cópia tirada junto com iniciar_construcao(). Os
+        acessos chegam depois de persistidos, então um pendente pode já
+        estar na cópia (aplicado antes dela) ou no arquivo (arquivado
+        durante a varredura): (uid, timestamp) já vistos são descartados.
+        """
+        vistos = {(uid, dados_acesso.get("timestamp")) for uid, dados_acesso in em_memoria}
+        antigos = []
+        try:
+            for uid, dados_acesso in arquivados:
+                chave = (uid, dados_acesso.get("timestamp"))
+                if chave not in vistos:
+                    vistos.add(chave)
+                    antigos.append((uid, dados_acesso))
+        except Exception:
+            with self._lock:
+                self._pendentes = None  # Não acumular acessos para uma construção que falhou
+            raise
+
+        with self._lock:
+            pendentes = [
+                (uid, dados_acesso) for uid, dados_acesso in self._pendentes or []
+                if (uid, dados_acesso.get("timestamp")) not in vistos
+            ]
+            self._anexar(antigos)
+            self._anexar(em_memoria)
+            self._anexar(pendentes)
+            self._ordenar()
+            self._pendentes = None
+            self.pronto = True
+            return self._n
+
+    def _ordenar(self):
+        """Reordena as colunas por instante (chamado com o lock adquirido)."""
+        if not self._ordenado:
+            ordem = np.argsort(self._ts[:self._n], kind='stable')
+            for nome in self.NOMES_COLUNAS:
+                coluna = getattr(self, nome)
+                nova = np.empty_like(coluna)
+                nova[:self._n] = coluna[:self._n][ordem]
+                setattr(self, nome, nova)
+            self._ordenado = True
+        self.geracao += 1
+
+    # ----- Leitura -----
+
+    def _limites(self, desde, ate):
+        """Posições [inicio, fim) do período (chamado com o lock adquirido e colunas ordenadas)."""
+        ts = self._ts[:self._n]
+        inicio = int(np.searchsorted(ts, segundos(desde), 'left')) if desde else 0
+        fim = int(np.searchsorted(ts, segundos(ate), 'right')) if ate else self._n
+        return inicio, max(inicio, fim)
+
+    def versao(self, desde=None, ate=None):
+        """Versão do período (None enquanto a construção não terminar)."""
+        with self._lock:
+            if not self.pronto:
+                return None
+            if not self._ordenado:
+                self._ordenar()
+            inicio, fim = self._limites(desde, ate)
+            return (self.geracao, fim - inicio)
+
+    def _recorte(self, desde, ate, dispositivo, resultado):
+        """Fatias das colunas no período e com os filtros; retorna (versao, colunas, nomes)."""
+        with self._lock:
+            if not self._ordenado:
+                self._ordenar()
+            inicio, fim = self._limites(desde, ate)
+            colunas = {
+                "ts": self._ts[inicio:fim],
+                "uid": self._uid[inicio:fim],
+                "disp": self._disp[inicio:fim],
+                "res": self._res[inicio:fim]
+            }
+            nomes = {
+                "uid": list(self._uids.nomes),
+                "disp": list(self._dispositivos.nomes),
+                "res": list(self._resultados.nomes)
+            }
+            versao = (self.geracao, fim - inicio)
+            filtros = (("disp", self._dispositivos.codigos, dispositivo), ("res", self._resultados.codigos, resultado))
+
+        mascara = None
+        for coluna, codigos, valor in filtros:
+            if valor is None:
+                continue
+            selecao = colunas[coluna] == codigos.get(valor, -1)
+            mascara = selecao if mascara is None else mascara & selecao
+        if mascara is not None:
+            colunas = {nome: valores[mascara] for nome, valores in colunas.items()}
+        return versao, colunas, nomes
+
+    def consultar(self, consulta, desde=None, ate=None, dispositivo=None, resultado=None, **opcoes):
+        """Executa uma consulta de CONSULTAS; retorna (versao, dados). ValueError se inválida."""
+        if consulta not in CONSULTAS:
+            raise ValueError(f"consulta desconhecida: {consulta}")
+        versao, colunas, nomes = self._recorte(desde, ate, dispositivo, resultado)
+        dados = getattr(self, "_consulta_" + consulta)(colunas, nomes, **opcoes)
+        dados["periodo"] = {"desde": desde, "ate": ate}
+        dados["total_acessos"] = int(colunas["ts"].size)
+        return versao, dados
+
+    # ----- Consultas -----
+
+    @staticmethod
+    def _consulta_mapa_calor(colunas, nomes):
+        """Acessos por dia da semana x hora do dia, no total e por resultado."""
+        ts = colunas["ts"]
+        celulas = ((ts // 86400 + 3) % 7) * 24 + ts % 86400 // 3600  # 0 = segunda-feira
+        resultados = len(nomes["res"])
+        por_resultado = np.bincount(
+            celulas * resultados + colunas["res"], minlength=7 * 24 * resultados
+        ).reshape(7, 24, resultados)
+        return {
+            "dias": list(DIAS_SEMANA),
+            "horas": list(range(24)),
+            "acessos": por_resultado.sum(axis=2).tolist(),
+            "por_resultado": {
+                nome: por_resultado[:, :, codigo].tolist()
+                for codigo, nome in enumerate(nomes["res"])
+                if por_resultado[:, :, codigo].any()
+            }
+        }
+
+    @staticmethod
+    def _consulta_dispositivos(colunas, nomes, granularidade="dia"):
+        """Por dispositivo: total, total por resultado e série por intervalo de tempo."""
+        passo = SEGUNDOS_GRANULARIDADE.get(granularidade)
+        if passo is None:
+            raise ValueError(f"granularidade desconhecida: {granularidade}")
+        deslocamento = DESLOCAMENTO_GRANULARIDADE.get(granularidade, 0)
+        ts, disp = colunas["ts"], colunas["disp"]
+        dispositivos, resultados = len(nomes["disp"]), len(nomes["res"])
+
+        if ts.size:
+            intervalos = (ts + deslocamento) // passo
+            primeiro = int(intervalos[0])
+            quantidade = int(intervalos[-1]) - primeiro + 1
+            if quantidade > MAX_INTERVALOS_SERIE:
+                raise ValueError(f"período longo demais para granularidade {granularidade}: use uma maior ou restrinja desde/ate")
+            series = np.bincount(
+                disp * quantidade + (intervalos - primeiro), minlength=dispositivos * quantidade
+            ).reshape(dispositivos, quantidade)
+            inicios = ((primeiro + np.arange(quantidade)) * passo - deslocamento).astype('datetime64[s]')
+            inicios = np.datetime_as_string(inicios).tolist()
+        else:
+            series = np.zeros((dispositivos, 0), np.int64)
+            inicios = []
+        por_resultado = np.bincount(
+            disp * resultados + colunas["res"], minlength=dispositivos * resultados
+        ).reshape(dispositivos, resultados)
+
+        return {
+            "granularidade": granularidade,
+            "inicios": inicios,
+            "dispositivos": {
+                nome: {
+                    "total": int(por_resultado[codigo].sum()),
+                    "por_resultado": {
+                        nome_resultado: int(por_resultado[codigo, codigo_resultado])
+                        for codigo_resultado, nome_resultado in enumerate(nomes["res"])
+                        if por_resultado[codigo, codigo_resultado]
+                    },
+                    "serie": series[codigo].tolist()
+                }
+                for codigo, nome in enumerate(nomes["disp"])
+                if por_resultado[codigo].any()
+            }
+        }
+
+    @staticmethod
+    def _consulta_cartoes(colunas, nomes, limites=None, top="10"):
+        """Distribuição de acessos por cartão: faixas, percentis e cartões mais usados."""
+        if limites:
+            try:
+                limites = sorted({int(limite) for limite in limites.split(",")})
+            except ValueError:
+                raise ValueError("limites deve ser uma lista de inteiros separados por vírgula")
+            if limites[0] < 1:
+                raise ValueError("limites devem ser positivos")
+        else:
+            limites = list(LIMITES_USO_PADRAO)
+        try:
+            top = int(top)
+        except ValueError:
+            raise ValueError("top deve ser um inteiro")
+        if not 0 <= top <= MAX_TOP_CARTOES:
+            raise ValueError(f"top deve estar entre 0 e {MAX_TOP_CARTOES}")
+
+        contagens = np.bincount(colunas["uid"], minlength=len(nomes["uid"]))
+        usados = contagens[contagens > 0]
+        faixas, _ = np.histogram(usados, bins=limites + [max(limites[-1], int(usados.max(initial=0))) + 1])
+
+        mais_usados = []
+        if top and usados.size:
+            top = min(top, usados.size)
+            candidatos = np.argpartition(-contagens, top - 1)[:top]
+            candidatos = sorted(candidatos.tolist(), key=lambda codigo: (-contagens[codigo], nomes["uid"][codigo]))
+            mais_usados = [{"uid": nomes["uid"][codigo], "acessos": int(contagens[codigo])} for codigo in candidatos]
+
+        if usados.size:
+            p50, p90, p99 = np.percentile(usados, (50, 90, 99)).tolist()
+            resumo = {"media": float(usados.mean()), "mediana": p50, "p90": p90, "p99": p99, "maximo": int(usados.max())}
+        else:
+            resumo = {"media": 0.0, "mediana": 0.0, "p90": 0.0, "p99": 0.0, "maximo": 0}
+
+        return {
+            "cartoes_ativos": int(usados.size),
+            "resumo": resumo,
+            "faixas": [
+                {"de": limite, "ate": (limites[posicao + 1] - 1) if posicao + 1 < len(limites) else None, "cartoes": int(quantidade)}
+                for posicao, (limite, quantidade) in enumerate(zip(limites, faixas.tolist()))
+            ],
+            "mais_usados": mais_usados
+        }
+
+    def metricas(self):
+        with self._lock:
+            return {
+                "pronto": self.pronto,
+                "linhas": self._n,
+                "capacidade": len(self._ts),
+                "geracao": self.geracao,
+                "cartoes": len(self._uids.nomes),
+                "dispositivos": len(self._dispositivos.nomes)
+            }
@@ -1,15 +1,26 @@
-from flask import Flask, render_template, jsonify, send_from_directory, request
+from flask import Flask, render_template, jsonify, send_from_directory, request, Response
 from flask_socketio import SocketIO, emit
-import json
-import serial
 import time
 import threading
 from datetime import datetime
-import os
+from itertools import chain
 import logging
-import requests
 from geopy.geocoders import Nominatim
 import socket
+import atexit
+
+from analitico import ColunasAcessos, CONSULTAS, numpy_disponivel
+from armazenamento import DiarioAcessos
+from cache_resposta import CacheRespostas, brotli_disponivel
+from armazenamento_sqlite import ArmazenamentoSQLite
+from arquivo_historico import ArquivoHistorico
+from registros import RegistroAcesso, INTERNADOR
+from repositorio import RepositorioCartoes, PainelAgregado, EstatisticasDispositivos
+from geolocalizacao import CacheGeolocalizacao, ProvedorIPAPI, endereco_google_maps
+from processamento import FilaEscrita, PoolPorUID, TabelaDebounce, RegistroIdempotencia
+from leitor_serial import GerenciadorLeitores, mensagem_de_sistema
+from metricas import ColetorMetricas
+from suspeita import RegrasSuspeita, instante_epoch
 
 # Configurar logging - apenas informações importantes
 logging.basicConfig(level=logging.WARNING, format='%(message)s')
@@ -17,20 +28,79 @@ logger = logging.getLogger(__name__)
 
 app = Flask(__name__)
 app.config['SECRET_KEY'] = 'sistema_acesso_secret'
-socketio = SocketIO(app, cors_allowed_origins="*")
 
 # ===== CONFIGURAÇÕES =====
 PORTA = 'COM4'  # Porta do Arduino LOCAL
 BAUDRATE = 9600
-TIMEOUT = 2
-ARQUIVO_LOG = "log_acessos.json"
+ESPERA_INICIALIZACAO_SERIAL = 2  # Segundos aguardando o Arduino reiniciar ao abrir a porta
+TIMEOUT = 2  # Segundos máximos bloqueado em cada leitura/escrita serial
+BACKOFF_RECONEXAO_MAXIMO = 30  # Segundos máximos entre tentativas de reconexão
+BACKEND_ARMAZENAMENTO = "diario"  # "diario" (JSON Lines + snapshot) ou "sqlite"
+ARQUIVO_LOG = "log_acessos.json"  # Log legado (migrado para o armazenamento na inicialização)
+ARQUIVO_BANCO = "acessos.db"  # Banco do backend "sqlite"
+ARQUIVO_DIARIO = "log_acessos.jsonl"  # Diário append-only (um acesso por linha)
+ARQUIVO_SNAPSHOT = "log_acessos.snapshot.json"  # Snapshot compactado por cartão (formato anterior, migrado)
+ARQUIVO_SNAPSHOT_BINARIO = "log_acessos.snapshot.bin"  # Snapshot binário com índice e estatísticas (None = só JSON)
+FSYNC_A_CADA = 50  # Acessos acumulados antes de forçar fsync
+INTERVALO_FSYNC = 0.5  # Segundos máximos entre fsyncs
+COMPACTAR_A_CADA = 10000  # Acessos no diário antes de reconstruir o snapshot (cauda reproduzida na carga)
+MAX_ACESSOS_QUENTES_POR_CARTAO = 100  # Acessos mantidos em memória por cartão (None = sem limite)
+DIRETORIO_ARQUIVO = "arquivo_acessos"  # Acessos antigos, em partições mensais comprimidas
+TAMANHO_FILA_ESCRITA = 10000  # Acessos pendentes antes de aplicar backpressure
+TAMANHO_LOTE_ESCRITA = 200  # Máximo de acessos persistidos por lote
+ESPERA_LOTE_ESCRITA = 0.05  # Segundos aguardando o lote encher
+NUM_WORKERS_ACESSO = 4  # Workers que processam taps (shard por UID)
+TAMANHO_FILA_WORKER = 1000  # Taps pendentes por worker antes de rejeitar
+JANELA_DEBOUNCE = 3  # Segundos em que o mesmo cartão no mesmo dispositivo é ignorado
+MAX_ENTRADAS_DEBOUNCE = 100000  # Limite de pares (uid, dispositivo) lembrados
+MAX_CHAVES_IDEMPOTENCIA = 200000  # id_evento lembrados para descartar reenvios
+MAX_ACESSOS_POR_LOTE = 5000  # Acessos aceitos por requisição de lote
+TAMANHO_PAGINA_PADRAO = 50  # Itens por página nas consultas paginadas
+TAMANHO_PAGINA_MAXIMO = 500
+NIVEL_GZIP_DADOS = 6  # Compressão de /api/dados (feita uma vez por versão do estado)
+TAMANHO_MINIMO_COMPRESSAO = 1024  # Bytes abaixo dos quais /api/dados sai sem compressão
+ANALITICO_ATIVO = True  # Histórico em colunas NumPy para /api/analytics (requer numpy)
+MAX_RESULTADOS_ANALITICOS = 256  # Consultas/períodos distintos mantidos em cache
+METRICAS_ATIVAS = True  # Tempos por etapa e contadores em /metrics (False = custo praticamente nulo)
+RETENCAO_VAZAO = {"minuto": 24 * 60, "hora": 24 * 30, "dia": 365}  # Buckets guardados por dispositivo ({} desativa)
 
 # Configurações do sistema distribuído
 SISTEMA_ID = "SISTEMA_CENTRAL"  # Identificador único deste dispositivo
+
+# Leitores seriais locais deste processo (um por porta, cada um com seu dispositivo_id)
+# Ex.: [{"porta": "COM4", "dispositivo_id": "SISTEMA_CENTRAL"},
+#       {"porta": "COM5", "dispositivo_id": "PORTARIA_B", "baudrate": 115200}]
+LEITORES_LOCAIS = [
+    {"porta": PORTA, "dispositivo_id": SISTEMA_ID}
+]
 DISPOSITIVOS_AUTORIZADOS = ["SISTEMA_CENTRAL", "DISPOSITIVO_REMOTO_01"]  # IDs autorizados
 
+# Regras de suspeita (avaliadas sobre os últimos acessos de cada cartão, em memória)
+TAMANHO_JANELA_DISPOSITIVOS = 5  # Acessos recentes lembrados por cartão
+JANELA_SUSPEITA = None  # Segundos em que outro dispositivo torna o acesso suspeito (None = toda a janela)
+VELOCIDADE_MAXIMA_KMH = 900  # Acima disso o deslocamento entre dispositivos é impossível (None desativa)
+GRUPOS_DISPOSITIVOS_PERMITIDOS = []  # Ex.: [["PORTARIA_A", "PORTARIA_B"]] - trocas dentro do grupo não são suspeitas
+ORCAMENTO_SUSPEITA_US = 200  # Tempo máximo (microssegundos) para avaliar as regras
+
+# Geolocalização (IP público muda raramente: consulta em cache com TTL)
+TTL_GEOLOCALIZACAO = 3600  # Segundos até renovar a localização
+ARQUIVO_CACHE_GEOLOCALIZACAO = "cache_geolocalizacao.json"
+
+# Modo multiprocesso (servidor_multiprocesso.py): N processos web + um coordenador dono do estado
+PROCESSOS_WEB = 4  # Processos web aceitando conexões na mesma porta
+ENDERECO_BROKER = ("127.0.0.1", 5001)  # Onde o coordenador expõe o serviço central aos processos web
+CHAVE_BROKER = b"sistema_acesso_broker"  # Chave de autenticação entre os processos
+MESSAGE_QUEUE_SOCKETIO = None  # Ex.: "redis://localhost:6379/0" - obrigatório com mais de um processo
+
+socketio = SocketIO(app, cors_allowed_origins="*", message_queue=MESSAGE_QUEUE_SOCKETIO)
+
+# Substituído pelo servidor assíncrono (servidor_async.py): broadcasts pelo
+# servidor Socket.IO do laço asyncio
+emitir = socketio.emit
+
 # Dados em memória
 dados_em_memoria = {
+    "seq": 0,
     "cards": {},
     "last_accesses": [],
     "stats": {
@@ -42,253 +112,238 @@ dados_em_memoria = {
 }
 
 # Variáveis globais
-arduino = None
-serial_lock = threading.Lock()
-ultimo_uid_processado = None
-ultimo_tempo_processamento = 0
+leitores = GerenciadorLeitores(
+    LEITORES_LOCAIS,
+    lambda dispositivo_id, linha, instante: tratar_linha_serial(dispositivo_id, linha, instante),
+    baudrate=BAUDRATE,
+    timeout_leitura=TIMEOUT,
+    espera_inicializacao=ESPERA_INICIALIZACAO_SERIAL,
+    backoff_maximo=BACKOFF_RECONEXAO_MAXIMO
+)
+debounce = TabelaDebounce(janela=JANELA_DEBOUNCE, max_entradas=MAX_ENTRADAS_DEBOUNCE)
+idempotencia = RegistroIdempotencia(max_chaves=MAX_CHAVES_IDEMPOTENCIA)
+pool_acessos = PoolPorUID(num_workers=NUM_WORKERS_ACESSO, tamanho_fila=TAMANHO_FILA_WORKER)
+if BACKEND_ARMAZENAMENTO == "sqlite":
+    diario = ArmazenamentoSQLite(
+        ARQUIVO_BANCO,
+        max_acessos_por_cartao=MAX_ACESSOS_QUENTES_POR_CARTAO,
+        agregados=lambda: EstatisticasDispositivos(RETENCAO_VAZAO),
+        max_eventos_arquivados=MAX_CHAVES_IDEMPOTENCIA
+    )
+else:
+    diario = DiarioAcessos(
+        ARQUIVO_DIARIO,
+        ARQUIVO_SNAPSHOT,
+        fsync_a_cada=FSYNC_A_CADA,
+        intervalo_fsync=INTERVALO_FSYNC,
+        compactar_a_cada=COMPACTAR_A_CADA,
+        max_acessos_por_cartao=MAX_ACESSOS_QUENTES_POR_CARTAO,
+        arquivo=ArquivoHistorico(DIRETORIO_ARQUIVO),
+        arquivo_snapshot_binario=ARQUIVO_SNAPSHOT_BINARIO,
+        agregados=lambda: EstatisticasDispositivos(RETENCAO_VAZAO),
+        max_eventos_arquivados=MAX_CHAVES_IDEMPOTENCIA
+    )
+repositorio = RepositorioCartoes(
+    diario,
+    retencao_vazao=RETENCAO_VAZAO,
+    tamanho_janela_dispositivos=TAMANHO_JANELA_DISPOSITIVOS,
+    colunas=ColunasAcessos() if ANALITICO_ATIVO and numpy_disponivel() else None
+)
+regras_suspeita = RegrasSuspeita(
+    janela_segundos=JANELA_SUSPEITA,
+    velocidade_maxima_kmh=VELOCIDADE_MAXIMA_KMH,
+    grupos_permitidos=GRUPOS_DISPOSITIVOS_PERMITIDOS,
+    orcamento_us=ORCAMENTO_SUSPEITA_US
+)
+painel = PainelAgregado(dados_em_memoria, tamanho_feed=10)
+fila_escrita = FilaEscrita(
+    lambda lote: persistir_lote(lote),
+    tamanho_maximo=TAMANHO_FILA_ESCRITA,
+    tamanho_lote=TAMANHO_LOTE_ESCRITA,
+    espera_lote=ESPERA_LOTE_ESCRITA
+)
+cache_localizacao = CacheGeolocalizacao(
+    ProvedorIPAPI(),
+    ttl=TTL_GEOLOCALIZACAO,
+    arquivo_cache=ARQUIVO_CACHE_GEOLOCALIZACAO
+)
 geolocator = Nominatim(user_agent="sistema_acesso")
+metricas = ColetorMetricas(ativo=METRICAS_ATIVAS)
+metricas.descrever("acessos", "Acessos decididos, por resultado")
+metricas.descrever("leituras_suprimidas", "Leituras ignoradas pelo debounce")
+metricas.registrar_medidor("fila_escrita_profundidade", "Acessos aguardando persistência",
+                           lambda: fila_escrita.metricas()["profundidade"])
+metricas.registrar_medidor("pool_acessos_profundidade", "Taps aguardando os workers",
+                           lambda: pool_acessos.metricas()["profundidade"])
+metricas.registrar_medidor("leitor_reconexoes_total", "Reconexões de cada leitor serial",
+                           lambda: {d: l["reconexoes"] for d, l in leitores.status().items()}, tipo="counter")
+metricas.registrar_medidor("leitor_conectado", "Leitor serial conectado (1) ou não (0)",
+                           lambda: {d: int(l["conectado"]) for d, l in leitores.status().items()})
+cache_dados = CacheRespostas(
+    lambda dados: app.json.dumps(dados).encode('utf-8'),
+    nivel_gzip=NIVEL_GZIP_DADOS
+)
+cache_analitico = CacheRespostas(
+    lambda dados: app.json.dumps(dados).encode('utf-8'),
+    nivel_gzip=NIVEL_GZIP_DADOS,
+    max_variantes=MAX_RESULTADOS_ANALITICOS
+)
 
 # ===== FUNÇÕES DE GEOLOCALIZAÇÃO =====
 
 def obter_localizacao_aproximada():
-    """Obtém localização aproximada baseada no IP."""
-    try:
-        # Obter IP público
-        response = requests.get('https://api.ipify.org?format=json', timeout=5)
-        ip_publico = response.json()['ip']
-        
-        # Obter localização pelo IP
-        response = requests.get(f'http://ip-api.com/json/{ip_publico}', timeout=5)
-        dados_localizacao = response.json()
-        
-        if dados_localizacao['status'] == 'success':
-            return {
-                "ip": ip_publico,
-                "cidade": dados_localizacao.get('city', 'Desconhecida'),
-                "regiao": dados_localizacao.get('regionName', 'Desconhecida'),
-                "pais": dados_localizacao.get('country', 'Desconhecido'),
-                "lat": dados_localizacao.get('lat'),
-                "lon": dados_localizacao.get('lon'),
-                "isp": dados_localizacao.get('isp', 'Desconhecido')
-            }
-    except Exception as e:
-        print(f"Erro ao obter localização: {e}")
-    
-    return {
-        "ip": "Desconhecido",
-        "cidade": "Desconhecida",
-        "regiao": "Desconhecida",
-        "pais": "Desconhecido",
-        "lat": None,
-        "lon": None,
-        "isp": "Desconhecido"
-    }
+    """Obtém localização aproximada baseada no IP (do cache, sem esperar a rede)."""
+    return cache_localizacao.obter()
 
 def obter_endereco_google_maps(lat, lon):
     """Obtém endereço formatado para Google Maps."""
-    if lat and lon:
-        return f"https://www.google.com/maps?q={lat},{lon}"
-    return "Localização não disponível"
+    return endereco_google_maps(lat, lon)
 
 # ===== FUNÇÕES PRINCIPAIS =====
 
-def carregar_log():
-    """Carrega o arquivo JSON de log."""
-    try:
-        if not os.path.exists(ARQUIVO_LOG):
-            with open(ARQUIVO_LOG, 'w', encoding='utf-8') as f:
-                json.dump({}, f, indent=4)
-            return {}
-        
-        with open(ARQUIVO_LOG, 'r', encoding='utf-8') as f:
-            conteudo = f.read().strip()
-            if not conteudo:
-                return {}
-            return json.loads(conteudo)
-    except Exception as e:
-        print(f"Erro ao carregar log: {e}")
-        return {}
-
-def salvar_log(data):
-    """Salva dados no arquivo JSON."""
-    try:
-        with open(ARQUIVO_LOG, 'w', encoding='utf-8') as f:
-            json.dump(data, f, indent=4, ensure_ascii=False)
-        return True
-    except Exception as e:
-        print(f"Erro ao salvar log: {e}")
-        return False
+def persistir_lote(lote):
+    """Persiste um lote de acessos, atualiza o painel e notifica os clientes uma vez."""
+    inicio = metricas.agora()
+    if not repositorio.persistir([(uid, dados_acesso) for uid, _, dados_acesso in lote]):
+        print("Erro ao salvar dados")
+    metricas.observar("persistencia", inicio)
+    
+    inicio = metricas.agora()
+    delta = painel.aplicar_lote(lote)
+    metricas.observar("interface", inicio)
+    
+    inicio = metricas.agora()
+    notificar_clientes(delta)
+    metricas.observar("notificacao", inicio)
 
-def inicializar_serial():
-    """Inicializa a conexão serial."""
-    global arduino
+def inicializar_armazenamento():
+    """Migra o log legado, se houver, e carrega o índice de cartões em memória."""
+    diario.migrar_log_legado(ARQUIVO_LOG)
     try:
-        # Fechar conexão existente
-        if arduino is not None:
-            try:
-                arduino.close()
-            except:
-                pass
-            time.sleep(1)
-            
-        print(f"Conectando na porta {PORTA}...")
-        arduino = serial.Serial(
-            port=PORTA,
-            baudrate=BAUDRATE,
-            timeout=TIMEOUT,
-            bytesize=serial.EIGHTBITS,
-            parity=serial.PARITY_NONE,
-            stopbits=serial.STOPBITS_ONE,
-            rtscts=False,
-            dsrdtr=False
-        )
-        
-        # Aguardar Arduino inicializar
-        time.sleep(2)
-        
-        # Limpar buffer completamente
-        if arduino.in_waiting > 0:
-            arduino.read(arduino.in_waiting)
-            
-        print("✅ Conexão serial estabelecida")
-        return True
-        
+        inicio = time.perf_counter()
+        total = repositorio.carregar()
+        print(f"Índice em memória carregado: {total} cartões em {time.perf_counter() - inicio:.1f}s")
+        # Acessos já arquivados (mais antigos) primeiro, depois os em memória
+        arquivados = diario.eventos_arquivados_carregados or []
+        diario.eventos_arquivados_carregados = None
+        idempotencia.carregar(chain(arquivados, (
+            acesso["id_evento"]
+            for _, info in repositorio.itens()
+            for acesso in info.get("acessos", [])
+            if acesso.get("id_evento")
+        )))
     except Exception as e:
-        print(f"❌ Erro na conexão serial: {e}")
-        arduino = None
-        return False
+        print(f"Erro ao carregar log: {e}")
+    # atexit executa na ordem inversa: drena a fila antes de fechar o diário
+    atexit.register(diario.fechar)
+    atexit.register(fila_escrita.encerrar)
+    fila_escrita.iniciar()
 
-def notificar_clientes():
-    """Notifica todos os clientes web sobre atualização."""
+def notificar_clientes(delta=None):
+    """Notifica os clientes web: envia o delta versionado ou pede uma ressincronização completa."""
     try:
-        socketio.emit('dados_atualizados', {
+        if delta is not None:
+            emitir('delta', delta)
+            return
+        emitir('dados_atualizados', {
             'message': 'Novos dados disponíveis',
             'timestamp': datetime.now().isoformat()
         })
     except Exception as e:
         print(f"Erro ao notificar clientes: {e}")
 
-def enviar_resposta_arduino(comando):
-    """Envia resposta para Arduino."""
-    global arduino
-    with serial_lock:
-        if arduino is not None and hasattr(arduino, 'is_open') and arduino.is_open:
-            try:
-                arduino.write(comando)
-                arduino.flush()
-                return True
-            except Exception as e:
-                print(f"Erro ao enviar comando: {e}")
-                arduino = None
-                return False
-        else:
-            print("⚠️ Arduino não disponível para envio")
-            return False
+def enviar_resposta_arduino(comando, instante_leitura=None, dispositivo_id=SISTEMA_ID):
+    """Envia resposta para o Arduino do leitor local."""
+    return leitores.enviar(dispositivo_id, comando, instante_leitura)
 
-def verificar_acesso_suspeito(uid, dispositivo_atual, log_data):
-    """Verifica se o acesso é suspeito (cartão usado em dispositivo diferente)."""
-    if uid in log_data:
-        # Verificar se a chave 'acessos' existe
-        acessos_anteriores = log_data[uid].get("acessos", [])
-        
-        # Se não há acessos anteriores, não é suspeito
-        if not acessos_anteriores:
-            return False
-            
-        for acesso in acessos_anteriores[-5:]:  # Verificar últimos 5 acessos
-            if acesso.get("dispositivo") != dispositivo_atual:
-                return True
-                
-    return False
+def verificar_acesso_suspeito(uid, dispositivo_atual, repositorio, timestamp=None, localizacao=None):
+    """Verifica se o acesso é suspeito; retorna o motivo (ou None).
+    
+    Usa a janela de dispositivos recentes do cartão (em memória) e as regras
+    configuradas: outro dispositivo, viagem impossível e grupos permitidos.
+    """
+    localizacao = localizacao or {}
+    return regras_suspeita.avaliar(
+        repositorio.dispositivos_recentes(uid),
+        dispositivo_atual,
+        instante_epoch(timestamp) if timestamp else time.time(),
+        localizacao.get('lat'),
+        localizacao.get('lon')
+    )
+
+def avaliar_acesso(uid, dispositivo_id, localizacao, agora=None, id_evento=None):
+    """Decide o resultado do acesso e o registra no índice em memória (sem I/O).
+    
+    Deve ser chamada com repositorio.lock adquirido. Retorna
+    (info_cartao, dados_acesso, comando_arduino).
+    """
+    agora = agora or datetime.now().isoformat()
+    
+    # Verificar se é suspeito (outro dispositivo, viagem impossível)
+    inicio = metricas.agora()
+    suspeito = verificar_acesso_suspeito(uid, dispositivo_id, repositorio, agora, localizacao)
+    metricas.observar("suspeita", inicio)
+    
+    # Determinar resultado
+    if suspeito:
+        resultado = "Suspeito"
+        comando = b'SUSPECT\n'
+    else:
+        resultado = "Permitido"
+        comando = b'OK\n'
+    
+    # Registro compacto (valores internados; link do mapa montado ao servir)
+    dados_acesso = RegistroAcesso(agora, dispositivo_id, resultado, localizacao, id_evento or None)
+    
+    info = repositorio.aplicar(uid, dados_acesso)
+    metricas.incrementar("acessos", resultado=resultado)
+    return info, dados_acesso, comando
 
-def processar_uid(uid, dispositivo_id=SISTEMA_ID, localizacao=None):
+def processar_uid(uid, dispositivo_id=SISTEMA_ID, localizacao=None, instante_leitura=None, id_evento=None):
     """Processa um UID recebido do Arduino ou de dispositivo remoto."""
-    global ultimo_uid_processado, ultimo_tempo_processamento
-    
     try:
-        # Prevenir processamento duplicado rápido
-        tempo_atual = time.time()
-        if uid == ultimo_uid_processado and tempo_atual - ultimo_tempo_processamento < 3:
+        # Da chegada do byte na serial até aqui (inclui a espera no pool)
+        if instante_leitura is not None:
+            metricas.observar("leitura_serial", instante_leitura)
+        
+        # Prevenir processamento duplicado rápido (por cartão e dispositivo)
+        inicio = metricas.agora()
+        aceito = debounce.registrar(uid, dispositivo_id)
+        metricas.observar("deduplicacao", inicio)
+        if not aceito:
+            metricas.incrementar("leituras_suprimidas")
             return False
-            
-        ultimo_uid_processado = uid
-        ultimo_tempo_processamento = tempo_atual
         
         print(f"Cartão detectado: {uid} no dispositivo: {dispositivo_id}")
         
-        # Carregar log atual
-        log_data = carregar_log()
-        agora = datetime.now().isoformat()
-        
         # Obter localização se não for fornecida
         if not localizacao:
+            inicio = metricas.agora()
             localizacao = obter_localizacao_aproximada()
+            metricas.observar("geolocalizacao", inicio)
         
-        # Verificar se é suspeito (cartão usado em outro dispositivo)
-        suspeito = verificar_acesso_suspeito(uid, dispositivo_id, log_data)
+        # Leitores começam antes da carga do histórico, mas a decisão depende dele
+        repositorio.aguardar_carga()
         
-        # Determinar resultado
-        if suspeito:
-            resultado = "Suspeito"
-            mensagem = f"🚨 ACESSO SUSPEITO - Cartão usado em dispositivo diferente"
-            comando = b'SUSPECT\n'
-        else:
-            resultado = "Permitido"
-            mensagem = "✅ Acesso PERMITIDO"
-            comando = b'OK\n'
+        # Decisão e registro atômicos no índice em memória (sem I/O)
+        with repositorio.lock:
+            info, dados_acesso, comando = avaliar_acesso(uid, dispositivo_id, localizacao, id_evento=id_evento)
         
-        print(mensagem)
-        
-        # Preparar dados do acesso
-        dados_acesso = {
-            "timestamp": agora,
-            "dispositivo": dispositivo_id,
-            "resultado": resultado,
-            "localizacao": localizacao,
-            "google_maps": obter_endereco_google_maps(localizacao.get('lat'), localizacao.get('lon'))
-        }
-        
-        # Atualizar dados - INICIALIZAR ESTRUTURA CORRETAMENTE
-        if uid not in log_data:
-            # Primeiro acesso - criar estrutura completa
-            log_data[uid] = {
-                "primeiro_acesso": agora,
-                "ultimo_acesso": agora,
-                "vezes_usado": 1,
-                "acessos": [dados_acesso],
-                "dispositivos_utilizados": [dispositivo_id]
-            }
-        else:
-            # Acesso subsequente - garantir que todas as chaves existam
-            log_data[uid]["ultimo_acesso"] = agora
-            log_data[uid]["vezes_usado"] = log_data[uid].get("vezes_usado", 0) + 1
-            
-            # Garantir que 'acessos' existe
-            if "acessos" not in log_data[uid]:
-                log_data[uid]["acessos"] = []
-            log_data[uid]["acessos"].append(dados_acesso)
-            
-            # Garantir que 'dispositivos_utilizados' existe
-            if "dispositivos_utilizados" not in log_data[uid]:
-                log_data[uid]["dispositivos_utilizados"] = []
-            
-            # Atualizar lista de dispositivos únicos
-            if dispositivo_id not in log_data[uid]["dispositivos_utilizados"]:
-                log_data[uid]["dispositivos_utilizados"].append(dispositivo_id)
+        # Enviar resposta para Arduino primeiro (apenas se for leitor local)
+        if leitores.local(dispositivo_id):
+            inicio = metricas.agora()
+            enviar_resposta_arduino(comando, instante_leitura, dispositivo_id)
+            metricas.observar("resposta", inicio)
+            if instante_leitura is not None:
+                metricas.observar("tap_ate_resposta", instante_leitura)
         
-        # Salvar no arquivo
-        if salvar_log(log_data):
-            print("Dados salvos no JSON")
+        if dados_acesso["resultado"] == "Suspeito":
+            print("🚨 ACESSO SUSPEITO - Cartão usado em dispositivo diferente")
         else:
-            print("Erro ao salvar dados")
+            print("✅ Acesso PERMITIDO")
         
-        # Enviar resposta para Arduino (apenas se for dispositivo local)
-        if dispositivo_id == SISTEMA_ID:
-            enviar_resposta_arduino(comando)
-        
-        # Atualizar dados em memória e notificar clientes
-        atualizar_dados_interface()
-        notificar_clientes()
+        # Persistência, painel e notificação ficam com o worker da fila
+        fila_escrita.enfileirar((uid, info, dados_acesso))
         
         return True
         
@@ -296,6 +351,92 @@ def processar_uid(uid, dispositivo_id=SISTEMA_ID, localizacao=None):
         print(f"Erro ao processar UID: {e}")
         return False
 
+def normalizar_timestamp(valor):
+    """Converte um timestamp ISO do dispositivo para datetime local sem fuso (ou None se inválido)."""
+    try:
+        instante = datetime.fromisoformat(valor)
+    except (TypeError, ValueError):
+        return None
+    if instante.tzinfo is not None:
+        instante = instante.astimezone().replace(tzinfo=None)
+    return instante
+
+def processar_lote(dispositivo_id, acessos):
+    """Processa acessos de um dispositivo remoto em ordem de timestamp.
+    
+    A avaliação do lote inteiro é feita sob um único lock, a persistência
+    vai para a fila de escrita como um único item (uma escrita no diário e
+    uma notificação) e o retorno traz o resultado de cada item na ordem
+    recebida.
+    """
+    resultados = [None] * len(acessos)
+    validos = []
+    localizacao_padrao = None
+    
+    # Como em processar_uid: a avaliação (e a idempotência) depende do histórico carregado
+    repositorio.aguardar_carga()
+    
+    for indice, acesso in enumerate(acessos):
+        id_evento = acesso.get('id_evento') if isinstance(acesso, dict) else None
+        uid = acesso.get('uid') if isinstance(acesso, dict) else None
+        
+        if not id_evento or not uid:
+            resultados[indice] = {"id_evento": id_evento, "status": "rejeitado", "message": "UID e id_evento são obrigatórios"}
+            continue
+        
+        if acesso.get('timestamp') is None:
+            instante = datetime.now()
+        else:
+            instante = normalizar_timestamp(acesso['timestamp'])
+            if instante is None:
+                resultados[indice] = {"id_evento": id_evento, "status": "rejeitado", "message": "Timestamp inválido"}
+                continue
+        
+        if not idempotencia.reservar(id_evento):
+            resultados[indice] = {"id_evento": id_evento, "status": "duplicado"}
+            continue
+        
+        localizacao = acesso.get('localizacao')
+        if not localizacao:
+            if localizacao_padrao is None:
+                localizacao_padrao = obter_localizacao_aproximada()
+            localizacao = localizacao_padrao
+        
+        validos.append((instante, indice, uid, id_evento, localizacao))
+    
+    # Avaliar em ordem cronológica do dispositivo (estável para timestamps iguais)
+    validos.sort(key=lambda item: (item[0], item[1]))
+    
+    itens_escrita = []
+    ultimo_por_uid = {}
+    with repositorio.lock:
+        for instante, indice, uid, id_evento, localizacao in validos:
+            # Debounce pelo relógio do dispositivo, dentro do lote
+            anterior = ultimo_por_uid.get(uid)
+            if anterior is not None and (instante - anterior).total_seconds() < debounce.janela:
+                resultados[indice] = {"id_evento": id_evento, "status": "ignorado", "message": "Leitura duplicada"}
+                continue
+            ultimo_por_uid[uid] = instante
+            
+            try:
+                info, dados_acesso, _ = avaliar_acesso(
+                    uid, dispositivo_id, localizacao, agora=instante.isoformat(), id_evento=id_evento
+                )
+            except Exception as e:
+                idempotencia.liberar(id_evento)
+                resultados[indice] = {"id_evento": id_evento, "status": "erro", "message": str(e)}
+                continue
+            
+            itens_escrita.append((uid, info, dados_acesso))
+            resultados[indice] = {"id_evento": id_evento, "status": "registrado", "resultado": dados_acesso["resultado"]}
+    
+    if itens_escrita:
+        fila_escrita.enfileirar_lote(itens_escrita)
+        suspeitos = sum(1 for _, _, dados_acesso in itens_escrita if dados_acesso["resultado"] == "Suspeito")
+        print(f"📦 Lote de {dispositivo_id}: {len(itens_escrita)} acesso(s) registrado(s), {suspeitos} suspeito(s)")
+    
+    return resultados
+
 def extrair_uid(dados):
     """Extrai UID dos dados."""
     try:
@@ -313,106 +454,130 @@ def extrair_uid(dados):
     except Exception:
         return None
 
+def construir_historico_analitico():
+    """Monta as colunas do histórico completo para /api/analytics (em segundo plano)."""
+    try:
+        inicio = time.perf_counter()
+        total = repositorio.construir_colunas()
+        print(f"📊 Histórico analítico pronto: {total} acessos em {time.perf_counter() - inicio:.1f}s")
+    except Exception as e:
+        print(f"Erro ao montar histórico analítico: {e}")
+
 def atualizar_dados_interface():
-    """Atualiza os dados em memória para a interface web."""
+    """Recalcula os dados em memória da interface a partir do índice."""
     try:
-        log_data = carregar_log()
-        
-        cartoes = {}
-        ultimos_acessos = []
-        
-        for uid, info in log_data.items():
-            # Garantir que todas as chaves existam
-            primeiro_acesso = info.get("primeiro_acesso", info.get("ultimo_acesso", "N/A"))
-            ultimo_acesso = info.get("ultimo_acesso", "N/A")
-            vezes_usado = info.get("vezes_usado", 0)
-            dispositivos_utilizados = info.get("dispositivos_utilizados", [])
-            acessos = info.get("acessos", [])
-            
-            cartoes[uid] = {
-                "primeiro_acesso": primeiro_acesso,
-                "ultimo_acesso": ultimo_acesso,
-                "vezes_usado": vezes_usado,
-                "dispositivos_utilizados": dispositivos_utilizados,
-                "ultimo_resultado": acessos[-1].get("resultado", "N/A") if acessos else "N/A"
-            }
-            
-            # Processar últimos acessos
-            for acesso in acessos[-5:]:  # Últimos 5 acessos
-                ultimos_acessos.append({
-                    "uid": uid,
-                    "timestamp": acesso.get("timestamp", "N/A"),
-                    "resultado": acesso.get("resultado", "N/A"),
-                    "dispositivo": acesso.get("dispositivo", "N/A"),
-                    "localizacao": acesso.get("localizacao", {}),
-                    "google_maps": acesso.get("google_maps", "#"),
-                    "vezes_usado": vezes_usado
-                })
-        
-        # Ordenar por data mais recente
-        ultimos_acessos.sort(key=lambda x: x["timestamp"], reverse=True)
-        
-        # Calcular estatísticas
-        total_cartoes = len(cartoes)
-        total_acessos = sum(info["vezes_usado"] for info in cartoes.values())
-        total_suspeitos = sum(1 for info in cartoes.values() if len(info.get("dispositivos_utilizados", [])) > 1)
-        total_repetidos = sum(1 for info in cartoes.values() if info["vezes_usado"] > 1)
-        
-        # Atualizar memória
-        dados_em_memoria["cards"] = cartoes
-        dados_em_memoria["last_accesses"] = ultimos_acessos[:10]
-        dados_em_memoria["stats"] = {
-            "total_cartoes": total_cartoes,
-            "total_acessos": total_acessos,
-            "total_suspeitos": total_suspeitos,
-            "total_repetidos": total_repetidos
-        }
-        
+        with repositorio.lock:
+            painel.reconstruir(repositorio.itens())
+        notificar_clientes()
     except Exception as e:
         print(f"Erro ao atualizar interface: {e}")
 
-def monitor_serial():
-    """Thread para monitorar a porta serial."""
-    global arduino
+def tratar_linha_serial(dispositivo_id, linha, instante_leitura):
+    """Trata uma linha recebida de um Arduino local."""
+    # Ignorar mensagens de sistema
+    if mensagem_de_sistema(linha):
+        return
     
-    while True:
+    # Tentar extrair UID
+    uid = extrair_uid(linha)
+    
+    if uid:
+        # Processar no pool (mesmo UID sempre no mesmo worker); nunca bloqueia o leitor
+        if not pool_acessos.submeter(uid, processar_uid, uid, dispositivo_id, None, instante_leitura):
+            print(f"⚠️ Fila de acessos cheia, UID descartado: {uid}")
+
+# ===== SERVIÇO CENTRAL =====
+
+class ServicoCentral:
+    """Operações sobre o estado compartilhado usadas pelas rotas.
+
+    No modo de um processo as rotas chamam este objeto diretamente; no modo
+    multiprocesso (servidor_multiprocesso.py) só o processo coordenador o
+    instancia, e os processos web recebem um proxy do broker com os mesmos
+    métodos. Parâmetros e retornos são tipos simples (serializáveis).
+    """
+
+    def dados_painel(self, incluir_cartoes=True):
+        with painel.lock:
+            dados = {
+                "seq": dados_em_memoria["seq"],
+                "last_accesses": list(dados_em_memoria["last_accesses"]),
+                "stats": dict(dados_em_memoria["stats"])
+            }
+            if incluir_cartoes:
+                # Resumos são substituídos, nunca alterados: cópia rasa basta
+                dados["cards"] = dict(dados_em_memoria["cards"])
+        return dados
+
+    def versao_painel(self):
+        return dados_em_memoria["seq"]
+
+    def consultar_cartoes(self, cursor=None, **filtros):
+        return repositorio.consultar_cartoes(cursor=cursor, **filtros)
+
+    def consultar_acessos(self, cursor=None, **filtros):
+        return repositorio.consultar_acessos(cursor=cursor, **filtros)
+
+    def atualizar(self):
+        atualizar_dados_interface()
+
+    def status(self):
+        return {
+            "serial_status": "conectado" if leitores.algum_conectado else "desconectado",
+            "leitores": leitores.status(),
+            "cartoes_cadastrados": len(repositorio),
+            "sistema_id": SISTEMA_ID,
+            "fila_escrita": fila_escrita.metricas(),
+            "pool_acessos": pool_acessos.metricas(),
+            "debounce": debounce.metricas(),
+            "idempotencia": idempotencia.metricas(),
+            "regras_suspeita": regras_suspeita.metricas(),
+            "arquivo_acessos": diario.arquivo.metricas(),
+            "valores_internados": INTERNADOR.metricas(),
+            "analitico": repositorio.colunas.metricas() if repositorio.colunas is not None else None
+        }
+
+    def metricas_prometheus(self):
+        return metricas.exportar()
+
+    def reiniciar_serial(self, porta=None):
+        return leitores.reiniciar(porta)
+
+    def registrar_acesso(self, uid, dispositivo_id, localizacao=None, id_evento=None):
+        """Registra um acesso remoto; retorna "registrado", "duplicado" ou "erro"."""
+        # Reenvio de um acesso já registrado
+        if id_evento and not idempotencia.reservar(id_evento):
+            return "duplicado"
+        registrado = False
         try:
-            # Reconectar se necessário
-            if arduino is None or not hasattr(arduino, 'is_open') or not arduino.is_open:
-                print("Tentando reconectar Arduino...")
-                if not inicializar_serial():
-                    time.sleep(3)
-                    continue
-            
-            # Ler dados
-            with serial_lock:
-                if arduino is not None and arduino.is_open:
-                    try:
-                        if arduino.in_waiting > 0:
-                            linha = arduino.readline().decode('utf-8', errors='ignore').strip()
-                            
-                            if linha:
-                                # Ignorar mensagens de sistema
-                                if any(palavra in linha.upper() for palavra in ['INICIADO', 'PRONTO', 'READY', 'SYSTEM', 'RFID']):
-                                    continue
-                                
-                                # Tentar extrair UID
-                                uid = extrair_uid(linha)
-                                
-                                if uid:
-                                    # Processar em thread separada
-                                    threading.Thread(target=processar_uid, args=(uid,), daemon=True).start()
-                            
-                    except Exception as e:
-                        print(f"Erro na leitura serial: {e}")
-                        arduino = None
-            
-            time.sleep(0.1)
-            
-        except Exception as e:
-            print(f"Erro geral na thread serial: {e}")
-            arduino = None
-            time.sleep(2)
+            registrado = processar_uid(uid, dispositivo_id, localizacao, id_evento=id_evento)
+        finally:
+            # Nada foi registrado (suprimido ou erro): o reenvio deve ser aceito
+            if id_evento and not registrado:
+                idempotencia.liberar(id_evento)
+        return "registrado" if registrado else "erro"
+
+    def registrar_lote(self, dispositivo_id, acessos):
+        return processar_lote(dispositivo_id, acessos)
+
+    def status_dispositivos(self):
+        return repositorio.status_dispositivos()
+
+    def vazao_dispositivos(self, granularidade, dispositivo=None, desde=None, ate=None):
+        return repositorio.vazao_dispositivos(granularidade, dispositivo, desde, ate)
+
+    def versao_analitico(self, desde=None, ate=None):
+        """Versão do período nas colunas analíticas (None se indisponíveis ou em construção)."""
+        if repositorio.colunas is None:
+            return None
+        return repositorio.colunas.versao(desde, ate)
+
+    def analitico(self, consulta, parametros):
+        """Executa a consulta analítica; retorna (versao, dados)."""
+        return repositorio.colunas.consultar(consulta, **parametros)
+
+# Substituído por um proxy do broker nos processos web do modo multiprocesso
+servico = ServicoCentral()
 
 # ===== ROTAS FLASK =====
 
@@ -420,37 +585,118 @@ def monitor_serial():
 def index():
     return render_template('index.html')
 
+def responder_em_cache(resposta):
+    """Resposta pronta do cache: 304 se o cliente já tem a versão, senão o corpo comprimido aceito."""
+    codificacao = None
+    if len(resposta.corpo) >= TAMANHO_MINIMO_COMPRESSAO:
+        if brotli_disponivel() and request.accept_encodings['br']:
+            codificacao = "br"
+        elif request.accept_encodings['gzip']:
+            codificacao = "gzip"
+    
+    # Cada codificação é uma representação diferente: ETag próprio
+    etag = f"{resposta.etag}-{codificacao}" if codificacao else resposta.etag
+    if request.if_none_match.contains(etag):
+        saida = Response(status=304)
+    else:
+        corpo = resposta.comprimido(codificacao) if codificacao else resposta.corpo
+        saida = Response(corpo, mimetype='application/json')
+        if codificacao:
+            saida.headers['Content-Encoding'] = codificacao
+    saida.set_etag(etag)
+    saida.headers['Cache-Control'] = 'no-cache'
+    saida.headers['Vary'] = 'Accept-Encoding'
+    return saida
+
 @app.route('/api/dados')
 def api_dados():
-    return jsonify(dados_em_memoria)
+    """Estado do painel; ?cartoes=0 omite a lista completa de cartões (use /api/cartoes).
+    
+    Serializado e comprimido uma vez por versão do estado ("seq"); polls
+    com If-None-Match da versão atual recebem 304 sem corpo.
+    """
+    incluir_cartoes = request.args.get('cartoes') != '0'
+    
+    def gerar():
+        dados = servico.dados_painel(incluir_cartoes=incluir_cartoes)
+        return dados["seq"], dados
+    
+    return responder_em_cache(cache_dados.obter(incluir_cartoes, servico.versao_painel(), gerar))
+
+def ler_periodo():
+    """Lê os parâmetros desde/ate (ISO 8601) da requisição (ValueError se inválidos)."""
+    periodo = {}
+    for nome in ('desde', 'ate'):
+        valor = request.args.get(nome)
+        if valor:
+            instante = normalizar_timestamp(valor)
+            if instante is None:
+                raise ValueError(f"{nome} inválido: use ISO 8601")
+            valor = instante.isoformat()
+        periodo[nome] = valor or None
+    return periodo
+
+def ler_filtros_consulta():
+    """Lê paginação e filtros comuns de /api/cartoes e /api/acessos (ValueError se inválidos)."""
+    limite = int(request.args.get('limite', TAMANHO_PAGINA_PADRAO))
+    if limite < 1:
+        raise ValueError("limite deve ser positivo")
+    
+    filtros = {
+        "limite": min(limite, TAMANHO_PAGINA_MAXIMO),
+        "prefixo": request.args.get('prefixo') or None,
+        "dispositivo": request.args.get('dispositivo') or None,
+        "resultado": request.args.get('resultado') or None
+    }
+    filtros.update(ler_periodo())
+    return filtros
+
+@app.route('/api/cartoes')
+def api_cartoes():
+    """Cartões paginados por UID (cursor = último UID da página anterior)."""
+    try:
+        filtros = ler_filtros_consulta()
+    except ValueError as e:
+        return jsonify({"status": "error", "message": str(e)}), 400
+    
+    cartoes, proximo = servico.consultar_cartoes(cursor=request.args.get('cursor') or None, **filtros)
+    return jsonify({"cartoes": cartoes, "proximo_cursor": proximo})
+
+@app.route('/api/acessos')
+def api_acessos():
+    """Histórico de acessos paginado, do mais recente ao mais antigo (memória + arquivo)."""
+    try:
+        filtros = ler_filtros_consulta()
+        acessos, proximo = servico.consultar_acessos(
+            cursor=request.args.get('cursor') or None,
+            uid=request.args.get('uid') or None,
+            **filtros
+        )
+    except ValueError as e:
+        return jsonify({"status": "error", "message": str(e)}), 400
+    
+    return jsonify({"acessos": acessos, "proximo_cursor": proximo})
 
 @app.route('/api/atualizar')
 def api_atualizar():
-    atualizar_dados_interface()
+    servico.atualizar()
     return jsonify({"status": "success", "message": "Dados atualizados"})
 
 @app.route('/api/status')
 def api_status():
-    status_serial = "conectado" if arduino is not None and arduino.is_open else "desconectado"
-    return jsonify({
-        "serial_status": status_serial,
-        "cartoes_cadastrados": len(dados_em_memoria["cards"]),
-        "sistema_id": SISTEMA_ID
-    })
+    # O cache de /api/dados é de cada processo web
+    return jsonify(dict(servico.status(), cache_dados=cache_dados.metricas()))
+
+@app.route('/metrics')
+def api_metricas():
+    """Métricas no formato de exposição do Prometheus."""
+    return Response(servico.metricas_prometheus(), mimetype='text/plain; version=0.0.4')
 
 @app.route('/api/reiniciar_serial')
 def api_reiniciar_serial():
-    """Rota para reiniciar a conexão serial."""
-    global arduino
+    """Rota para reiniciar a conexão serial (todas ou ?porta=...)."""
     try:
-        if arduino is not None:
-            try:
-                arduino.close()
-            except:
-                pass
-        arduino = None
-        time.sleep(1)
-        sucesso = inicializar_serial()
+        sucesso = servico.reiniciar_serial(request.args.get('porta'))
         return jsonify({
             "status": "success" if sucesso else "error", 
             "message": "Conexão serial reiniciada"
@@ -460,63 +706,117 @@ def api_reiniciar_serial():
 
 # ===== API PARA DISPOSITIVOS REMOTOS =====
 
+def tratar_acesso_remoto(dados):
+    """Valida e registra um acesso enviado por dispositivo remoto; retorna (resposta, código HTTP)."""
+    if not dados:
+        return {"status": "error", "message": "Dados não fornecidos"}, 400
+    
+    uid = dados.get('uid')
+    dispositivo_id = dados.get('dispositivo_id')
+    localizacao = dados.get('localizacao')
+    id_evento = dados.get('id_evento')
+    
+    if not uid or not dispositivo_id:
+        return {"status": "error", "message": "UID e dispositivo_id são obrigatórios"}, 400
+    
+    # Verificar se dispositivo é autorizado
+    if dispositivo_id not in DISPOSITIVOS_AUTORIZADOS:
+        return {"status": "error", "message": "Dispositivo não autorizado"}, 403
+    
+    # Processar o acesso (reenvios do mesmo id_evento não são contados de novo)
+    situacao = servico.registrar_acesso(uid, dispositivo_id, localizacao, id_evento)
+    
+    if situacao == "duplicado":
+        return {"status": "success", "message": "Acesso já registrado"}, 200
+    if situacao == "registrado":
+        return {"status": "success", "message": "Acesso registrado"}, 200
+    return {"status": "error", "message": "Erro ao processar acesso"}, 200
+
+def tratar_lote_remoto(dados):
+    """Valida e registra um lote enviado por dispositivo remoto; retorna (resposta, código HTTP)."""
+    if not dados or not isinstance(dados.get('acessos'), list):
+        return {"status": "error", "message": "Lista de acessos não fornecida"}, 400
+    
+    dispositivo_id = dados.get('dispositivo_id')
+    if dispositivo_id not in DISPOSITIVOS_AUTORIZADOS:
+        return {"status": "error", "message": "Dispositivo não autorizado"}, 403
+    
+    if len(dados['acessos']) > MAX_ACESSOS_POR_LOTE:
+        return {"status": "error", "message": f"Máximo de {MAX_ACESSOS_POR_LOTE} acessos por lote"}, 413
+    
+    resultados = servico.registrar_lote(dispositivo_id, dados['acessos'])
+    return {"status": "success", "resultados": resultados}, 200
+
 @app.route('/api/dispositivo/registrar_acesso', methods=['POST'])
 def registrar_acesso_remoto():
     """API para dispositivos remotos registrarem acessos."""
     try:
-        dados = request.get_json()
-        
-        if not dados:
-            return jsonify({"status": "error", "message": "Dados não fornecidos"}), 400
-        
-        uid = dados.get('uid')
-        dispositivo_id = dados.get('dispositivo_id')
-        localizacao = dados.get('localizacao')
-        
-        if not uid or not dispositivo_id:
-            return jsonify({"status": "error", "message": "UID e dispositivo_id são obrigatórios"}), 400
-        
-        # Verificar se dispositivo é autorizado
-        if dispositivo_id not in DISPOSITIVOS_AUTORIZADOS:
-            return jsonify({"status": "error", "message": "Dispositivo não autorizado"}), 403
-        
-        # Processar o acesso
-        sucesso = processar_uid(uid, dispositivo_id, localizacao)
-        
-        if sucesso:
-            return jsonify({"status": "success", "message": "Acesso registrado"})
-        else:
-            return jsonify({"status": "error", "message": "Erro ao processar acesso"})
-            
+        resposta, codigo = tratar_acesso_remoto(request.get_json())
+        return jsonify(resposta), codigo
+    except Exception as e:
+        return jsonify({"status": "error", "message": str(e)}), 500
+
+@app.route('/api/dispositivo/registrar_acessos_lote', methods=['POST'])
+def registrar_acessos_lote():
+    """API para dispositivos remotos enviarem vários acessos de uma vez.
+    
+    Cada acesso traz uid, id_evento e o timestamp do dispositivo. Os acessos
+    são avaliados em ordem de timestamp, persistidos numa única escrita e
+    notificados uma vez; reenvios do mesmo id_evento não são contados de novo.
+    """
+    try:
+        resposta, codigo = tratar_lote_remoto(request.get_json())
+        return jsonify(resposta), codigo
     except Exception as e:
         return jsonify({"status": "error", "message": str(e)}), 500
 
 @app.route('/api/dispositivo/status')
 def status_dispositivos():
     """Retorna status dos dispositivos do sistema."""
-    log_data = carregar_log()
-    
-    dispositivos = {}
-    for uid, info in log_data.items():
-        for acesso in info.get("acessos", []):
-            dispositivo = acesso.get("dispositivo")
-            if dispositivo not in dispositivos:
-                dispositivos[dispositivo] = {
-                    "total_acessos": 0,
-                    "ultimo_acesso": None,
-                    "acessos_suspeitos": 0
-                }
-            
-            dispositivos[dispositivo]["total_acessos"] += 1
-            
-            if acesso.get("resultado") == "Suspeito":
-                dispositivos[dispositivo]["acessos_suspeitos"] += 1
-            
-            # Atualizar último acesso
-            if not dispositivos[dispositivo]["ultimo_acesso"] or acesso["timestamp"] > dispositivos[dispositivo]["ultimo_acesso"]:
-                dispositivos[dispositivo]["ultimo_acesso"] = acesso["timestamp"]
+    return jsonify({"dispositivos": servico.status_dispositivos()})
+
+@app.route('/api/dispositivo/vazao')
+def vazao_dispositivos():
+    """Acessos por minuto/hora/dia de cada dispositivo (ou de um só)."""
+    granularidade = request.args.get('granularidade', 'hora')
+    try:
+        series = servico.vazao_dispositivos(
+            granularidade,
+            dispositivo=request.args.get('dispositivo') or None,
+            **ler_periodo()
+        )
+    except ValueError as e:
+        return jsonify({"status": "error", "message": str(e)}), 400
+    
+    return jsonify({"granularidade": granularidade, "dispositivos": series})
+
+@app.route('/api/analytics/<consulta>')
+def api_analitico(consulta):
+    """Agregações do histórico completo com NumPy: mapa_calor, dispositivos e cartoes.
     
-    return jsonify({"dispositivos": dispositivos})
+    Filtros: desde, ate, dispositivo, resultado; dispositivos aceita
+    granularidade (minuto/hora/dia/semana) e cartoes aceita limites
+    ("1,5,10") e top. O resultado fica em cache por consulta e parâmetros
+    enquanto nenhum acesso novo cair no período.
+    """
+    if consulta not in CONSULTAS:
+        return jsonify({"status": "error", "message": f"consulta desconhecida: {consulta}"}), 404
+    try:
+        parametros = ler_periodo()
+        for nome in ('dispositivo', 'resultado') + CONSULTAS[consulta]:
+            if request.args.get(nome):
+                parametros[nome] = request.args[nome]
+        
+        versao = servico.versao_analitico(parametros['desde'], parametros['ate'])
+        if versao is None:
+            return jsonify({"status": "error", "message": "Histórico analítico indisponível ou em construção"}), 503
+        
+        variante = (consulta, tuple(sorted(parametros.items(), key=lambda item: item[0])))
+        resposta = cache_analitico.obter(variante, versao, lambda: servico.analitico(consulta, parametros))
+    except ValueError as e:
+        return jsonify({"status": "error", "message": str(e)}), 400
+    
+    return responder_em_cache(resposta)
 
 # ===== SERVIÇO DE ARQUIVOS ESTÁTICOS =====
 
@@ -541,21 +841,40 @@ def handle_solicitar_dados():
 
 # ===== INICIALIZAÇÃO =====
 
-if __name__ == '__main__':
-    # Instalar dependências: pip install geopy requests flask-socketio
+def iniciar_sistema(threads_de_leitura=True):
+    """Carrega o estado e inicia as threads do processo dono do estado.
+    
+    Com threads_de_leitura=False, leitura serial e renovação da localização
+    ficam com o laço asyncio de quem chama (servidor_async.py).
     
-    # Criar arquivo de log se não existir
-    if not os.path.exists(ARQUIVO_LOG):
-        with open(ARQUIVO_LOG, 'w') as f:
-            json.dump({}, f, indent=4)
-        print("Arquivo de log criado")
+    Com threads, os leitores seriais começam antes da carga do histórico:
+    os taps já são lidos e enfileirados, e decididos assim que ela termina.
+    """
+    # Iniciar workers de acesso (também decidem os taps lidos no laço asyncio)
+    pool_acessos.iniciar()
+    
+    if threads_de_leitura:
+        # Carregar localização do cache e iniciar renovação em segundo plano
+        cache_localizacao.iniciar()
+        
+        # Iniciar thread serial
+        leitores.iniciar()
+    
+    # Migrar log legado e preparar diário de acessos
+    inicializar_armazenamento()
+    atexit.register(pool_acessos.encerrar)  # Roda antes de drenar a fila de escrita
     
     # Carregar dados iniciais
     atualizar_dados_interface()
     
-    # Iniciar thread serial
-    serial_thread = threading.Thread(target=monitor_serial, daemon=True)
-    serial_thread.start()
+    # Histórico completo em colunas para /api/analytics, sem atrasar a inicialização
+    if repositorio.colunas is not None:
+        threading.Thread(target=construir_historico_analitico, daemon=True).start()
+
+if __name__ == '__main__':
+    # Instalar dependências: pip install geopy requests flask-socketio
+    # Vários processos web: python servidor_multiprocesso.py
+    iniciar_sistema()
     
     print("🚀 Servidor Central iniciado em http://localhost:5000")
     print("📊 Interface web disponível")
@@ -563,6 +882,7 @@ if __name__ == '__main__':
     print("🌍 Sistema de geolocalização ativo")
     print("📡 API para dispositivos remotos disponível")
     print(f"🆔 ID do Sistema: {SISTEMA_ID}")
+    print(f"🔌 Leitores locais: {', '.join(l['porta'] + ' → ' + l['dispositivo_id'] for l in LEITORES_LOCAIS)}")
     print("📍 Acesse: http://localhost:5000 para ver a interface")
     
     # Usar socketio.run em vez de app.run
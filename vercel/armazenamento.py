@@ -0,0 +1,448 @@
+import json
+import os
+import pickle
+import threading
+import time
+
+from registros import RegistroAcesso, serializar_registro
+
+# ===== ESTRUTURA POR CARTÃO =====
+
+def aplicar_acesso(cartoes, uid, dados_acesso):
+    """Aplica um acesso na estrutura por cartão (mesmo formato do log_acessos.json)."""
+    agora = dados_acesso["timestamp"]
+    dispositivo_id = dados_acesso["dispositivo"]
+
+    if uid not in cartoes:
+        # Primeiro acesso - criar estrutura completa
+        cartoes[uid] = {
+            "primeiro_acesso": agora,
+            "ultimo_acesso": agora,
+            "vezes_usado": 1,
+            "acessos": [dados_acesso],
+            "dispositivos_utilizados": [dispositivo_id]
+        }
+        return cartoes[uid]
+
+    # Acesso subsequente - garantir que todas as chaves existam
+    # (um acesso reenviado pode ser mais antigo que os já aplicados)
+    info = cartoes[uid]
+    info["primeiro_acesso"] = min(info.get("primeiro_acesso") or agora, agora)
+    info["ultimo_acesso"] = max(info.get("ultimo_acesso") or agora, agora)
+    info["vezes_usado"] = info.get("vezes_usado", 0) + 1
+    info.setdefault("acessos", []).append(dados_acesso)
+
+    dispositivos = info.setdefault("dispositivos_utilizados", [])
+    if dispositivo_id not in dispositivos:
+        dispositivos.append(dispositivo_id)
+
+    return info
+
+def aparar_historico(cartoes, max_acessos, excedentes):
+    """Mantém só os últimos `max_acessos` de cada cartão; os removidos vão para `excedentes`."""
+    for uid, info in cartoes.items():
+        acessos = info.get("acessos", [])
+        if len(acessos) > max_acessos:
+            excedentes.extend((uid, acesso) for acesso in acessos[:-max_acessos])
+            del acessos[:-max_acessos]
+
+# ===== DIÁRIO DE ACESSOS (APPEND-ONLY) =====
+
+class DiarioAcessos:
+    """Diário de acessos em JSON Lines com snapshot compactado por cartão.
+
+    Cada acesso vira uma linha anexada ao diário, então o custo de escrita
+    não depende do tamanho do histórico. De tempos em tempos o diário é
+    rotacionado e um snapshot por cartão é reconstruído em segundo plano.
+
+    Com `max_acessos_por_cartao`, o snapshot e o estado carregado guardam só
+    os acessos mais recentes de cada cartão; os mais antigos ficam no
+    `arquivo` (ArquivoHistorico), garantidos a cada carga e compactação.
+    O snapshot guarda a marca do arquivo (ArquivoHistorico.marca()) de
+    quando seu seq era o último do diário: os excedentes de acessos
+    posteriores só podem ter sido arquivados depois dela, então garantir
+    lê só o que foi anexado desde então, não o histórico inteiro. Guarda
+    também o id_evento dos `max_eventos_arquivados` acessos arquivados
+    mais recentes, entregues na carga em `eventos_arquivados_carregados`
+    para que reenvios de acessos já arquivados continuem sendo descartados.
+
+    Com `arquivo_snapshot_binario`, o snapshot é gravado em pickle com os
+    acessos em tuplas (RegistroAcesso.para_tupla), bem mais rápido de ler
+    que o JSON. `agregados` é uma fábrica de agregados persistidos junto
+    (adicionar(dados_acesso), estado(), restaurar(estado)): a compactação
+    aplica neles o mesmo segmento do diário, e a carga os entrega em
+    `agregados_carregados` já com a cauda do diário reproduzida, sem
+    percorrer o histórico arquivado.
+    """
+
+    VERSAO_SNAPSHOT = 1
+    VERSAO_SNAPSHOT_BINARIO = 1
+
+    def __init__(self, arquivo_diario, arquivo_snapshot, fsync_a_cada=50,
+                 intervalo_fsync=0.5, compactar_a_cada=10000,
+                 max_acessos_por_cartao=None, arquivo=None,
+                 arquivo_snapshot_binario=None, agregados=None, max_eventos_arquivados=0):
+        self.arquivo_diario = arquivo_diario
+        self.arquivo_snapshot = arquivo_snapshot
+        self.arquivo_snapshot_binario = arquivo_snapshot_binario
+        self.agregados = agregados
+        self.agregados_carregados = None
+        self.arquivo_compactando = arquivo_diario + ".compactando"
+        self.fsync_a_cada = fsync_a_cada
+        self.intervalo_fsync = intervalo_fsync
+        self.compactar_a_cada = compactar_a_cada
+        self.max_acessos_por_cartao = max_acessos_por_cartao
+        self.arquivo = arquivo
+        self.max_eventos_arquivados = max_eventos_arquivados
+        self.eventos_arquivados_carregados = None
+
+        self._lock = threading.Lock()
+        self._lock_compactacao = threading.Lock()
+        self._arquivo = None
+        self._seq = None
+        self._pendentes_fsync = 0
+        self._desde_compactacao = 0
+        self._thread_compactacao = None
+        self._thread_fsync = None
+        self._arquivado_carga = {}
+        self._marca_rotacao = None
+        self._ativo = False
+
+    # ----- Leitura -----
+
+    def _ler_snapshot(self):
+        """Lê o snapshot compactado; retorna (seq, cartoes, agregados, arquivado).
+
+        `agregados` é None sem fábrica configurada ou quando o snapshot não
+        os tem (JSON, log legado migrado): quem carrega precisa recalculá-los.
+        `arquivado` traz "marca_arquivo" e "eventos_arquivados", None num
+        snapshot sem eles (anterior a eles, log legado): a primeira carga
+        confere o arquivo inteiro.
+        """
+        if self.arquivo_snapshot_binario and os.path.exists(self.arquivo_snapshot_binario):
+            return self._ler_snapshot_binario()
+        if not os.path.exists(self.arquivo_snapshot):
+            return 0, {}, None, {}
+        with open(self.arquivo_snapshot, 'r', encoding='utf-8') as f:
+            conteudo = f.read().strip()
+        if not conteudo:
+            return 0, {}, None, {}
+        snapshot = json.loads(conteudo)
+        cartoes = snapshot.get("cartoes", {})
+        for info in cartoes.values():
+            info["acessos"] = [RegistroAcesso.de_dict(acesso) for acesso in info.get("acessos", [])]
+        return snapshot.get("seq", 0), cartoes, None, self._arquivado(snapshot)
+
+    @staticmethod
+    def _arquivado(snapshot):
+        return {chave: snapshot.get(chave) for chave in ("marca_arquivo", "eventos_arquivados")}
+
+    def _ler_snapshot_binario(self):
+        with open(self.arquivo_snapshot_binario, 'rb') as f:
+            snapshot = pickle.load(f)
+        if snapshot.get("versao") != self.VERSAO_SNAPSHOT_BINARIO:
+            raise ValueError(f"versão do snapshot binário não suportada: {snapshot.get('versao')}")
+        de_tupla = RegistroAcesso.de_tupla
+        cartoes = {}
+        for uid, (info, acessos) in snapshot["cartoes"].items():
+            info["acessos"] = [de_tupla(acesso) for acesso in acessos]
+            cartoes[uid] = info
+        return (snapshot["seq"], cartoes, self._novos_agregados(snapshot.get("agregados")),
+                self._arquivado(snapshot))
+
+    def _novos_agregados(self, estado):
+        """Agregados restaurados de `estado`; None se indisponíveis."""
+        if self.agregados is None or estado is None:
+            return None
+        agregados = self.agregados()
+        if not agregados.restaurar(estado):
+            return None  # Configuração mudou (ex.: retenção): recalcular
+        return agregados
+
+    @staticmethod
+    def _ler_registros(caminho):
+        """Itera sobre os registros de um arquivo de diário, ignorando linhas corrompidas."""
+        if not os.path.exists(caminho):
+            return
+        with open(caminho, 'r', encoding='utf-8') as f:
+            for linha in f:
+                linha = linha.strip()
+                if not linha:
+                    continue
+                try:
+                    yield json.loads(linha)
+                except ValueError:
+                    # Linha parcial (queda durante a escrita)
+                    continue
+
+    def _reproduzir(self, cartoes, seq_base, caminhos, agregados=None):
+        """Reaplica os registros dos diários sobre o snapshot; retorna o último seq."""
+        ultimo_seq = seq_base
+        for caminho in caminhos:
+            for registro in self._ler_registros(caminho):
+                seq = registro.get("seq", 0)
+                if seq <= seq_base:
+                    continue
+                dados_acesso = RegistroAcesso.de_dict(registro["acesso"])
+                aplicar_acesso(cartoes, registro["uid"], dados_acesso)
+                if agregados is not None:
+                    agregados.adicionar(dados_acesso)
+                ultimo_seq = max(ultimo_seq, seq)
+        return ultimo_seq
+
+    def _arquivar_excedentes(self, cartoes, arquivado):
+        """Apara o histórico dos cartões e garante os excedentes no arquivo.
+
+        Retorna o estado do arquivo para o próximo snapshot, com os eventos
+        dos excedentes somados aos do snapshot (a marca fica com quem chama).
+        """
+        if self.max_acessos_por_cartao is None or self.arquivo is None:
+            return {}
+        eventos = None
+        if self.max_eventos_arquivados:
+            eventos = arquivado.get("eventos_arquivados")
+            if eventos is None:
+                # Snapshot sem a lista: percorrer o arquivo uma vez (antes de garantir os excedentes)
+                eventos = self.arquivo.eventos_recentes(self.max_eventos_arquivados)
+
+        excedentes = []
+        aparar_historico(cartoes, self.max_acessos_por_cartao, excedentes)
+        recuperados = self.arquivo.garantir(excedentes, arquivado.get("marca_arquivo"))
+        if recuperados:
+            print(f"Arquivo de acessos: {recuperados} acessos antigos arquivados")
+        if eventos is None:
+            return {}
+
+        eventos = list(eventos)
+        eventos.extend(acesso.get("id_evento") for _, acesso in excedentes if acesso.get("id_evento"))
+        # Sem repetidos: excedentes de uma carga anterior podem já estar na varredura
+        eventos = list(dict.fromkeys(eventos))
+        return {"eventos_arquivados": eventos[-self.max_eventos_arquivados:]}
+
+    def carregar(self):
+        """Carrega o estado por cartão (snapshot + diário), com o histórico aparado.
+
+        Os agregados do snapshot, com a mesma cauda do diário aplicada, ficam
+        em `agregados_carregados` (None se precisarem ser recalculados), e os
+        id_evento de acessos arquivados em `eventos_arquivados_carregados`.
+        """
+        with self._lock:
+            if self._arquivo is not None:
+                self._arquivo.flush()
+            with self._lock_compactacao:
+                seq_snapshot, cartoes, agregados, arquivado = self._ler_snapshot()
+                ultimo_seq = self._reproduzir(
+                    cartoes, seq_snapshot, [self.arquivo_compactando, self.arquivo_diario], agregados
+                )
+            if self._seq is None:
+                self._seq = ultimo_seq
+            arquivado = self._arquivar_excedentes(cartoes, arquivado)
+            # Excedentes de acessos novos só são arquivados depois desta marca
+            arquivado["marca_arquivo"] = self._marca_atual()
+            self._arquivado_carga = arquivado
+            self.agregados_carregados = agregados
+            self.eventos_arquivados_carregados = arquivado.get("eventos_arquivados")
+        return cartoes
+
+    # ----- Escrita -----
+
+    def _garantir_aberto(self):
+        """Abre o diário para anexar (chamado com o lock adquirido)."""
+        if self._arquivo is not None:
+            return
+        if self._seq is None:
+            with self._lock_compactacao:
+                seq_snapshot, cartoes, _, _ = self._ler_snapshot()
+                self._seq = self._reproduzir(
+                    cartoes, seq_snapshot, [self.arquivo_compactando, self.arquivo_diario]
+                )
+        self._arquivo = open(self.arquivo_diario, 'a', encoding='utf-8')
+        self._iniciar_thread_fsync()
+
+    def _iniciar_thread_fsync(self):
+        if self._thread_fsync is not None and self._thread_fsync.is_alive():
+            return
+        self._ativo = True
+        self._thread_fsync = threading.Thread(target=self._loop_fsync, daemon=True)
+        self._thread_fsync.start()
+
+    def _loop_fsync(self):
+        """Faz fsync periódico dos registros pendentes."""
+        while self._ativo:
+            time.sleep(self.intervalo_fsync)
+            with self._lock:
+                self._sincronizar()
+
+    def _sincronizar(self):
+        """Força os registros pendentes para o disco (chamado com o lock adquirido)."""
+        if self._arquivo is None or self._pendentes_fsync == 0:
+            return
+        try:
+            self._arquivo.flush()
+            os.fsync(self._arquivo.fileno())
+            self._pendentes_fsync = 0
+        except Exception as e:
+            print(f"Erro ao sincronizar diário: {e}")
+
+    def anexar(self, uid, dados_acesso):
+        """Anexa um acesso ao diário; custo constante, independente do histórico."""
+        return self.anexar_lote([(uid, dados_acesso)])
+
+    def anexar_lote(self, acessos):
+        """Anexa vários acessos [(uid, dados_acesso)] com uma única escrita."""
+        if not acessos:
+            return True
+        with self._lock:
+            self._garantir_aberto()
+            linhas = []
+            for uid, dados_acesso in acessos:
+                self._seq += 1
+                registro = {"seq": self._seq, "uid": uid, "acesso": dados_acesso}
+                linhas.append(json.dumps(registro, ensure_ascii=False, default=serializar_registro) + "\n")
+            self._arquivo.write("".join(linhas))
+            self._arquivo.flush()
+
+            self._pendentes_fsync += len(acessos)
+            if self._pendentes_fsync >= self.fsync_a_cada:
+                self._sincronizar()
+
+            self._desde_compactacao += len(acessos)
+            precisa_compactar = self._desde_compactacao >= self.compactar_a_cada
+
+        if precisa_compactar:
+            self.compactar()
+        return True
+
+    # ----- Compactação -----
+
+    def compactar(self, em_segundo_plano=True):
+        """Rotaciona o diário e reconstrói o snapshot por cartão."""
+        with self._lock:
+            if self._thread_compactacao is not None and self._thread_compactacao.is_alive():
+                return False
+            if os.path.exists(self.arquivo_compactando):
+                # Compactação anterior interrompida: terminar antes de rotacionar de novo
+                # (sem marca da rotação: fica a do snapshot anterior, mais antiga)
+                self._marca_rotacao = None
+            elif os.path.exists(self.arquivo_diario) and os.path.getsize(self.arquivo_diario) > 0:
+                if self._arquivo is not None:
+                    self._sincronizar()
+                    self._arquivo.close()
+                    self._arquivo = None
+                os.replace(self.arquivo_diario, self.arquivo_compactando)
+                # Com o lock: nenhum acesso posterior à rotação foi gravado (nem arquivado) ainda
+                self._marca_rotacao = self._marca_atual()
+            else:
+                return False
+
+            self._desde_compactacao = 0
+            self._thread_compactacao = threading.Thread(target=self._reconstruir_snapshot, daemon=True)
+            self._thread_compactacao.start()
+
+        if not em_segundo_plano:
+            self._thread_compactacao.join()
+        return True
+
+    def _reconstruir_snapshot(self):
+        """Gera o novo snapshot a partir do anterior + segmento rotacionado."""
+        try:
+            seq_snapshot, cartoes, agregados, anterior = self._ler_snapshot()
+            ultimo_seq = self._reproduzir(cartoes, seq_snapshot, [self.arquivo_compactando], agregados)
+            arquivado = self._arquivar_excedentes(cartoes, anterior)
+            arquivado["marca_arquivo"] = (
+                self._marca_rotacao if self._marca_rotacao is not None else anterior.get("marca_arquivo")
+            )
+            self._escrever_snapshot(ultimo_seq, cartoes, agregados=agregados, arquivado=arquivado)
+        except Exception as e:
+            print(f"Erro ao compactar diário: {e}")
+
+    def salvar_snapshot(self, cartoes, agregados):
+        """Grava o estado carregado como snapshot no seq atual.
+
+        Para a inicialização, antes de aceitar acessos: com os agregados
+        recalculados uma vez, as próximas cargas não percorrem o histórico.
+        """
+        if not self.arquivo_snapshot_binario:
+            return False
+        with self._lock:
+            seq = self._seq
+        self._escrever_snapshot(seq, cartoes, remover_segmento=False, agregados=agregados,
+                                arquivado=self._arquivado_carga)
+        return True
+
+    def _marca_atual(self):
+        """Marca do arquivo para o snapshot (None sem arquivo ou sem limite por cartão)."""
+        if self.arquivo is None or self.max_acessos_por_cartao is None:
+            return None
+        return self.arquivo.marca()
+
+    def _escrever_snapshot(self, seq, cartoes, remover_segmento=True, agregados=None, arquivado=None):
+        """Grava o snapshot de forma atômica (arquivo temporário + replace)."""
+        arquivado = self._arquivado(arquivado or {})
+        if self.arquivo_snapshot_binario:
+            destino = self.arquivo_snapshot_binario
+            temporario = destino + ".tmp"
+            de_dict = RegistroAcesso.de_dict
+            snapshot = {
+                "versao": self.VERSAO_SNAPSHOT_BINARIO,
+                "seq": seq,
+                "cartoes": {
+                    uid: (
+                        {chave: valor for chave, valor in info.items() if chave != "acessos"},
+                        [de_dict(acesso).para_tupla() for acesso in info.get("acessos", [])]
+                    )
+                    for uid, info in cartoes.items()
+                },
+                "agregados": agregados.estado() if agregados is not None else None,
+                **arquivado
+            }
+            with open(temporario, 'wb') as f:
+                pickle.dump(snapshot, f, protocol=pickle.HIGHEST_PROTOCOL)
+                f.flush()
+                os.fsync(f.fileno())
+        else:
+            destino = self.arquivo_snapshot
+            temporario = destino + ".tmp"
+            with open(temporario, 'w', encoding='utf-8') as f:
+                json.dump({"versao": self.VERSAO_SNAPSHOT, "seq": seq, "cartoes": cartoes, **arquivado}, f,
+                          ensure_ascii=False, default=serializar_registro)
+                f.flush()
+                os.fsync(f.fileno())
+
+        with self._lock_compactacao:
+            os.replace(temporario, destino)
+            if destino != self.arquivo_snapshot and os.path.exists(self.arquivo_snapshot):
+                # O snapshot JSON anterior ficou obsoleto
+                os.remove(self.arquivo_snapshot)
+            if remover_segmento and os.path.exists(self.arquivo_compactando):
+                os.remove(self.arquivo_compactando)
+
+    # ----- Migração / ciclo de vida -----
+
+    def migrar_log_legado(self, arquivo_legado):
+        """Importa um log_acessos.json antigo para o snapshot (apenas na primeira execução)."""
+        if os.path.exists(self.arquivo_snapshot) or not os.path.exists(arquivo_legado):
+            return False
+        if self.arquivo_snapshot_binario and os.path.exists(self.arquivo_snapshot_binario):
+            return False
+        try:
+            with open(arquivo_legado, 'r', encoding='utf-8') as f:
+                conteudo = f.read().strip()
+            cartoes = json.loads(conteudo) if conteudo else {}
+            self._escrever_snapshot(0, cartoes, remover_segmento=False)
+            print(f"Log legado migrado: {len(cartoes)} cartões importados de {arquivo_legado}")
+            return True
+        except Exception as e:
+            print(f"Erro ao migrar log legado: {e}")
+            return False
+
+    def fechar(self):
+        """Sincroniza e fecha o diário."""
+        self._ativo = False
+        with self._lock:
+            if self._arquivo is not None:
+                self._sincronizar()
+                self._arquivo.close()
+                self._arquivo = None
+        if self._thread_compactacao is not None:
+            self._thread_compactacao.join()
@@ -0,0 +1,491 @@
+import json
+import os
+import sqlite3
+import threading
+
+from armazenamento import aparar_historico
+from arquivo_historico import expandir_acesso
+from registros import RegistroAcesso
+
+# ===== ESQUEMA =====
+
+ESQUEMA = """
+CREATE TABLE IF NOT EXISTS devices (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    name TEXT UNIQUE NOT NULL
+);
+CREATE TABLE IF NOT EXISTS cards (
+    uid TEXT PRIMARY KEY,
+    first_access TEXT,
+    last_access TEXT,
+    uses INTEGER NOT NULL DEFAULT 0,
+    devices TEXT NOT NULL DEFAULT '[]'
+);
+CREATE TABLE IF NOT EXISTS accesses (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    uid TEXT NOT NULL,
+    ts TEXT NOT NULL,
+    device_id INTEGER NOT NULL REFERENCES devices(id),
+    result TEXT,
+    location TEXT,
+    event_id TEXT,
+    extras TEXT,
+    archived INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS idx_accesses_uid_ts ON accesses (uid, ts);
+CREATE INDEX IF NOT EXISTS idx_accesses_device_ts ON accesses (device_id, ts);
+CREATE INDEX IF NOT EXISTS idx_accesses_ts ON accesses (ts);
+CREATE TABLE IF NOT EXISTS device_stats (
+    device_id INTEGER PRIMARY KEY REFERENCES devices(id),
+    total INTEGER NOT NULL DEFAULT 0,
+    suspicious INTEGER NOT NULL DEFAULT 0,
+    last_access TEXT
+);
+CREATE TABLE IF NOT EXISTS device_buckets (
+    device_id INTEGER NOT NULL REFERENCES devices(id),
+    granularity TEXT NOT NULL,
+    bucket TEXT NOT NULL,
+    accesses INTEGER NOT NULL DEFAULT 0,
+    suspicious INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (device_id, granularity, bucket)
+);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+
+SQL_INSERIR_ACESSO = (
+    "INSERT INTO accesses (uid, ts, device_id, result, location, event_id, extras) "
+    "VALUES (?, ?, ?, ?, ?, ?, ?)"
+)
+
+SQL_ATUALIZAR_CARTAO = """
+INSERT INTO cards (uid, first_access, last_access, uses, devices)
+VALUES (?, ?, ?, 1, json_array(?))
+ON CONFLICT(uid) DO UPDATE SET
+    first_access = MIN(COALESCE(first_access, excluded.first_access), excluded.first_access),
+    last_access = MAX(COALESCE(last_access, excluded.last_access), excluded.last_access),
+    uses = uses + 1,
+    devices = CASE
+        WHEN EXISTS (SELECT 1 FROM json_each(cards.devices) WHERE value = json_extract(excluded.devices, '$[0]'))
+        THEN devices
+        ELSE json_insert(devices, '$[#]', json_extract(excluded.devices, '$[0]'))
+    END
+"""
+
+SQL_CONTAR_DISPOSITIVO = """
+INSERT INTO device_stats (device_id, total, suspicious, last_access)
+VALUES (?, ?, ?, ?)
+ON CONFLICT(device_id) DO UPDATE SET
+    total = total + excluded.total,
+    suspicious = suspicious + excluded.suspicious,
+    last_access = CASE
+        WHEN last_access IS NULL OR excluded.last_access > last_access THEN excluded.last_access
+        ELSE last_access
+    END
+"""
+
+SQL_CONTAR_BUCKET = """
+INSERT INTO device_buckets (device_id, granularity, bucket, accesses, suspicious)
+VALUES (?, ?, ?, ?, ?)
+ON CONFLICT(device_id, granularity, bucket) DO UPDATE SET
+    accesses = accesses + excluded.accesses,
+    suspicious = suspicious + excluded.suspicious
+"""
+
+# Buckets além da retenção de cada dispositivo/granularidade (podados na carga)
+SQL_PODAR_BUCKETS = """
+DELETE FROM device_buckets WHERE rowid IN (
+    SELECT rowid FROM (
+        SELECT rowid, ROW_NUMBER() OVER (PARTITION BY device_id ORDER BY bucket DESC) AS posicao
+        FROM device_buckets WHERE granularity = ?
+    ) WHERE posicao > ?
+)
+"""
+
+SQL_SELECIONAR_ACESSOS = (
+    "SELECT a.uid, a.ts, d.name, a.result, a.location, a.event_id, a.extras "
+    "FROM accesses a JOIN devices d ON d.id = a.device_id"
+)
+
+# ===== ARMAZENAMENTO SQLITE =====
+
+class ArmazenamentoSQLite:
+    """Persistência em SQLite (WAL) com a mesma interface do DiarioAcessos.
+
+    Cada lote da fila de escrita vira uma única transação (group commit)
+    com instruções preparadas. Os índices (uid, ts) e (device, ts) atendem
+    as consultas de histórico; com `max_acessos_por_cartao`, os acessos
+    antigos ficam marcados como arquivados no próprio banco e só eles são
+    consultados pelo `arquivo`.
+
+    Com `agregados` (a mesma fábrica do DiarioAcessos), os contadores por
+    dispositivo e os buckets de vazão ficam em tabelas atualizadas na
+    transação de cada lote, e a carga os entrega em `agregados_carregados`
+    sem percorrer o histórico. Num banco sem eles (ou com outra retenção),
+    são recalculados uma vez em SQL. Como no DiarioAcessos, o id_evento dos
+    `max_eventos_arquivados` acessos arquivados mais recentes fica em
+    `eventos_arquivados_carregados`.
+    """
+
+    def __init__(self, arquivo_banco, max_acessos_por_cartao=None, timeout=30, agregados=None,
+                 max_eventos_arquivados=0):
+        self.arquivo_banco = arquivo_banco
+        self.max_acessos_por_cartao = max_acessos_por_cartao
+        self.max_eventos_arquivados = max_eventos_arquivados
+        self.eventos_arquivados_carregados = None
+        self.agregados = agregados
+        self.agregados_carregados = None
+        self._lock_escrita = threading.Lock()
+        self._lock_leitura = threading.Lock()
+        self._ids_dispositivos = {}
+        # Granularidade -> tamanho do prefixo do timestamp (None: agregados não mantidos)
+        modelo = agregados() if agregados is not None else None
+        self._prefixos = modelo.prefixos() if modelo is not None else None
+        self._retencao = modelo.retencao if modelo is not None else None
+
+        self._escrita = sqlite3.connect(arquivo_banco, timeout=timeout, check_same_thread=False)
+        self._escrita.execute("PRAGMA journal_mode=WAL")
+        self._escrita.execute("PRAGMA synchronous=NORMAL")
+        self._escrita.executescript(ESQUEMA)
+        self._escrita.commit()
+        self._preparar_agregados()
+        # Leitores não bloqueiam a escrita no modo WAL
+        self._leitura = sqlite3.connect(arquivo_banco, timeout=timeout, check_same_thread=False)
+
+        self.arquivo = HistoricoSQLite(self)
+
+    # ----- Conversões -----
+
+    def _id_dispositivo(self, nome):
+        """Id do dispositivo, criando-o se preciso (chamado na transação de escrita)."""
+        id_dispositivo = self._ids_dispositivos.get(nome)
+        if id_dispositivo is None:
+            self._escrita.execute("INSERT OR IGNORE INTO devices (name) VALUES (?)", (nome,))
+            id_dispositivo = self._escrita.execute(
+                "SELECT id FROM devices WHERE name = ?", (nome,)
+            ).fetchone()[0]
+            self._ids_dispositivos[nome] = id_dispositivo
+        return id_dispositivo
+
+    def _linha_acesso(self, uid, dados_acesso):
+        registro = RegistroAcesso.de_dict(dados_acesso)
+        extras = {
+            chave: valor for chave, valor in registro.para_json().items()
+            if chave not in ("timestamp", "dispositivo", "resultado", "localizacao", "id_evento")
+        }
+        return (
+            uid,
+            registro.timestamp,
+            self._id_dispositivo(registro.dispositivo),
+            registro.resultado,
+            json.dumps(registro.localizacao, ensure_ascii=False),
+            registro.id_evento,
+            json.dumps(extras, ensure_ascii=False) if extras else None
+        )
+
+    @staticmethod
+    def _dados_linha(linha):
+        """Acesso no formato do diário a partir de uma linha de SQL_SELECIONAR_ACESSOS."""
+        _, ts, dispositivo, resultado, localizacao, id_evento, extras = linha
+        dados = {
+            "timestamp": ts,
+            "dispositivo": dispositivo,
+            "resultado": resultado,
+            "localizacao": json.loads(localizacao) if localizacao else {}
+        }
+        if id_evento is not None:
+            dados["id_evento"] = id_evento
+        if extras:
+            dados.update(json.loads(extras))
+        return dados
+
+    # ----- Agregados por dispositivo -----
+
+    def _preparar_agregados(self):
+        """Recalcula as tabelas de agregados se não correspondem à retenção configurada."""
+        with self._escrita:
+            if self._prefixos is None:
+                # Não mantidos daqui em diante: recalcular quando voltarem a ser
+                self._escrita.execute("DELETE FROM meta WHERE key = 'retencao_vazao'")
+                return
+            configurados = json.dumps(self._retencao, sort_keys=True)
+            gravados = self._escrita.execute("SELECT value FROM meta WHERE key = 'retencao_vazao'").fetchone()
+            if gravados is not None and gravados[0] == configurados:
+                return
+            print("Banco de acessos: recalculando os agregados por dispositivo")
+            self._escrita.execute("DELETE FROM device_stats")
+            self._escrita.execute("DELETE FROM device_buckets")
+            self._escrita.execute(
+                "INSERT INTO device_stats (device_id, total, suspicious, last_access) "
+                "SELECT device_id, COUNT(*), SUM(result = 'Suspeito'), MAX(NULLIF(ts, '')) "
+                "FROM accesses GROUP BY device_id"
+            )
+            for granularidade, prefixo in self._prefixos.items():
+                self._escrita.execute(
+                    "INSERT INTO device_buckets (device_id, granularity, bucket, accesses, suspicious) "
+                    "SELECT device_id, ?, substr(ts, 1, ?), COUNT(*), SUM(result = 'Suspeito') "
+                    "FROM accesses WHERE ts != '' GROUP BY device_id, substr(ts, 1, ?)",
+                    (granularidade, prefixo, prefixo)
+                )
+            self._escrita.execute(
+                "INSERT OR REPLACE INTO meta (key, value) VALUES ('retencao_vazao', ?)", (configurados,)
+            )
+
+    def _contar_agregados(self, linhas):
+        """Soma as linhas de acesso aos agregados (chamado na transação de escrita)."""
+        if self._prefixos is None:
+            return
+        dispositivos = {}
+        buckets = {}
+        for _, ts, id_dispositivo, resultado, *_ in linhas:
+            suspeito = 1 if resultado == "Suspeito" else 0
+            contagem = dispositivos.setdefault(id_dispositivo, [0, 0, None])
+            contagem[0] += 1
+            contagem[1] += suspeito
+            if not ts:
+                continue
+            if contagem[2] is None or ts > contagem[2]:
+                contagem[2] = ts
+            for granularidade, prefixo in self._prefixos.items():
+                contagem_bucket = buckets.setdefault((id_dispositivo, granularidade, ts[:prefixo]), [0, 0])
+                contagem_bucket[0] += 1
+                contagem_bucket[1] += suspeito
+        self._escrita.executemany(SQL_CONTAR_DISPOSITIVO, [
+            (id_dispositivo, *contagem) for id_dispositivo, contagem in dispositivos.items()
+        ])
+        self._escrita.executemany(SQL_CONTAR_BUCKET, [
+            (*chave, *contagem) for chave, contagem in buckets.items()
+        ])
+
+    def _carregar_agregados(self):
+        """Agregados lidos das tabelas, com os buckets além da retenção podados (None sem fábrica)."""
+        if self.agregados is None:
+            return None
+        agregados = self.agregados()
+        with self._lock_escrita:
+            with self._escrita:
+                for granularidade, limite in agregados.retencao.items():
+                    self._escrita.execute(SQL_PODAR_BUCKETS, (granularidade, limite))
+        with self._lock_leitura:
+            dispositivos = {
+                nome: {"total_acessos": total, "ultimo_acesso": ultimo, "acessos_suspeitos": suspeitos}
+                for nome, total, suspeitos, ultimo in self._leitura.execute(
+                    "SELECT d.name, s.total, s.suspicious, s.last_access "
+                    "FROM device_stats s JOIN devices d ON d.id = s.device_id"
+                )
+            }
+            buckets = {}
+            for nome, granularidade, bucket, acessos, suspeitos in self._leitura.execute(
+                "SELECT d.name, b.granularity, b.bucket, b.accesses, b.suspicious "
+                "FROM device_buckets b JOIN devices d ON d.id = b.device_id ORDER BY b.bucket"
+            ):
+                chaves, contagens = buckets.setdefault((nome, granularidade), ([], {}))
+                chaves.append(bucket)
+                contagens[bucket] = [acessos, suspeitos]
+        agregados.restaurar({"retencao": agregados.retencao, "dispositivos": dispositivos, "buckets": buckets})
+        return agregados
+
+    # ----- Leitura -----
+
+    def carregar(self):
+        """Carrega os cartões e os acessos não arquivados, com o histórico aparado."""
+        with self._lock_leitura:
+            cartoes = {
+                uid: {
+                    "primeiro_acesso": primeiro,
+                    "ultimo_acesso": ultimo,
+                    "vezes_usado": usos,
+                    "acessos": [],
+                    "dispositivos_utilizados": json.loads(dispositivos)
+                }
+                for uid, primeiro, ultimo, usos, dispositivos in self._leitura.execute(
+                    "SELECT uid, first_access, last_access, uses, devices FROM cards"
+                )
+            }
+            for linha in self._leitura.execute(SQL_SELECIONAR_ACESSOS + " WHERE a.archived = 0 ORDER BY a.id"):
+                info = cartoes.get(linha[0])
+                if info is not None:
+                    info["acessos"].append(RegistroAcesso.de_dict(self._dados_linha(linha)))
+
+        if self.max_acessos_por_cartao is not None:
+            excedentes = []
+            aparar_historico(cartoes, self.max_acessos_por_cartao, excedentes)
+            arquivados = self.arquivo.garantir(excedentes)
+            if arquivados:
+                print(f"Banco de acessos: {arquivados} acessos antigos arquivados")
+        self.agregados_carregados = self._carregar_agregados()
+        if self.max_eventos_arquivados:
+            with self._lock_leitura:
+                self.eventos_arquivados_carregados = [linha[0] for linha in reversed(self._leitura.execute(
+                    "SELECT event_id FROM accesses WHERE archived = 1 AND event_id IS NOT NULL "
+                    "ORDER BY id DESC LIMIT ?", (self.max_eventos_arquivados,)
+                ).fetchall())]
+        return cartoes
+
+    # ----- Escrita -----
+
+    def anexar(self, uid, dados_acesso):
+        return self.anexar_lote([(uid, dados_acesso)])
+
+    def anexar_lote(self, acessos):
+        """Grava um lote de acessos [(uid, dados_acesso)] numa única transação."""
+        if not acessos:
+            return True
+        with self._lock_escrita:
+            try:
+                with self._escrita:
+                    linhas = [self._linha_acesso(uid, dados) for uid, dados in acessos]
+                    self._escrita.executemany(SQL_INSERIR_ACESSO, linhas)
+                    self._escrita.executemany(SQL_ATUALIZAR_CARTAO, [
+                        (uid, ts, ts, dados.get("dispositivo"))
+                        for (uid, dados), (_, ts, *_) in zip(acessos, linhas)
+                    ])
+                    self._contar_agregados(linhas)
+            except Exception:
+                # Dispositivos criados na transação desfeita não existem mais
+                self._ids_dispositivos.clear()
+                raise
+        return True
+
+    def importar_cartoes(self, cartoes):
+        """Importa cartões no formato do log_acessos.json (migração); retorna o total de acessos."""
+        total = 0
+        with self._lock_escrita:
+            with self._escrita:
+                for uid, info in cartoes.items():
+                    acessos = info.get("acessos", [])
+                    self._escrita.execute(
+                        "INSERT OR REPLACE INTO cards (uid, first_access, last_access, uses, devices) "
+                        "VALUES (?, ?, ?, ?, ?)",
+                        (
+                            uid,
+                            info.get("primeiro_acesso", info.get("ultimo_acesso")),
+                            info.get("ultimo_acesso"),
+                            info.get("vezes_usado", len(acessos)),
+                            json.dumps(info.get("dispositivos_utilizados", []), ensure_ascii=False)
+                        )
+                    )
+                    linhas = [self._linha_acesso(uid, dados) for dados in acessos]
+                    self._escrita.executemany(SQL_INSERIR_ACESSO, linhas)
+                    self._contar_agregados(linhas)
+                    total += len(acessos)
+        return total
+
+    def vazio(self):
+        with self._lock_leitura:
+            return self._leitura.execute("SELECT COUNT(*) FROM cards").fetchone()[0] == 0
+
+    # ----- Migração / ciclo de vida -----
+
+    def migrar_log_legado(self, arquivo_legado):
+        """Importa um log_acessos.json antigo (apenas com o banco vazio)."""
+        if not os.path.exists(arquivo_legado) or not self.vazio():
+            return False
+        try:
+            with open(arquivo_legado, 'r', encoding='utf-8') as f:
+                conteudo = f.read().strip()
+            cartoes = json.loads(conteudo) if conteudo else {}
+            total = self.importar_cartoes(cartoes)
+            print(f"Log legado migrado: {len(cartoes)} cartões e {total} acessos importados de {arquivo_legado}")
+            return True
+        except Exception as e:
+            print(f"Erro ao migrar log legado: {e}")
+            return False
+
+    def fechar(self):
+        with self._lock_escrita:
+            self._escrita.close()
+        with self._lock_leitura:
+            self._leitura.close()
+
+# ===== HISTÓRICO ARQUIVADO NO BANCO =====
+
+class HistoricoSQLite:
+    """Interface do ArquivoHistorico sobre os acessos marcados como arquivados."""
+
+    def __init__(self, banco):
+        self.banco = banco
+        self.arquivados = 0
+
+    def consultar(self, limite, antes=None, uid=None, prefixo=None, dispositivo=None,
+                  resultado=None, desde=None, ate=None):
+        """Até `limite` acessos arquivados anteriores à chave `antes`, do mais recente ao mais antigo."""
+        condicoes = ["a.archived = 1"]
+        parametros = []
+        if antes is not None:
+            if len(antes) > 2:
+                condicoes.append("(a.ts < ? OR (a.ts = ? AND a.uid < ?))")
+                parametros += [antes[0], antes[0], antes[2]]
+            else:
+                # Cursor de um acesso em memória: arquivados no mesmo timestamp vêm depois dele
+                condicoes.append("a.ts <= ?")
+                parametros.append(antes[0])
+        if uid is not None:
+            condicoes.append("a.uid = ?")
+            parametros.append(uid)
+        if prefixo:
+            condicoes.append("a.uid >= ? AND a.uid < ?")
+            parametros += [prefixo, prefixo[:-1] + chr(ord(prefixo[-1]) + 1)]
+        if dispositivo is not None:
+            condicoes.append("d.name = ?")
+            parametros.append(dispositivo)
+        if resultado is not None:
+            condicoes.append("a.result = ?")
+            parametros.append(resultado)
+        if desde is not None:
+            condicoes.append("a.ts >= ?")
+            parametros.append(desde)
+        if ate is not None:
+            condicoes.append("a.ts <= ?")
+            parametros.append(ate)
+        parametros.append(limite)
+
+        consulta = (
+            SQL_SELECIONAR_ACESSOS + " WHERE " + " AND ".join(condicoes)
+            + " ORDER BY a.ts DESC, a.uid DESC LIMIT ?"
+        )
+        with self.banco._lock_leitura:
+            linhas = self.banco._leitura.execute(consulta, parametros).fetchall()
+        return [
+            ((linha[1], -1, linha[0]), linha[0], expandir_acesso(self.banco._dados_linha(linha)))
+            for linha in linhas
+        ]
+
+    def iterar(self):
+        """Itera sobre todos os acessos arquivados (uid, dados_acesso)."""
+        # Conexão própria: a varredura não segura o lock das consultas
+        conexao = sqlite3.connect(self.banco.arquivo_banco)
+        try:
+            for linha in conexao.execute(SQL_SELECIONAR_ACESSOS + " WHERE a.archived = 1 ORDER BY a.id"):
+                yield linha[0], self.banco._dados_linha(linha)
+        finally:
+            conexao.close()
+
+    def arquivar(self, acessos):
+        """Marca acessos [(uid, dados_acesso)] como arquivados; retorna quantos mudaram."""
+        if not acessos:
+            return 0
+        with self.banco._lock_escrita:
+            with self.banco._escrita:
+                alterados = self.banco._escrita.executemany(
+                    "UPDATE accesses SET archived = 1 WHERE uid = ? AND ts = ? AND archived = 0",
+                    [(uid, dados.get("timestamp", "")) for uid, dados in acessos]
+                ).rowcount
+        self.arquivados += alterados
+        return alterados
+
+    # No banco, marcar é idempotente: garantir e arquivar são a mesma operação
+    garantir = arquivar
+
+    def metricas(self):
+        with self.banco._lock_leitura:
+            arquivados = self.banco._leitura.execute(
+                "SELECT COUNT(*) FROM accesses WHERE archived = 1"
+            ).fetchone()[0]
+        return {
+            "banco": self.banco.arquivo_banco,
+            "acessos_arquivados": arquivados,
+            "arquivados_nesta_execucao": self.arquivados
+        }
@@ -0,0 +1,287 @@
+import gzip
+import io
+import json
+import os
+import threading
+from bisect import bisect_left, bisect_right, insort
+from collections import Counter, OrderedDict
+
+from geolocalizacao import endereco_google_maps
+from registros import RegistroAcesso
+
+# ===== FORMATO ARQUIVADO =====
+
+def compactar_acesso(dados_acesso):
+    """Remove do acesso os campos derivados (o link do mapa sai das coordenadas)."""
+    if isinstance(dados_acesso, RegistroAcesso):
+        return dados_acesso.para_json()
+    return {chave: valor for chave, valor in dados_acesso.items() if chave != "google_maps"}
+
+def expandir_acesso(dados_acesso):
+    """Restaura os campos derivados de um acesso arquivado."""
+    localizacao = dados_acesso.get("localizacao") or {}
+    return dict(dados_acesso, google_maps=endereco_google_maps(localizacao.get("lat"), localizacao.get("lon")))
+
+def chave_arquivada(uid, dados_acesso):
+    """Chave de ordenação de um acesso arquivado.
+
+    Compatível com as chaves (timestamp, id) do índice em memória: no mesmo
+    timestamp, o acesso arquivado fica antes de qualquer acesso em memória.
+    """
+    return (dados_acesso.get("timestamp", ""), -1, uid)
+
+# ===== ARQUIVO DE ACESSOS ANTIGOS =====
+
+class ArquivoHistorico:
+    """Acessos antigos em segmentos gzip particionados por mês.
+
+    Cada partição (acessos-AAAA-MM.jsonl.gz) recebe um membro gzip por lote
+    arquivado, então arquivar nunca reescreve dados existentes. As consultas
+    descomprimem só as partições do período pedido, mantendo as mais
+    recentes num cache LRU pequeno; acessos arquivados entram direto nas
+    partições em cache, sem descomprimi-las de novo.
+
+    Como as partições só recebem anexos, o tamanho de cada uma (marca())
+    separa o que já estava arquivado do que veio depois: garantir() só lê
+    os membros além da marca.
+    """
+
+    PREFIXO = "acessos-"
+    EXTENSAO = ".jsonl.gz"
+
+    def __init__(self, diretorio, particoes_em_cache=4):
+        self.diretorio = diretorio
+        self.particoes_em_cache = particoes_em_cache
+        self._lock = threading.Lock()
+        self._cache = OrderedDict()  # particao -> (chaves, registros) em ordem crescente
+        self._maiores = {}  # particao -> maior chave (partições já lidas ou criadas nesta execução)
+
+        os.makedirs(diretorio, exist_ok=True)
+        self._particoes = sorted(
+            nome[len(self.PREFIXO):-len(self.EXTENSAO)]
+            for nome in os.listdir(diretorio)
+            if nome.startswith(self.PREFIXO) and nome.endswith(self.EXTENSAO)
+        )
+        self.arquivados = 0
+
+    @staticmethod
+    def _particao(timestamp):
+        return timestamp[:7] or "sem-data"
+
+    def _caminho(self, particao):
+        return os.path.join(self.diretorio, f"{self.PREFIXO}{particao}{self.EXTENSAO}")
+
+    # ----- Leitura -----
+
+    def _ler_particao(self, particao, inicio=0, fim=None):
+        """Itera sobre (uid, dados_acesso) da partição, tolerando um membro final truncado.
+
+        Com `inicio`/`fim`, lê só os membros gzip entre esses bytes (limites de membros).
+        """
+        caminho = self._caminho(particao)
+        if not os.path.exists(caminho):
+            return
+        try:
+            with open(caminho, 'rb') as bruto:
+                bruto.seek(inicio)
+                fonte = bruto if fim is None else io.BytesIO(bruto.read(fim - inicio))
+                with gzip.open(fonte, 'rt', encoding='utf-8') as f:
+                    for linha in f:
+                        try:
+                            registro = json.loads(linha)
+                        except ValueError:
+                            continue
+                        yield registro["uid"], registro["acesso"]
+        except (EOFError, OSError) as e:
+            # Queda durante a escrita do último lote
+            print(f"Aviso: partição {particao} do arquivo truncada: {e}")
+
+    def _carregar(self, particao):
+        """Registros da partição ordenados por chave (chamado com o lock adquirido)."""
+        if particao in self._cache:
+            self._cache.move_to_end(particao)
+            return self._cache[particao]
+
+        # Só pela chave: mesmo uid e timestamp repetidos não chegam a comparar os dicionários
+        registros = sorted(
+            ((chave_arquivada(uid, dados), uid, dados) for uid, dados in self._ler_particao(particao)),
+            key=lambda registro: registro[0]
+        )
+        carregada = ([registro[0] for registro in registros], registros)
+        self._cache[particao] = carregada
+        if registros:
+            self._maiores[particao] = registros[-1][0]
+        while len(self._cache) > self.particoes_em_cache:
+            self._cache.popitem(last=False)
+        return carregada
+
+    def consultar(self, limite, antes=None, uid=None, prefixo=None, dispositivo=None,
+                  resultado=None, desde=None, ate=None):
+        """Até `limite` acessos arquivados anteriores à chave `antes`, do mais recente ao mais antigo.
+
+        Retorna [(chave, uid, dados_acesso)] com os campos derivados restaurados.
+        """
+        itens = []
+        with self._lock:
+            for particao in reversed(self._particoes):
+                if antes is not None and particao > self._particao(antes[0]):
+                    continue
+                if ate is not None and particao > self._particao(ate):
+                    continue
+                if desde is not None and particao < self._particao(desde):
+                    break
+
+                chaves, registros = self._carregar(particao)
+                fim = bisect_left(chaves, antes) if antes is not None else len(chaves)
+                if ate is not None:
+                    fim = min(fim, bisect_right(chaves, (ate, float("inf"))))
+                inicio = bisect_left(chaves, (desde,)) if desde is not None else 0
+
+                for posicao in range(fim - 1, inicio - 1, -1):
+                    chave, uid_acesso, dados = registros[posicao]
+                    if uid is not None and uid_acesso != uid:
+                        continue
+                    if prefixo is not None and not uid_acesso.startswith(prefixo):
+                        continue
+                    if dispositivo is not None and dados.get("dispositivo") != dispositivo:
+                        continue
+                    if resultado is not None and dados.get("resultado") != resultado:
+                        continue
+                    itens.append((chave, uid_acesso, expandir_acesso(dados)))
+                    if len(itens) == limite:
+                        return itens
+        return itens
+
+    def _particoes_recentes(self):
+        """Partições da mais recente para a mais antiga (chamado com o lock adquirido)."""
+        # "sem-data" fica depois dos meses na ordem, mas suas chaves são as menores
+        particoes = [particao for particao in reversed(self._particoes) if particao != "sem-data"]
+        if "sem-data" in self._particoes:
+            particoes.append("sem-data")
+        return particoes
+
+    def maior_chave(self):
+        """Chave do acesso arquivado mais recente (None se o arquivo estiver vazio).
+
+        Lê no máximo a partição mais recente, uma vez; depois é mantida a
+        cada lote arquivado.
+        """
+        with self._lock:
+            for particao in self._particoes_recentes():
+                if particao not in self._maiores:
+                    self._carregar(particao)
+                if particao in self._maiores:
+                    return self._maiores[particao]
+        return None
+
+    def eventos_recentes(self, limite):
+        """id_evento dos `limite` acessos arquivados mais recentes, do mais antigo ao mais novo.
+
+        Lê as partições da mais recente para a mais antiga, fora do lock,
+        até juntar `limite` eventos.
+        """
+        with self._lock:
+            particoes = self._particoes_recentes()
+        eventos = []
+        for particao in particoes:
+            eventos = [
+                dados["id_evento"] for _, dados in self._ler_particao(particao) if dados.get("id_evento")
+            ] + eventos
+            if len(eventos) >= limite:
+                break
+        return eventos[-limite:]
+
+    def iterar(self):
+        """Itera sobre todos os acessos arquivados (uid, dados_acesso), partição a partição."""
+        with self._lock:
+            particoes = list(self._particoes)
+        for particao in particoes:
+            yield from self._ler_particao(particao)
+
+    # ----- Escrita -----
+
+    def arquivar(self, acessos):
+        """Anexa acessos [(uid, dados_acesso)] às partições do mês de cada um."""
+        if not acessos:
+            return
+        grupos = {}
+        for uid, dados in acessos:
+            compacto = compactar_acesso(dados)
+            linhas, registros = grupos.setdefault(self._particao(dados.get("timestamp", "")), ([], []))
+            linhas.append(json.dumps({"uid": uid, "acesso": compacto}, ensure_ascii=False) + "\n")
+            registros.append((chave_arquivada(uid, compacto), uid, compacto))
+
+        with self._lock:
+            for particao, (linhas, registros) in grupos.items():
+                with open(self._caminho(particao), 'ab') as f:
+                    f.write(gzip.compress("".join(linhas).encode('utf-8')))
+                    f.flush()
+                    os.fsync(f.fileno())
+                maior = max(registro[0] for registro in registros)
+                if particao not in self._particoes:
+                    insort(self._particoes, particao)
+                    self._maiores[particao] = maior
+                elif particao in self._maiores and self._maiores[particao] < maior:
+                    self._maiores[particao] = maior
+
+                # Partição em cache: inserir no lugar em vez de descomprimir de novo na próxima consulta
+                carregada = self._cache.get(particao)
+                if carregada is not None:
+                    chaves, ordenados = carregada
+                    for registro in registros:
+                        posicao = bisect_right(chaves, registro[0])
+                        chaves.insert(posicao, registro[0])
+                        ordenados.insert(posicao, registro)
+            self.arquivados += len(acessos)
+
+    def marca(self):
+        """Tamanho de cada partição agora: o que for arquivado depois fica além da marca."""
+        with self._lock:
+            return {
+                particao: os.path.getsize(self._caminho(particao))
+                for particao in self._particoes
+                if os.path.exists(self._caminho(particao))
+            }
+
+    def garantir(self, acessos, marca=None):
+        """Arquiva apenas os acessos que ainda não estão no arquivo (recuperação após queda).
+
+        Com `marca`, quem chama garante que nenhum dos acessos estava no
+        arquivo até ela: só os membros anexados depois são lidos. A leitura
+        é feita fora do lock (até o tamanho atual, só membros completos), e
+        chaves repetidas são contadas: dois acessos reais do mesmo cartão no
+        mesmo instante não viram um.
+        """
+        if not acessos:
+            return 0
+        atual = self.marca()
+        existentes = Counter()
+        for particao in {self._particao(dados.get("timestamp", "")) for _, dados in acessos}:
+            inicio = (marca or {}).get(particao, 0)
+            fim = atual.get(particao, 0)
+            if inicio < fim:
+                existentes.update(
+                    chave_arquivada(uid, dados) for uid, dados in self._ler_particao(particao, inicio, fim)
+                )
+        faltantes = []
+        for uid, dados in acessos:
+            chave = chave_arquivada(uid, dados)
+            if existentes[chave]:
+                existentes[chave] -= 1
+            else:
+                faltantes.append((uid, dados))
+        self.arquivar(faltantes)
+        return len(faltantes)
+
+    def metricas(self):
+        with self._lock:
+            tamanho = sum(
+                os.path.getsize(self._caminho(particao))
+                for particao in self._particoes
+                if os.path.exists(self._caminho(particao))
+            )
+            return {
+                "particoes": len(self._particoes),
+                "bytes": tamanho,
+                "arquivados_nesta_execucao": self.arquivados
+            }
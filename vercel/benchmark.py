@@ -0,0 +1,357 @@
+"""Benchmark de vazão e latência do servidor central.
+
+Uso:
+    python benchmark.py [--cartoes 1000] [--historico 10000] [--dispositivos 2]
+                        [--taps 2000] [--taxa 0] [--cenarios processar_uid,rota,serial]
+                        [--saida benchmark_resultados.jsonl]
+
+Roda num diretório temporário (removido ao final) e sem acessar a rede
+para geolocalização: gera um histórico sintético de `--historico`
+acessos distribuídos entre `--cartoes` cartões, carrega o sistema e mede:
+
+- processar_uid: a decisão chamada diretamente;
+- rota: POST /api/dispositivo/registrar_acesso (cliente de teste do Flask);
+- serial: Arduinos simulados em pseudo-terminais (pty, só Linux/macOS)
+  enviando linhas com UIDs; a latência vai da escrita da linha até a
+  resposta OK/SUSPECT chegar.
+
+Cada execução acrescenta um objeto JSON (parâmetros, tempo de carga e, por
+cenário, vazão e p50/p99/máximo em ms) ao arquivo de saída, para comparar
+execuções à medida que o histórico cresce.
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta
+
+DIRETORIO_CODIGO = os.path.dirname(os.path.abspath(__file__))
+LOCALIZACAO_BENCHMARK = {"ip": "127.0.0.1", "cidade": "Benchmark", "regiao": "Benchmark",
+                         "pais": "Benchmark", "lat": -23.5, "lon": -46.6, "isp": "Benchmark"}
+
+class ProvedorFixo:
+    """Provedor de localização sem rede: o benchmark não consulta ipify/ip-api."""
+
+    def consultar(self):
+        return dict(LOCALIZACAO_BENCHMARK)
+
+# ===== HISTÓRICO SINTÉTICO =====
+
+def gerar_uids(quantidade, aleatorio):
+    return [f"{aleatorio.getrandbits(32):08X}{indice:06d}" for indice in range(quantidade)]
+
+def gerar_historico(caminho, uids, total_acessos, dispositivos, aleatorio, dias=365):
+    """Grava um log_acessos.json legado com `total_acessos` acessos (migrado na carga).
+
+    Escrito cartão a cartão, sem montar o histórico inteiro em memória.
+    """
+    agora = datetime.now()
+    por_cartao, resto = divmod(total_acessos, len(uids))
+    localizacao = LOCALIZACAO_BENCHMARK
+
+    with open(caminho, 'w', encoding='utf-8') as f:
+        f.write("{")
+        for indice, uid in enumerate(uids):
+            quantidade = por_cartao + (1 if indice < resto else 0)
+            if quantidade == 0:
+                continue
+            instantes = sorted(
+                agora - timedelta(seconds=aleatorio.uniform(60, dias * 86400))
+                for _ in range(quantidade)
+            )
+            usados = []
+            acessos = []
+            for instante in instantes:
+                dispositivo = aleatorio.choice(dispositivos)
+                if dispositivo not in usados:
+                    usados.append(dispositivo)
+                acessos.append({
+                    "timestamp": instante.isoformat(),
+                    "dispositivo": dispositivo,
+                    "resultado": "Permitido",
+                    "localizacao": localizacao
+                })
+            info = {
+                "primeiro_acesso": acessos[0]["timestamp"],
+                "ultimo_acesso": acessos[-1]["timestamp"],
+                "vezes_usado": quantidade,
+                "acessos": acessos,
+                "dispositivos_utilizados": usados
+            }
+            f.write(("," if indice else "") + json.dumps(uid) + ":" + json.dumps(info, ensure_ascii=False))
+        f.write("}")
+
+# ===== MEDIÇÃO =====
+
+def resumir(latencias, decorrido, enviados):
+    """Vazão e percentis (ms) de uma lista de latências em segundos."""
+    amostras = sorted(latencias)
+
+    def percentil(p):
+        if not amostras:
+            return None
+        return round(amostras[min(len(amostras) - 1, int(p * len(amostras)))] * 1000, 3)
+
+    return {
+        "enviados": enviados,
+        "respondidos": len(amostras),
+        "segundos": round(decorrido, 3),
+        "vazao_por_segundo": round(len(amostras) / decorrido, 1) if decorrido > 0 else None,
+        "p50_ms": percentil(0.50),
+        "p99_ms": percentil(0.99),
+        "max_ms": round(amostras[-1] * 1000, 3) if amostras else None
+    }
+
+def ritmo(taxa):
+    """Gerador que espera o próximo envio para manter `taxa` por segundo (0 = sem limite)."""
+    intervalo = 1.0 / taxa if taxa else 0
+    proximo = time.perf_counter()
+    while True:
+        if intervalo:
+            espera = proximo - time.perf_counter()
+            if espera > 0:
+                time.sleep(espera)
+            proximo += intervalo
+        yield
+
+def esperar_fila(aplicacao, limite=120):
+    """Espera a fila de escrita esvaziar; retorna os segundos gastos."""
+    inicio = time.perf_counter()
+    while aplicacao.fila_escrita.metricas()["profundidade"] and time.perf_counter() - inicio < limite:
+        time.sleep(0.01)
+    return round(time.perf_counter() - inicio, 3)
+
+# ===== CENÁRIOS =====
+
+def cenario_processar_uid(aplicacao, uids, dispositivos, taps, taxa, aleatorio):
+    latencias = []
+    passo = ritmo(taxa)
+    inicio = time.perf_counter()
+    for _ in range(taps):
+        next(passo)
+        uid, dispositivo = aleatorio.choice(uids), aleatorio.choice(dispositivos)
+        antes = time.perf_counter()
+        if aplicacao.processar_uid(uid, dispositivo):
+            latencias.append(time.perf_counter() - antes)
+    return resumir(latencias, time.perf_counter() - inicio, taps)
+
+def cenario_rota(aplicacao, uids, dispositivos, taps, taxa, aleatorio):
+    cliente = aplicacao.app.test_client()
+    latencias = []
+    passo = ritmo(taxa)
+    inicio = time.perf_counter()
+    for numero in range(taps):
+        next(passo)
+        corpo = {
+            "uid": aleatorio.choice(uids),
+            "dispositivo_id": aleatorio.choice(dispositivos),
+            "id_evento": f"benchmark-{numero}"
+        }
+        antes = time.perf_counter()
+        resposta = cliente.post('/api/dispositivo/registrar_acesso', json=corpo)
+        if resposta.status_code == 200 and resposta.get_json().get("status") == "success":
+            latencias.append(time.perf_counter() - antes)
+    return resumir(latencias, time.perf_counter() - inicio, taps)
+
+def cenario_serial(aplicacao, uids, quantidade_portas, taps, taxa, aleatorio):
+    import pty
+    from leitor_serial import GerenciadorLeitores
+
+    terminais = [pty.openpty() for _ in range(quantidade_portas)]
+    configuracoes = [
+        {"porta": os.ttyname(escravo), "dispositivo_id": f"BENCH_SERIAL_{indice}"}
+        for indice, (_, escravo) in enumerate(terminais)
+    ]
+    aplicacao.leitores.fechar()
+    aplicacao.leitores = GerenciadorLeitores(
+        configuracoes, aplicacao.tratar_linha_serial, espera_inicializacao=0, timeout_leitura=0.5
+    )
+    aplicacao.leitores.iniciar()
+    limite = time.perf_counter() + 10
+    while not all(l.conectado for l in aplicacao.leitores.leitores.values()) and time.perf_counter() < limite:
+        time.sleep(0.01)
+
+    # Uma fila de instantes de envio por porta; cada resposta consome o mais antigo
+    pendentes = [[] for _ in terminais]
+    latencias = []
+    lock = threading.Lock()
+    ativo = True
+
+    def ler_respostas(indice, mestre):
+        buffer = b""
+        while ativo:
+            try:
+                dados = os.read(mestre, 4096)
+            except OSError:
+                return
+            agora = time.perf_counter()
+            buffer += dados
+            *linhas, buffer = buffer.split(b"\n")
+            with lock:
+                for linha in linhas:
+                    if linha.strip() and pendentes[indice]:
+                        latencias.append(agora - pendentes[indice].pop(0))
+
+    leitores_respostas = [
+        threading.Thread(target=ler_respostas, args=(indice, mestre), daemon=True)
+        for indice, (mestre, _) in enumerate(terminais)
+    ]
+    for thread in leitores_respostas:
+        thread.start()
+
+    passo = ritmo(taxa)
+    inicio = time.perf_counter()
+    for _ in range(taps):
+        next(passo)
+        indice = aleatorio.randrange(len(terminais))
+        linha = (aleatorio.choice(uids) + "\r\n").encode()
+        with lock:
+            pendentes[indice].append(time.perf_counter())
+        os.write(terminais[indice][0], linha)
+
+    limite = time.perf_counter() + 30
+    while time.perf_counter() < limite:
+        with lock:
+            if len(latencias) >= taps:
+                break
+        time.sleep(0.005)
+    decorrido = time.perf_counter() - inicio
+
+    ativo = False
+    aplicacao.leitores.fechar()
+    for mestre, escravo in terminais:
+        os.close(escravo)
+        os.close(mestre)
+    with lock:
+        return resumir(list(latencias), decorrido, taps)
+
+CENARIOS = ("processar_uid", "rota", "serial")
+
+# ===== EXECUÇÃO =====
+
+def versao_codigo():
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=DIRETORIO_CODIGO, stderr=subprocess.DEVNULL
+        ).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def medir(args, cenarios, uids, dispositivos, aleatorio, diretorio):
+    """Gera o histórico, carrega o sistema e roda os cenários no diretório atual."""
+    sys.path.insert(0, DIRETORIO_CODIGO)
+    silencio = contextlib.nullcontext() if args.verbose else contextlib.redirect_stdout(io.StringIO())
+
+    print(f"📁 Diretório de trabalho: {diretorio}")
+    inicio = time.perf_counter()
+    gerar_historico("log_acessos.json", uids, args.historico, dispositivos, aleatorio)
+    geracao = time.perf_counter() - inicio
+    print(f"🧪 Histórico sintético: {args.historico} acessos em {args.cartoes} cartões ({geracao:.1f}s)")
+
+    with silencio:
+        import app as aplicacao
+        aplicacao.cache_localizacao.provedor = ProvedorFixo()
+        aplicacao.DISPOSITIVOS_AUTORIZADOS.extend(dispositivos)
+        aplicacao.debounce.janela = args.janela_debounce
+
+        inicio = time.perf_counter()
+        aplicacao.inicializar_armazenamento()
+        aplicacao.atualizar_dados_interface()
+        carga = time.perf_counter() - inicio
+        aplicacao.pool_acessos.iniciar()
+    print(f"📂 Carga do histórico: {carga:.2f}s")
+
+    resultados = {}
+    for nome in cenarios:
+        if nome == "serial" and os.name == "nt":
+            print("⚠️ Cenário serial ignorado: pseudo-terminais não existem no Windows")
+            continue
+        with silencio:
+            if nome == "processar_uid":
+                resultado = cenario_processar_uid(aplicacao, uids, dispositivos, args.taps, args.taxa, aleatorio)
+            elif nome == "rota":
+                resultado = cenario_rota(aplicacao, uids, dispositivos, args.taps, args.taxa, aleatorio)
+            else:
+                resultado = cenario_serial(aplicacao, uids, args.dispositivos, args.taps, args.taxa, aleatorio)
+            resultado["drenagem_fila_segundos"] = esperar_fila(aplicacao)
+        resultados[nome] = resultado
+        print(f"⏱️ {nome}: {resultado['vazao_por_segundo']}/s, "
+              f"p50 {resultado['p50_ms']} ms, p99 {resultado['p99_ms']} ms "
+              f"({resultado['respondidos']}/{resultado['enviados']})")
+
+    # Drenar e fechar tudo que escreve no diretório antes de removê-lo
+    with silencio:
+        aplicacao.pool_acessos.encerrar()
+        aplicacao.fila_escrita.encerrar()
+        aplicacao.cache_localizacao.parar()
+        aplicacao.diario.fechar()
+    return carga, geracao, resultados
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de vazão e latência do servidor central.")
+    parser.add_argument("--cartoes", type=int, default=1000, help="População de cartões")
+    parser.add_argument("--historico", type=int, default=10000, help="Acessos já registrados antes da medição")
+    parser.add_argument("--dispositivos", type=int, default=2, help="Dispositivos remotos (e pty no cenário serial)")
+    parser.add_argument("--taps", type=int, default=2000, help="Taps medidos por cenário")
+    parser.add_argument("--taxa", type=float, default=0, help="Taps por segundo (0 = o mais rápido possível)")
+    parser.add_argument("--cenarios", default=",".join(CENARIOS))
+    parser.add_argument("--janela-debounce", type=float, default=0,
+                        help="Janela do debounce durante a medição (0 = toda leitura é processada)")
+    parser.add_argument("--semente", type=int, default=42)
+    parser.add_argument("--saida", default="benchmark_resultados.jsonl", help="Arquivo JSON Lines de resultados")
+    parser.add_argument("--verbose", action="store_true", help="Mostra as mensagens do servidor")
+    args = parser.parse_args()
+
+    cenarios = [nome.strip() for nome in args.cenarios.split(",") if nome.strip()]
+    desconhecidos = set(cenarios) - set(CENARIOS)
+    if desconhecidos:
+        parser.error(f"cenários desconhecidos: {', '.join(sorted(desconhecidos))}")
+    if args.cartoes < 1 or args.dispositivos < 1:
+        parser.error("--cartoes e --dispositivos devem ser positivos")
+
+    saida = os.path.abspath(args.saida)
+    aleatorio = random.Random(args.semente)
+    uids = gerar_uids(args.cartoes, aleatorio)
+    dispositivos = [f"BENCH_REMOTO_{indice:02d}" for indice in range(args.dispositivos)]
+
+    anterior = os.getcwd()
+    with tempfile.TemporaryDirectory(prefix="benchmark_acessos_") as diretorio:
+        os.chdir(diretorio)
+        try:
+            carga, geracao, resultados = medir(args, cenarios, uids, dispositivos, aleatorio, diretorio)
+        finally:
+            os.chdir(anterior)  # Sair antes da remoção
+
+    registro = {
+        "data": datetime.now().isoformat(),
+        "commit": versao_codigo(),
+        "python": platform.python_version(),
+        "plataforma": platform.platform(),
+        "parametros": {
+            "cartoes": args.cartoes,
+            "historico": args.historico,
+            "dispositivos": args.dispositivos,
+            "taps": args.taps,
+            "taxa": args.taxa,
+            "janela_debounce": args.janela_debounce,
+            "semente": args.semente
+        },
+        "geracao_historico_segundos": round(geracao, 3),
+        "carga_segundos": round(carga, 3),
+        "cenarios": resultados
+    }
+    with open(saida, 'a', encoding='utf-8') as f:
+        f.write(json.dumps(registro, ensure_ascii=False) + "\n")
+    print(f"✅ Resultados acrescentados a {saida}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,63 @@
+import pickle
+import threading
+import time
+from multiprocessing.managers import BaseManager
+
+# ===== BROKER DO SERVIÇO CENTRAL =====
+
+class _GerenciadorServidor(BaseManager):
+    """Lado do coordenador: expõe o objeto de serviço."""
+
+class _GerenciadorCliente(BaseManager):
+    """Lado dos processos web: obtém proxies do serviço."""
+
+_GerenciadorCliente.register("servico")
+
+def iniciar_broker(servico, endereco, chave):
+    """Expõe `servico` em `endereco` numa thread do processo atual.
+
+    Todas as chamadas dos processos web chegam a este processo, que continua
+    sendo o único a escrever no armazenamento e no estado em memória.
+    """
+    _GerenciadorServidor.register("servico", callable=lambda: servico)
+    servidor = _GerenciadorServidor(address=endereco, authkey=chave).get_server()
+    threading.Thread(target=servidor.serve_forever, daemon=True).start()
+    print(f"🔗 Broker do serviço central em {endereco[0]}:{endereco[1]}")
+    return servidor
+
+def conectar_broker(endereco, chave, tentativas=30, intervalo=1.0):
+    """Proxy do serviço central; espera o coordenador subir.
+
+    O proxy tem os mesmos métodos do serviço e pode ser usado por várias
+    threads (cada uma abre sua própria conexão com o broker).
+    """
+    for tentativa in range(1, tentativas + 1):
+        try:
+            gerenciador = _GerenciadorCliente(address=endereco, authkey=chave)
+            gerenciador.connect()
+            return gerenciador.servico()
+        except (ConnectionRefusedError, FileNotFoundError):
+            if tentativa == tentativas:
+                raise
+            time.sleep(intervalo)
+
+class BrokerLocal:
+    """Substituto do broker no mesmo processo, para testes.
+
+    Chama o serviço diretamente, mas serializa parâmetros e retornos como o
+    broker real faria: quem depende de objetos compartilhados por referência
+    falha aqui também, sem precisar de vários processos.
+    """
+
+    def __init__(self, servico):
+        self._servico = servico
+
+    def __getattr__(self, nome):
+        metodo = getattr(self._servico, nome)
+        if nome.startswith("_") or not callable(metodo):
+            raise AttributeError(nome)
+
+        def chamar(*args, **kwargs):
+            args, kwargs = pickle.loads(pickle.dumps((args, kwargs)))
+            return pickle.loads(pickle.dumps(metodo(*args, **kwargs)))
+        return chamar
@@ -0,0 +1,109 @@
+import gzip
+import hashlib
+import threading
+from collections import OrderedDict
+
+try:
+    import brotli
+except ImportError:  # Opcional: sem brotli as respostas saem só em gzip
+    brotli = None
+
+def brotli_disponivel():
+    return brotli is not None
+
+# ===== RESPOSTAS VERSIONADAS =====
+
+class RespostaSerializada:
+    """Corpo JSON de uma versão do estado, com ETag e variantes comprimidas.
+
+    As variantes comprimidas são geradas na primeira requisição que as
+    aceita e reaproveitadas até a versão mudar.
+    """
+
+    def __init__(self, versao, corpo, nivel_gzip=6):
+        self.versao = versao
+        self.corpo = corpo
+        self.etag = hashlib.blake2b(corpo, digest_size=12).hexdigest()
+        self.nivel_gzip = nivel_gzip
+        self._comprimidos = {}
+        self._lock = threading.Lock()
+
+    def comprimido(self, codificacao):
+        """Corpo em "gzip" ou "br" (gerado uma vez por versão)."""
+        with self._lock:
+            corpo = self._comprimidos.get(codificacao)
+            if corpo is None:
+                if codificacao == "br":
+                    corpo = brotli.compress(self.corpo)
+                else:
+                    corpo = gzip.compress(self.corpo, compresslevel=self.nivel_gzip, mtime=0)
+                self._comprimidos[codificacao] = corpo
+            return corpo
+
+class CacheRespostas:
+    """Cache de respostas serializadas por variante, invalidado pela versão do estado.
+
+    `obter(variante, versao, gerar)` devolve a resposta em cache se a versão
+    for a mesma; caso contrário chama `gerar()`, que retorna (versao, dados)
+    do estado atual, e serializa uma única vez. Requisições simultâneas da
+    mesma variante esperam a serialização em andamento em vez de repeti-la.
+
+    Com `max_variantes`, as variantes menos usadas recentemente são
+    descartadas (para variantes abertas, como períodos escolhidos pelo cliente).
+    """
+
+    def __init__(self, serializar, nivel_gzip=6, max_variantes=None):
+        self.serializar = serializar
+        self.nivel_gzip = nivel_gzip
+        self.max_variantes = max_variantes
+        self._respostas = OrderedDict()
+        self._locks = {}
+        self._lock = threading.Lock()
+
+        self.acertos = 0
+        self.reconstrucoes = 0
+
+    def _lock_variante(self, variante):
+        with self._lock:
+            return self._locks.setdefault(variante, threading.Lock())
+
+    def _guardar(self, variante, resposta):
+        with self._lock:
+            self._respostas[variante] = resposta
+            self._respostas.move_to_end(variante)
+            if self.max_variantes is not None:
+                while len(self._respostas) > self.max_variantes:
+                    antiga, _ = self._respostas.popitem(last=False)
+                    self._locks.pop(antiga, None)
+
+    def obter(self, variante, versao, gerar):
+        resposta = self._respostas.get(variante)
+        if resposta is not None and resposta.versao == versao:
+            self.acertos += 1
+            if self.max_variantes is not None:
+                with self._lock:
+                    if variante in self._respostas:
+                        self._respostas.move_to_end(variante)
+            return resposta
+
+        with self._lock_variante(variante):
+            resposta = self._respostas.get(variante)
+            if resposta is not None and resposta.versao == versao:
+                self.acertos += 1
+                return resposta
+            versao_gerada, dados = gerar()
+            resposta = RespostaSerializada(versao_gerada, self.serializar(dados), self.nivel_gzip)
+            self._guardar(variante, resposta)
+            self.reconstrucoes += 1
+            return resposta
+
+    def metricas(self):
+        return {
+            "acertos": self.acertos,
+            "reconstrucoes": self.reconstrucoes,
+            "brotli": brotli is not None,
+            "variantes": {
+                str(variante): {"versao": resposta.versao, "bytes": len(resposta.corpo)}
+                for variante, resposta in list(self._respostas.items())
+            }
+        }
@@ -1,8 +1,14 @@
 import requests
 import time
-import serial
 from datetime import datetime
 import json
+import threading
+import uuid
+from collections import OrderedDict
+
+from geolocalizacao import CacheGeolocalizacao, ProvedorIPAPI
+from leitor_serial import LeitorSerial, mensagem_de_sistema
+from fila_saida import FilaSaida
 
 # ===== CONFIGURAÇÕES =====
 # ⚠️ AJUSTE ESTE IP PARA O IP DO SEU SERVIDOR CENTRAL ⚠️
@@ -10,104 +16,162 @@ SERVIDOR_CENTRAL = "http://192.168.1.100:5000"  # IP do servidor principal
 DISPOSITIVO_ID = "DISPOSITIVO_REMOTO_01"
 PORTA_ARDUINO = 'COM4'  # Ajuste para a porta do Arduino remoto
 BAUDRATE = 9600
+TTL_GEOLOCALIZACAO = 3600  # Segundos até renovar a localização
+ARQUIVO_CACHE_GEOLOCALIZACAO = "cache_geolocalizacao_remoto.json"
+
+# Envio ao servidor central (store-and-forward)
+ARQUIVO_FILA_SAIDA = "fila_saida_remoto.db"  # Acessos aguardando confirmação do servidor
+TAMANHO_LOTE_ENVIO = 200  # Acessos por requisição ao endpoint de lote
+TIMEOUT_ENVIO = 10  # Segundos por requisição
+BACKOFF_ENVIO_INICIAL = 1  # Segundos antes de tentar de novo após falha
+BACKOFF_ENVIO_MAXIMO = 60  # Teto do backoff exponencial
+
+# Status do servidor que confirmam o evento (não precisa reenviar)
+STATUS_CONFIRMADOS = {"registrado", "duplicado", "ignorado", "rejeitado"}
+
+cache_localizacao = CacheGeolocalizacao(
+    ProvedorIPAPI(),
+    ttl=TTL_GEOLOCALIZACAO,
+    arquivo_cache=ARQUIVO_CACHE_GEOLOCALIZACAO
+)
+
+# Sessão HTTP persistente (keep-alive) e fila em disco
+sessao = requests.Session()
+sessao.mount("http://", requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=2))
+sessao.mount("https://", requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=2))
+fila_saida = None  # Aberta em iniciar_envio()
+instantes_leitura = OrderedDict()  # id_evento -> instante da leitura (para medir latência)
+instantes_lock = threading.Lock()
 
 def obter_localizacao_aproximada():
-    """Obtém localização aproximada do dispositivo remoto."""
+    """Obtém localização aproximada do dispositivo remoto (do cache, sem esperar a rede)."""
+    return cache_localizacao.obter()
+
+def enviar_para_servidor_central(uid, localizacao, instante_leitura=None):
+    """Grava o acesso na fila de saída; o envio ao servidor é feito em lote pela thread de envio."""
+    evento = {
+        'id_evento': uuid.uuid4().hex,
+        'uid': uid,
+        'dispositivo_id': DISPOSITIVO_ID,
+        'timestamp': datetime.now().isoformat(),
+        'localizacao': localizacao
+    }
+    
     try:
-        response = requests.get('https://api.ipify.org?format=json', timeout=5)
-        ip_publico = response.json()['ip']
-        
-        response = requests.get(f'http://ip-api.com/json/{ip_publico}', timeout=5)
-        dados_localizacao = response.json()
-        
-        if dados_localizacao['status'] == 'success':
-            return {
-                "ip": ip_publico,
-                "cidade": dados_localizacao.get('city', 'Desconhecida'),
-                "regiao": dados_localizacao.get('regionName', 'Desconhecida'),
-                "pais": dados_localizacao.get('country', 'Desconhecido'),
-                "lat": dados_localizacao.get('lat'),
-                "lon": dados_localizacao.get('lon'),
-                "isp": dados_localizacao.get('isp', 'Desconhecido')
-            }
+        fila_saida.adicionar(evento)
     except Exception as e:
-        print(f"Erro ao obter localização: {e}")
+        print(f"❌ Erro ao gravar acesso na fila de saída: {e}")
+        return False
     
-    return {
-        "ip": "Desconhecido",
-        "cidade": "Desconhecida", 
-        "regiao": "Desconhecida",
-        "pais": "Desconhecido",
-        "lat": None,
-        "lon": None,
-        "isp": "Desconhecido"
-    }
+    if instante_leitura is not None:
+        with instantes_lock:
+            instantes_leitura[evento['id_evento']] = instante_leitura
+            while len(instantes_leitura) > 10000:
+                instantes_leitura.popitem(last=False)
+    return True
 
-def enviar_para_servidor_central(uid, localizacao):
-    """Envia dados de acesso para o servidor central."""
+def enviar_lote(eventos):
+    """Envia um lote ao servidor central; retorna os id_evento confirmados (ou None em falha)."""
     try:
-        dados = {
-            'uid': uid,
-            'dispositivo_id': DISPOSITIVO_ID,
-            'localizacao': localizacao
-        }
-        
-        response = requests.post(
-            f"{SERVIDOR_CENTRAL}/api/dispositivo/registrar_acesso",
-            json=dados,
-            timeout=10
+        response = sessao.post(
+            f"{SERVIDOR_CENTRAL}/api/dispositivo/registrar_acessos_lote",
+            json={'dispositivo_id': DISPOSITIVO_ID, 'acessos': eventos},
+            timeout=TIMEOUT_ENVIO
         )
         
-        if response.status_code == 200:
-            resultado = response.json()
-            print(f"✅ Acesso registrado no servidor: {resultado}")
-            return True
-        else:
-            print(f"❌ Erro ao registrar acesso: {response.text}")
-            return False
-            
+        if response.status_code != 200:
+            print(f"❌ Erro ao registrar lote: {response.status_code} {response.text}")
+            return None
+        
+        confirmados = []
+        for resultado in response.json().get('resultados', []):
+            if resultado.get('status') in STATUS_CONFIRMADOS:
+                confirmados.append(resultado.get('id_evento'))
+            else:
+                print(f"⚠️ Acesso não confirmado pelo servidor: {resultado}")
+        return confirmados
+        
     except Exception as e:
         print(f"❌ Erro de comunicação com servidor: {e}")
-        return False
+        return None
+
+def loop_envio():
+    """Drena a fila de saída em lotes, com backoff exponencial quando o servidor falha."""
+    backoff = BACKOFF_ENVIO_INICIAL
+    while True:
+        eventos = fila_saida.proximo_lote(TAMANHO_LOTE_ENVIO)
+        if not eventos:
+            fila_saida.aguardar(timeout=5)
+            continue
+        
+        confirmados = enviar_lote(eventos)
+        if confirmados is None:
+            fila_saida.registrar_tentativa([e['id_evento'] for e in eventos])
+            print(f"⏳ {fila_saida.pendentes()} acesso(s) pendente(s) - nova tentativa em {backoff}s")
+            time.sleep(backoff)
+            backoff = min(backoff * 2, BACKOFF_ENVIO_MAXIMO)
+            continue
+        
+        backoff = BACKOFF_ENVIO_INICIAL
+        fila_saida.remover(confirmados)
+        print(f"✅ {len(confirmados)} acesso(s) registrado(s) no servidor")
+        
+        agora = time.perf_counter()
+        with instantes_lock:
+            for id_evento in confirmados:
+                instante = instantes_leitura.pop(id_evento, None)
+                if instante is not None:
+                    leitor.latencia.registrar(agora - instante)
+        
+        if len(confirmados) < len(eventos):
+            # Itens recusados com erro: evitar laço apertado
+            time.sleep(backoff)
+
+def iniciar_envio():
+    """Abre a fila de saída e inicia a thread de envio."""
+    global fila_saida
+    fila_saida = FilaSaida(ARQUIVO_FILA_SAIDA)
+    pendentes = fila_saida.pendentes()
+    if pendentes:
+        print(f"📦 {pendentes} acesso(s) pendente(s) de execuções anteriores")
+    threading.Thread(target=loop_envio, daemon=True).start()
+
+def tratar_linha(linha, instante_leitura):
+    """Trata uma linha recebida do Arduino remoto."""
+    if len(linha) < 6 or mensagem_de_sistema(linha):
+        return
+    
+    print(f"📨 Cartão detectado: {linha}")
+    
+    # Obter localização
+    localizacao = obter_localizacao_aproximada()
+    print(f"📍 Localização: {localizacao['cidade']}, {localizacao['regiao']}")
+    
+    # Enfileirar para envio ao servidor central (não bloqueia a leitura)
+    enviar_para_servidor_central(linha, localizacao, instante_leitura)
+
+leitor = LeitorSerial(PORTA_ARDUINO, tratar_linha, baudrate=BAUDRATE, timeout_leitura=2)
 
 def monitorar_arduino():
     """Monitora o Arduino local e envia dados para o servidor central."""
-    arduino = None
-    
     try:
         print(f"🔌 Conectando ao Arduino na porta {PORTA_ARDUINO}...")
-        arduino = serial.Serial(PORTA_ARDUINO, BAUDRATE, timeout=2)
-        time.sleep(2)
+        leitor.iniciar()
         
-        print("✅ Arduino conectado")
         print("📡 Enviando dados para servidor central...")
         print("🔄 Monitorando cartões RFID...")
         
+        # A leitura (com reconexão automática) roda na thread do leitor
         while True:
-            if arduino.in_waiting > 0:
-                linha = arduino.readline().decode('utf-8', errors='ignore').strip()
-                
-                if linha and len(linha) >= 6:
-                    # Ignorar mensagens de sistema
-                    if any(palavra in linha.upper() for palavra in ['INICIADO', 'PRONTO', 'READY', 'SYSTEM', 'RFID']):
-                        continue
-                    
-                    print(f"📨 Cartão detectado: {linha}")
-                    
-                    # Obter localização
-                    localizacao = obter_localizacao_aproximada()
-                    print(f"📍 Localização: {localizacao['cidade']}, {localizacao['regiao']}")
-                    
-                    # Enviar para servidor central
-                    enviar_para_servidor_central(linha, localizacao)
-            
-            time.sleep(0.1)
+            time.sleep(60)
+            print(f"⏱️ Latência tap → servidor: {leitor.latencia.resumo()} | pendentes: {fila_saida.pendentes()}")
             
+    except KeyboardInterrupt:
+        pass
     except Exception as e:
         print(f"❌ Erro: {e}")
     finally:
-        if arduino:
-            arduino.close()
+        leitor.fechar()
 
 if __name__ == '__main__':
     print("🚀 Dispositivo Remoto Iniciado")
@@ -116,6 +180,12 @@ if __name__ == '__main__':
     print("⚠️  Verifique se o IP do servidor central está correto!")
     print("⏳ Iniciando monitoramento...")
     
+    # Localização em cache, renovada em segundo plano
+    cache_localizacao.iniciar()
+    
+    # Fila de saída persistente e envio em lote
+    iniciar_envio()
+    
     # Instalar dependência: pip install requests pyserial
     
     monitorar_arduino()
\ No newline at end of file
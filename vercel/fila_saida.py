@@ -0,0 +1,81 @@
+import json
+import sqlite3
+import threading
+import time
+
+# ===== FILA DE SAÍDA PERSISTENTE (STORE-AND-FORWARD) =====
+
+class FilaSaida:
+    """Fila de eventos a enviar ao servidor central, persistida em SQLite.
+
+    Os acessos são gravados aqui antes de qualquer tentativa de rede, então
+    sobrevivem a quedas do servidor e a reinícios do dispositivo. O envio
+    remove os eventos somente depois da confirmação do servidor.
+    """
+
+    def __init__(self, arquivo):
+        self.arquivo = arquivo
+        self._lock = threading.Lock()
+        self._novo_evento = threading.Event()
+        self._conexao = sqlite3.connect(arquivo, check_same_thread=False)
+        self._conexao.execute("PRAGMA journal_mode=WAL")
+        self._conexao.execute("PRAGMA synchronous=NORMAL")
+        self._conexao.execute(
+            """CREATE TABLE IF NOT EXISTS eventos (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                id_evento TEXT UNIQUE NOT NULL,
+                dados TEXT NOT NULL,
+                criado_em REAL NOT NULL,
+                tentativas INTEGER NOT NULL DEFAULT 0
+            )"""
+        )
+        self._conexao.commit()
+
+    def adicionar(self, evento):
+        """Grava um evento (com 'id_evento') na fila."""
+        with self._lock:
+            self._conexao.execute(
+                "INSERT OR IGNORE INTO eventos (id_evento, dados, criado_em) VALUES (?, ?, ?)",
+                (evento["id_evento"], json.dumps(evento, ensure_ascii=False), time.time())
+            )
+            self._conexao.commit()
+        self._novo_evento.set()
+
+    def proximo_lote(self, limite):
+        """Retorna até `limite` eventos pendentes, do mais antigo ao mais novo."""
+        with self._lock:
+            linhas = self._conexao.execute(
+                "SELECT dados FROM eventos ORDER BY id LIMIT ?", (limite,)
+            ).fetchall()
+        return [json.loads(dados) for (dados,) in linhas]
+
+    def remover(self, ids_evento):
+        """Remove eventos confirmados pelo servidor."""
+        if not ids_evento:
+            return
+        with self._lock:
+            self._conexao.executemany(
+                "DELETE FROM eventos WHERE id_evento = ?", [(i,) for i in ids_evento]
+            )
+            self._conexao.commit()
+
+    def registrar_tentativa(self, ids_evento):
+        with self._lock:
+            self._conexao.executemany(
+                "UPDATE eventos SET tentativas = tentativas + 1 WHERE id_evento = ?",
+                [(i,) for i in ids_evento]
+            )
+            self._conexao.commit()
+
+    def pendentes(self):
+        with self._lock:
+            return self._conexao.execute("SELECT COUNT(*) FROM eventos").fetchone()[0]
+
+    def aguardar(self, timeout):
+        """Espera até um novo evento ser adicionado (ou o timeout)."""
+        self._novo_evento.wait(timeout)
+        self._novo_evento.clear()
+
+    def fechar(self):
+        with self._lock:
+            self._conexao.close()
@@ -0,0 +1,198 @@
+import asyncio
+import json
+import os
+import threading
+import time
+
+import requests
+
+# ===== LOCALIZAÇÃO PADRÃO =====
+
+def localizacao_desconhecida():
+    """Localização usada enquanto nenhuma consulta foi bem-sucedida."""
+    return {
+        "ip": "Desconhecido",
+        "cidade": "Desconhecida",
+        "regiao": "Desconhecida",
+        "pais": "Desconhecido",
+        "lat": None,
+        "lon": None,
+        "isp": "Desconhecido"
+    }
+
+def endereco_google_maps(lat, lon):
+    """Link do Google Maps para as coordenadas (derivado, não precisa ser armazenado)."""
+    if lat and lon:
+        return f"https://www.google.com/maps?q={lat},{lon}"
+    return "Localização não disponível"
+
+# ===== PROVEDORES =====
+
+class ProvedorIPAPI:
+    """Provedor padrão: ipify para o IP público e ip-api para a localização.
+
+    As URLs são configuráveis para permitir apontar para um servidor local
+    de testes.
+    """
+
+    def __init__(self, url_ip='https://api.ipify.org?format=json',
+                 url_localizacao='http://ip-api.com/json/{ip}', timeout=5):
+        self.url_ip = url_ip
+        self.url_localizacao = url_localizacao
+        self.timeout = timeout
+
+    def consultar(self):
+        """Consulta o IP público e sua localização; retorna None em caso de falha."""
+        response = requests.get(self.url_ip, timeout=self.timeout)
+        ip_publico = response.json()['ip']
+
+        response = requests.get(self.url_localizacao.format(ip=ip_publico), timeout=self.timeout)
+        dados_localizacao = response.json()
+
+        if dados_localizacao.get('status') != 'success':
+            return None
+
+        return {
+            "ip": ip_publico,
+            "cidade": dados_localizacao.get('city', 'Desconhecida'),
+            "regiao": dados_localizacao.get('regionName', 'Desconhecida'),
+            "pais": dados_localizacao.get('country', 'Desconhecido'),
+            "lat": dados_localizacao.get('lat'),
+            "lon": dados_localizacao.get('lon'),
+            "isp": dados_localizacao.get('isp', 'Desconhecido')
+        }
+
+# ===== CACHE =====
+
+class CacheGeolocalizacao:
+    """Cache da localização do dispositivo com TTL e atualização em segundo plano.
+
+    O caminho do acesso só lê o valor em memória e nunca espera a rede; uma
+    thread renova o valor quando o TTL expira. O último valor é persistido
+    em disco para que reinícios não precisem consultar o provedor.
+
+    Com iniciar_async() a renovação é uma tarefa do laço asyncio; só a
+    consulta ao provedor (bloqueante) roda no executor.
+    """
+
+    def __init__(self, provedor=None, ttl=3600, arquivo_cache=None, intervalo_retentativa=60):
+        self.provedor = provedor or ProvedorIPAPI()
+        self.ttl = ttl
+        self.arquivo_cache = arquivo_cache
+        self.intervalo_retentativa = intervalo_retentativa
+
+        self._lock = threading.Lock()
+        self._localizacao = None
+        self._atualizado_em = 0
+        self._thread = None
+        self._laco = None
+        self._acordar_async = None
+        self._parar = threading.Event()
+        self._acordar = threading.Event()
+
+    def _carregar_disco(self):
+        """Carrega a última localização persistida, se houver."""
+        if not self.arquivo_cache or not os.path.exists(self.arquivo_cache):
+            return
+        try:
+            with open(self.arquivo_cache, 'r', encoding='utf-8') as f:
+                dados = json.load(f)
+            with self._lock:
+                self._localizacao = dados["localizacao"]
+                self._atualizado_em = dados.get("atualizado_em", 0)
+        except Exception as e:
+            print(f"Erro ao carregar cache de localização: {e}")
+
+    def _salvar_disco(self, localizacao, atualizado_em):
+        if not self.arquivo_cache:
+            return
+        try:
+            temporario = self.arquivo_cache + ".tmp"
+            with open(temporario, 'w', encoding='utf-8') as f:
+                json.dump({"localizacao": localizacao, "atualizado_em": atualizado_em}, f, ensure_ascii=False)
+            os.replace(temporario, self.arquivo_cache)
+        except Exception as e:
+            print(f"Erro ao salvar cache de localização: {e}")
+
+    def iniciar(self):
+        """Carrega o cache do disco e inicia a thread de atualização."""
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._thread = threading.Thread(target=self._loop_atualizacao, daemon=True)
+        self._carregar_disco()
+        self._thread.start()
+
+    def iniciar_async(self):
+        """Carrega o cache do disco e agenda a renovação no laço asyncio em execução."""
+        with self._lock:
+            if self._thread is not None or self._laco is not None:
+                return
+            self._laco = asyncio.get_running_loop()
+            self._acordar_async = asyncio.Event()
+        self._carregar_disco()
+        self._laco.create_task(self._loop_atualizacao_async())
+
+    def parar(self):
+        self._parar.set()
+        self._acordar.set()
+        self._sinalizar_laco()
+
+    def _sinalizar_laco(self):
+        if self._laco is not None:
+            self._laco.call_soon_threadsafe(self._acordar_async.set)
+
+    def expirado(self):
+        with self._lock:
+            return self._localizacao is None or time.time() - self._atualizado_em >= self.ttl
+
+    def obter(self):
+        """Retorna a localização em cache (ou a padrão) sem acessar a rede."""
+        if self._thread is None and self._laco is None:
+            self.iniciar()
+        with self._lock:
+            localizacao = self._localizacao
+        return dict(localizacao) if localizacao else localizacao_desconhecida()
+
+    def atualizar(self):
+        """Consulta o provedor e atualiza o cache; retorna True em caso de sucesso."""
+        try:
+            localizacao = self.provedor.consultar()
+        except Exception as e:
+            print(f"Erro ao obter localização: {e}")
+            return False
+        if not localizacao:
+            return False
+
+        agora = time.time()
+        with self._lock:
+            self._localizacao = localizacao
+            self._atualizado_em = agora
+        self._salvar_disco(localizacao, agora)
+        return True
+
+    def _espera(self):
+        with self._lock:
+            return max(0, self.ttl - (time.time() - self._atualizado_em))
+
+    def _loop_atualizacao(self):
+        while not self._parar.is_set():
+            if self.expirado():
+                espera = self.ttl if self.atualizar() else self.intervalo_retentativa
+            else:
+                espera = self._espera()
+            self._acordar.wait(espera)
+            self._acordar.clear()
+
+    async def _loop_atualizacao_async(self):
+        while not self._parar.is_set():
+            if self.expirado():
+                sucesso = await self._laco.run_in_executor(None, self.atualizar)
+                espera = self.ttl if sucesso else self.intervalo_retentativa
+            else:
+                espera = self._espera()
+            try:
+                await asyncio.wait_for(self._acordar_async.wait(), espera)
+            except asyncio.TimeoutError:
+                pass
+            self._acordar_async.clear()
@@ -0,0 +1,396 @@
+import asyncio
+import threading
+import time
+from collections import deque
+
+import serial
+
+# Mensagens de inicialização do Arduino que não são UIDs
+PALAVRAS_SISTEMA = ['INICIADO', 'PRONTO', 'READY', 'SYSTEM', 'RFID']
+
+def mensagem_de_sistema(linha):
+    """Indica se a linha é uma mensagem de sistema do Arduino."""
+    return any(palavra in linha.upper() for palavra in PALAVRAS_SISTEMA)
+
+# ===== LATÊNCIA =====
+
+class AmostrasLatencia:
+    """Janela das últimas latências medidas (tap até resposta)."""
+
+    def __init__(self, tamanho=1000):
+        self._amostras = deque(maxlen=tamanho)
+        self._lock = threading.Lock()
+        self.total = 0
+
+    def registrar(self, segundos):
+        with self._lock:
+            self._amostras.append(segundos)
+            self.total += 1
+
+    def resumo(self):
+        with self._lock:
+            amostras = sorted(self._amostras)
+            total = self.total
+        if not amostras:
+            return {"amostras": total, "p50_ms": None, "p99_ms": None, "max_ms": None}
+
+        def percentil(p):
+            return round(amostras[min(len(amostras) - 1, int(p * len(amostras)))] * 1000, 3)
+
+        return {
+            "amostras": total,
+            "p50_ms": percentil(0.50),
+            "p99_ms": percentil(0.99),
+            "max_ms": round(amostras[-1] * 1000, 3)
+        }
+
+# ===== LEITOR SERIAL =====
+
+class LeitorSerial:
+    """Leitor serial orientado a eventos, com leitura e escrita independentes.
+
+    A thread de leitura fica bloqueada em read() até chegar um byte (sem
+    polling de in_waiting), junta o que estiver disponível e separa todas
+    as linhas completas do buffer. A escrita usa um lock próprio, então a
+    resposta ao Arduino nunca espera a leitura. Reconecta com backoff
+    exponencial.
+
+    Com iniciar_async() não há thread: a porta é observada pelo laço
+    asyncio (add_reader) e as linhas são entregues no próprio laço.
+    """
+
+    def __init__(self, porta, ao_receber_linha, baudrate=9600, timeout_leitura=1.0,
+                 espera_inicializacao=2, backoff_inicial=0.5, backoff_maximo=30):
+        self.porta = porta
+        self.ao_receber_linha = ao_receber_linha
+        self.baudrate = baudrate
+        self.timeout_leitura = timeout_leitura
+        self.espera_inicializacao = espera_inicializacao
+        self.backoff_inicial = backoff_inicial
+        self.backoff_maximo = backoff_maximo
+
+        self._serial = None
+        self._lock_conexao = threading.Lock()
+        self._lock_escrita = threading.Lock()
+        self._thread = None
+        self._laco = None
+        self._tarefa = None
+        self._perda = None  # Resolvido quando a porta observada pelo laço é fechada
+        self._ativo = False
+        self._buffer = b""
+
+        self.reconexoes = 0
+        self.falhas_conexao = 0
+        self.linhas_recebidas = 0
+        self.ultimo_erro = None
+        self.latencia = AmostrasLatencia()
+
+    @property
+    def conectado(self):
+        conexao = self._serial
+        return conexao is not None and conexao.is_open
+
+    # ----- Conexão -----
+
+    def _abrir(self):
+        print(f"Conectando na porta {self.porta}...")
+        return serial.Serial(
+            port=self.porta,
+            baudrate=self.baudrate,
+            timeout=self.timeout_leitura,
+            write_timeout=self.timeout_leitura,
+            bytesize=serial.EIGHTBITS,
+            parity=serial.PARITY_NONE,
+            stopbits=serial.STOPBITS_ONE,
+            rtscts=False,
+            dsrdtr=False
+        )
+
+    def _ativar(self, conexao):
+        """Limpa o buffer do Arduino já inicializado e passa a usar a conexão."""
+        conexao.reset_input_buffer()
+        with self._lock_conexao:
+            self._serial = conexao
+            self._buffer = b""
+        print(f"✅ Conexão serial estabelecida em {self.porta}")
+
+    def _conectar(self):
+        """Abre a porta serial; retorna True em caso de sucesso."""
+        conexao = self._abrir()
+        # Aguardar Arduino inicializar e limpar buffer
+        time.sleep(self.espera_inicializacao)
+        self._ativar(conexao)
+        return True
+
+    def _desconectar(self):
+        with self._lock_conexao:
+            conexao, self._serial = self._serial, None
+        if conexao is None:
+            return
+        if self._laco is not None:
+            # A porta pode estar registrada no laço: remover antes de fechar
+            self._laco.call_soon_threadsafe(self._fechar_observada, conexao)
+            return
+        try:
+            conexao.close()
+        except Exception:
+            pass
+
+    # ----- Leitura -----
+
+    def iniciar(self):
+        """Inicia a thread de leitura."""
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._ativo = True
+        self._thread = threading.Thread(target=self._loop, daemon=True)
+        self._thread.start()
+
+    def _loop(self):
+        backoff = self.backoff_inicial
+        primeira_conexao = True
+        while self._ativo:
+            if not self.conectado:
+                try:
+                    self._conectar()
+                    if not primeira_conexao:
+                        self.reconexoes += 1
+                    primeira_conexao = False
+                    backoff = self.backoff_inicial
+                except Exception as e:
+                    self.falhas_conexao += 1
+                    self.ultimo_erro = str(e)
+                    print(f"❌ Erro na conexão serial ({self.porta}): {e} - nova tentativa em {backoff:.1f}s")
+                    time.sleep(backoff)
+                    backoff = min(backoff * 2, self.backoff_maximo)
+                    continue
+
+            try:
+                self._ler()
+            except Exception as e:
+                if not self._ativo:
+                    # Porta fechada por fechar() durante a leitura
+                    break
+                self.ultimo_erro = str(e)
+                print(f"Erro na leitura serial ({self.porta}): {e}")
+                self._desconectar()
+
+    def _ler(self):
+        """Bloqueia até chegar dados e entrega cada linha completa."""
+        conexao = self._serial
+        if conexao is None:
+            return
+        # Bloqueia até 1 byte (ou timeout) e junta o que mais já estiver no buffer
+        dados = conexao.read(1)
+        if not dados:
+            return
+        instante = time.perf_counter()
+        if conexao.in_waiting:
+            dados += conexao.read(conexao.in_waiting)
+        self._entregar(dados, instante)
+
+    def _entregar(self, dados, instante):
+        """Separa as linhas completas do buffer e entrega cada uma."""
+        self._buffer += dados
+        *linhas, self._buffer = self._buffer.split(b"\n")
+        for bruta in linhas:
+            linha = bruta.decode('utf-8', errors='ignore').strip()
+            if not linha:
+                continue
+            self.linhas_recebidas += 1
+            try:
+                self.ao_receber_linha(linha, instante)
+            except Exception as e:
+                print(f"Erro ao tratar linha serial: {e}")
+
+    # ----- Leitura no laço asyncio -----
+
+    def iniciar_async(self):
+        """Inicia a leitura como tarefa do laço asyncio em execução."""
+        if self._tarefa is not None and not self._tarefa.done():
+            return
+        self._laco = asyncio.get_running_loop()
+        self._ativo = True
+        self._tarefa = self._laco.create_task(self._loop_async())
+
+    async def _loop_async(self):
+        backoff = self.backoff_inicial
+        primeira_conexao = True
+        while self._ativo:
+            if not self.conectado:
+                try:
+                    # serial.Serial() bloqueia (open/termios): abrir fora do laço
+                    conexao = await self._laco.run_in_executor(None, self._abrir)
+                    await asyncio.sleep(self.espera_inicializacao)
+                    if not self._ativo:
+                        conexao.close()
+                        break
+                    self._ativar(conexao)
+                    if not primeira_conexao:
+                        self.reconexoes += 1
+                    primeira_conexao = False
+                    backoff = self.backoff_inicial
+                except Exception as e:
+                    self.falhas_conexao += 1
+                    self.ultimo_erro = str(e)
+                    print(f"❌ Erro na conexão serial ({self.porta}): {e} - nova tentativa em {backoff:.1f}s")
+                    await asyncio.sleep(backoff)
+                    backoff = min(backoff * 2, self.backoff_maximo)
+                    continue
+
+            conexao = self._serial
+            if conexao is None:
+                continue
+            try:
+                self._perda = self._laco.create_future()
+                self._laco.add_reader(conexao.fileno(), self._ao_ficar_legivel, conexao)
+            except (AttributeError, NotImplementedError):
+                # Windows: a porta não é um descritor observável pelo laço; lê no executor
+                await self._laco.run_in_executor(None, self._ler_ou_desconectar)
+                continue
+            await self._perda
+
+    def _ao_ficar_legivel(self, conexao):
+        instante = time.perf_counter()
+        try:
+            dados = conexao.read(conexao.in_waiting or 1)
+        except Exception as e:
+            self.ultimo_erro = str(e)
+            print(f"Erro na leitura serial ({self.porta}): {e}")
+            self._desconectar()
+            return
+        self._entregar(dados, instante)
+
+    def _ler_ou_desconectar(self):
+        try:
+            self._ler()
+        except Exception as e:
+            self.ultimo_erro = str(e)
+            print(f"Erro na leitura serial ({self.porta}): {e}")
+            self._desconectar()
+
+    def _fechar_observada(self, conexao):
+        """Remove a porta do laço, fecha a conexão e acorda o loop de reconexão."""
+        try:
+            self._laco.remove_reader(conexao.fileno())
+        except (AttributeError, NotImplementedError, ValueError):
+            pass
+        try:
+            conexao.close()
+        except Exception:
+            pass
+        if self._perda is not None and not self._perda.done():
+            self._perda.set_result(None)
+
+    # ----- Escrita -----
+
+    def enviar(self, dados, instante_leitura=None):
+        """Envia bytes ao Arduino; registra a latência desde a leitura, se informada."""
+        with self._lock_escrita:
+            conexao = self._serial
+            if conexao is None or not conexao.is_open:
+                print(f"⚠️ Arduino não disponível para envio ({self.porta})")
+                return False
+            try:
+                conexao.write(dados)
+                conexao.flush()
+            except Exception as e:
+                print(f"Erro ao enviar comando: {e}")
+                self.ultimo_erro = str(e)
+                self._desconectar()
+                return False
+
+        if instante_leitura is not None:
+            self.latencia.registrar(time.perf_counter() - instante_leitura)
+        return True
+
+    # ----- Ciclo de vida -----
+
+    def reiniciar(self):
+        """Fecha a conexão atual; a thread (ou tarefa) de leitura reconecta em seguida."""
+        self._desconectar()
+        if self._laco is None:
+            self.iniciar()
+        return True
+
+    def fechar(self):
+        self._ativo = False
+        self._desconectar()
+
+    def status(self):
+        return {
+            "porta": self.porta,
+            "conectado": self.conectado,
+            "reconexoes": self.reconexoes,
+            "falhas_conexao": self.falhas_conexao,
+            "linhas_recebidas": self.linhas_recebidas,
+            "ultimo_erro": self.ultimo_erro,
+            "latencia_tap_resposta": self.latencia.resumo()
+        }
+
+# ===== VÁRIOS LEITORES LOCAIS =====
+
+class GerenciadorLeitores:
+    """Abre N portas seriais configuradas, cada uma com seu leitor.
+
+    Cada leitor tem sua própria thread, estado de reconexão e
+    dispositivo_id; todos entregam as linhas para o mesmo callback
+    ao_receber_linha(dispositivo_id, linha, instante_leitura). As portas
+    podem ser pseudo-terminais (pty), o que permite testar sem hardware.
+    """
+
+    def __init__(self, configuracoes, ao_receber_linha, **opcoes_leitor):
+        self.leitores = {}
+        for configuracao in configuracoes:
+            dispositivo_id = configuracao["dispositivo_id"]
+            if dispositivo_id in self.leitores:
+                raise ValueError(f"dispositivo_id duplicado: {dispositivo_id}")
+            opcoes = dict(opcoes_leitor)
+            opcoes.update({k: v for k, v in configuracao.items() if k not in ("porta", "dispositivo_id")})
+            self.leitores[dispositivo_id] = LeitorSerial(
+                configuracao["porta"],
+                lambda linha, instante, dispositivo_id=dispositivo_id: ao_receber_linha(dispositivo_id, linha, instante),
+                **opcoes
+            )
+
+    def local(self, dispositivo_id):
+        """Indica se o dispositivo é um leitor local deste processo."""
+        return dispositivo_id in self.leitores
+
+    def iniciar(self):
+        for leitor in self.leitores.values():
+            leitor.iniciar()
+
+    def iniciar_async(self):
+        """Lê todas as portas no laço asyncio em execução, sem threads."""
+        for leitor in self.leitores.values():
+            leitor.iniciar_async()
+
+    def fechar(self):
+        for leitor in self.leitores.values():
+            leitor.fechar()
+
+    def enviar(self, dispositivo_id, dados, instante_leitura=None):
+        """Envia bytes ao Arduino do dispositivo informado."""
+        leitor = self.leitores.get(dispositivo_id)
+        if leitor is None:
+            print(f"⚠️ Leitor local não encontrado: {dispositivo_id}")
+            return False
+        return leitor.enviar(dados, instante_leitura)
+
+    def reiniciar(self, porta=None):
+        """Reinicia um leitor (pela porta) ou todos; retorna False se a porta não existir."""
+        alvos = [l for l in self.leitores.values() if porta is None or l.porta == porta]
+        for leitor in alvos:
+            leitor.reiniciar()
+        return bool(alvos)
+
+    @property
+    def algum_conectado(self):
+        return any(leitor.conectado for leitor in self.leitores.values())
+
+    def status(self):
+        return {
+            dispositivo_id: leitor.status()
+            for dispositivo_id, leitor in self.leitores.items()
+        }
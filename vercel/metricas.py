@@ -0,0 +1,143 @@
+import threading
+import time
+from bisect import bisect_left
+
+# ===== HISTOGRAMAS =====
+
+LIMITES_PADRAO = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01,
+                  0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)  # Segundos
+
+class Histograma:
+    """Contagens por faixa de duração (não cumulativas; acumuladas ao exportar)."""
+
+    __slots__ = ("limites", "contagens", "soma", "total")
+
+    def __init__(self, limites):
+        self.limites = limites
+        self.contagens = [0] * (len(limites) + 1)
+        self.soma = 0.0
+        self.total = 0
+
+    def observar(self, segundos):
+        self.contagens[bisect_left(self.limites, segundos)] += 1
+        self.soma += segundos
+        self.total += 1
+
+# ===== COLETOR =====
+
+def _rotulos(rotulos):
+    if not rotulos:
+        return ""
+    return "{" + ",".join(f'{nome}="{valor}"' for nome, valor in rotulos) + "}"
+
+class ColetorMetricas:
+    """Histogramas por etapa, contadores e medidores no formato do Prometheus.
+
+    Uso no caminho do acesso:
+
+        inicio = metricas.agora()
+        ...
+        metricas.observar("suspeita", inicio)
+
+    Desativado, agora() retorna None e observar()/incrementar() retornam
+    na primeira instrução: não há leitura de relógio nem lock. Medidores
+    (profundidade de filas, reconexões) são funções lidas só na exportação.
+    """
+
+    def __init__(self, ativo=True, prefixo="sistema_acesso", limites=LIMITES_PADRAO):
+        self.ativo = ativo
+        self.prefixo = prefixo
+        self.limites = tuple(limites)
+        self._lock = threading.Lock()
+        self._etapas = {}
+        self._contadores = {}
+        self._ajudas = {}
+        self._medidores = []
+
+    def agora(self):
+        """Instante para observar() depois (None se desativado)."""
+        if not self.ativo:
+            return None
+        return time.perf_counter()
+
+    def observar(self, etapa, inicio):
+        """Registra a duração da etapa desde `inicio` (de agora() ou perf_counter())."""
+        if inicio is None or not self.ativo:
+            return
+        duracao = time.perf_counter() - inicio
+        with self._lock:
+            histograma = self._etapas.get(etapa)
+            if histograma is None:
+                histograma = self._etapas[etapa] = Histograma(self.limites)
+            histograma.observar(duracao)
+
+    def incrementar(self, nome, valor=1, **rotulos):
+        if not self.ativo:
+            return
+        chave = (nome, tuple(sorted(rotulos.items())))
+        with self._lock:
+            self._contadores[chave] = self._contadores.get(chave, 0) + valor
+
+    def descrever(self, nome, ajuda):
+        """Texto de ajuda (# HELP) de um contador ou medidor."""
+        self._ajudas[nome] = ajuda
+
+    def registrar_medidor(self, nome, ajuda, ler, tipo="gauge"):
+        """Medidor lido na exportação: ler() retorna um número ou {dispositivo: número}.
+
+        Use tipo="counter" para valores que só crescem (mantidos por outro objeto).
+        """
+        self._ajudas[nome] = ajuda
+        self._medidores.append((nome, ler, tipo))
+
+    # ----- Exportação -----
+
+    def exportar(self):
+        """Texto no formato de exposição do Prometheus (text/plain; version=0.0.4)."""
+        linhas = []
+        with self._lock:
+            etapas = {
+                etapa: (list(h.contagens), h.soma, h.total)
+                for etapa, h in self._etapas.items()
+            }
+            contadores = dict(self._contadores)
+
+        nome = f"{self.prefixo}_etapa_segundos"
+        linhas.append(f"# HELP {nome} Duração de cada etapa do processamento de um acesso")
+        linhas.append(f"# TYPE {nome} histogram")
+        for etapa in sorted(etapas):
+            contagens, soma, total = etapas[etapa]
+            acumulado = 0
+            for limite, contagem in zip(self.limites, contagens):
+                acumulado += contagem
+                linhas.append(f'{nome}_bucket{{etapa="{etapa}",le="{limite}"}} {acumulado}')
+            linhas.append(f'{nome}_bucket{{etapa="{etapa}",le="+Inf"}} {total}')
+            linhas.append(f'{nome}_sum{{etapa="{etapa}"}} {soma}')
+            linhas.append(f'{nome}_count{{etapa="{etapa}"}} {total}')
+
+        por_nome = {}
+        for (nome_contador, rotulos), valor in contadores.items():
+            por_nome.setdefault(nome_contador, []).append((rotulos, valor))
+        for nome_contador in sorted(por_nome):
+            nome = f"{self.prefixo}_{nome_contador}_total"
+            if nome_contador in self._ajudas:
+                linhas.append(f"# HELP {nome} {self._ajudas[nome_contador]}")
+            linhas.append(f"# TYPE {nome} counter")
+            for rotulos, valor in sorted(por_nome[nome_contador]):
+                linhas.append(f"{nome}{_rotulos(rotulos)} {valor}")
+
+        for nome_medidor, ler, tipo in self._medidores:
+            nome = f"{self.prefixo}_{nome_medidor}"
+            try:
+                valor = ler()
+            except Exception as e:
+                print(f"Erro ao ler medidor {nome_medidor}: {e}")
+                continue
+            linhas.append(f"# HELP {nome} {self._ajudas[nome_medidor]}")
+            linhas.append(f"# TYPE {nome} {tipo}")
+            if isinstance(valor, dict):
+                for rotulo, numero in sorted(valor.items()):
+                    linhas.append(f'{nome}{{dispositivo="{rotulo}"}} {numero}')
+            else:
+                linhas.append(f"{nome} {valor}")
+        return "\n".join(linhas) + "\n"
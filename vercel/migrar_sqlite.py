@@ -0,0 +1,74 @@
+"""Importa os acessos existentes para o banco SQLite (BACKEND_ARMAZENAMENTO = "sqlite").
+
+Uso:
+    python migrar_sqlite.py [--banco acessos.db] [--log log_acessos.json]
+                            [--diario log_acessos.jsonl] [--snapshot log_acessos.snapshot.json]
+                            [--snapshot-binario log_acessos.snapshot.bin]
+                            [--arquivo arquivo_acessos]
+
+Se houver diário/snapshot (modo "diario"), importa o estado completo deles,
+incluindo os acessos arquivados; caso contrário importa o log_acessos.json.
+"""
+import argparse
+import os
+import sys
+
+from armazenamento import DiarioAcessos
+from armazenamento_sqlite import ArmazenamentoSQLite
+from arquivo_historico import ArquivoHistorico
+
+def carregar_diario(arquivo_diario, arquivo_snapshot, diretorio_arquivo, arquivo_snapshot_binario=None):
+    """Estado completo do modo diário: snapshot + diário + acessos arquivados."""
+    cartoes = DiarioAcessos(
+        arquivo_diario, arquivo_snapshot, arquivo_snapshot_binario=arquivo_snapshot_binario
+    ).carregar()
+    if os.path.isdir(diretorio_arquivo):
+        antigos = {}
+        for uid, dados in ArquivoHistorico(diretorio_arquivo).iterar():
+            antigos.setdefault(uid, []).append(dados)
+        for uid, acessos in antigos.items():
+            info = cartoes.setdefault(uid, {"acessos": []})
+            # O snapshot pode ainda conter acessos já arquivados
+            presentes = {acesso.get("timestamp") for acesso in info.get("acessos", [])}
+            acessos = sorted(
+                (acesso for acesso in acessos if acesso.get("timestamp") not in presentes),
+                key=lambda acesso: acesso.get("timestamp", "")
+            )
+            info["acessos"] = acessos + info.get("acessos", [])
+    return cartoes
+
+def main():
+    parser = argparse.ArgumentParser(description="Migra os acessos para o banco SQLite.")
+    parser.add_argument("--banco", default="acessos.db")
+    parser.add_argument("--log", default="log_acessos.json")
+    parser.add_argument("--diario", default="log_acessos.jsonl")
+    parser.add_argument("--snapshot", default="log_acessos.snapshot.json")
+    parser.add_argument("--snapshot-binario", default="log_acessos.snapshot.bin")
+    parser.add_argument("--arquivo", default="arquivo_acessos")
+    args = parser.parse_args()
+
+    banco = ArmazenamentoSQLite(args.banco)
+    try:
+        if not banco.vazio():
+            print(f"❌ O banco {args.banco} já contém cartões; nada foi importado")
+            return 1
+
+        snapshots = [args.snapshot_binario, args.snapshot]
+        if any(os.path.exists(caminho) for caminho in snapshots + [args.diario]):
+            cartoes = carregar_diario(args.diario, args.snapshot, args.arquivo, args.snapshot_binario)
+            snapshot = next((caminho for caminho in snapshots if os.path.exists(caminho)), args.snapshot)
+            origem = f"{snapshot} + {args.diario}"
+        elif os.path.exists(args.log):
+            return 0 if banco.migrar_log_legado(args.log) else 1
+        else:
+            print("❌ Nenhum log encontrado para importar")
+            return 1
+
+        total = banco.importar_cartoes(cartoes)
+        print(f"✅ {len(cartoes)} cartões e {total} acessos importados de {origem} para {args.banco}")
+        return 0
+    finally:
+        banco.fechar()
+
+if __name__ == "__main__":
+    sys.exit(main())
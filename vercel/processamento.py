@@ -0,0 +1,305 @@
+import queue
+import threading
+import time
+from collections import OrderedDict
+
+# ===== FILA DE ESCRITA POSTERIOR (WRITE-BEHIND) =====
+
+class _Lote(list):
+    """Itens enfileirados juntos; o worker os processa no mesmo lote."""
+
+class FilaEscrita:
+    """Fila limitada drenada por um worker em lotes.
+
+    O caminho da decisão só enfileira; persistência, agregados e notificação
+    acontecem no worker. Quando a fila enche, quem enfileira espera
+    (backpressure) em vez de descartar acessos, e o tempo de espera é
+    contabilizado nas métricas.
+    """
+
+    _FIM = object()
+
+    def __init__(self, processar_lote, tamanho_maximo=10000, tamanho_lote=200, espera_lote=0.05):
+        self.processar_lote = processar_lote
+        self.tamanho_lote = tamanho_lote
+        self.espera_lote = espera_lote
+        self._fila = queue.Queue(maxsize=tamanho_maximo)
+        self._thread = None
+        self._lock = threading.Lock()
+
+        self.enfileirados = 0
+        self.processados = 0
+        self.lotes = 0
+        self.erros = 0
+        self.bloqueios = 0
+        self.tempo_bloqueado = 0.0
+        self.maior_profundidade = 0
+
+    def iniciar(self):
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._thread = threading.Thread(target=self._loop, daemon=True)
+            self._thread.start()
+
+    def enfileirar(self, item):
+        """Enfileira um item; bloqueia enquanto a fila estiver cheia."""
+        if self._thread is None:
+            self.iniciar()
+        try:
+            self._fila.put_nowait(item)
+        except queue.Full:
+            inicio = time.perf_counter()
+            self._fila.put(item)
+            with self._lock:
+                self.bloqueios += 1
+                self.tempo_bloqueado += time.perf_counter() - inicio
+
+        with self._lock:
+            self.enfileirados += len(item) if isinstance(item, _Lote) else 1
+            profundidade = self._fila.qsize()
+            if profundidade > self.maior_profundidade:
+                self.maior_profundidade = profundidade
+
+    def enfileirar_lote(self, itens):
+        """Enfileira vários itens como uma única entrada (processados no mesmo lote)."""
+        if itens:
+            self.enfileirar(_Lote(itens))
+
+    @staticmethod
+    def _acrescentar(lote, item):
+        if isinstance(item, _Lote):
+            lote.extend(item)
+        else:
+            lote.append(item)
+
+    def _loop(self):
+        while True:
+            item = self._fila.get()
+            if item is self._FIM:
+                return
+
+            lote = []
+            self._acrescentar(lote, item)
+            encerrar = False
+            limite = time.monotonic() + self.espera_lote
+            while len(lote) < self.tamanho_lote:
+                restante = limite - time.monotonic()
+                try:
+                    item = self._fila.get(timeout=restante) if restante > 0 else self._fila.get_nowait()
+                except queue.Empty:
+                    break
+                if item is self._FIM:
+                    encerrar = True
+                    break
+                self._acrescentar(lote, item)
+
+            self._processar(lote)
+            if encerrar:
+                return
+
+    def _processar(self, lote):
+        try:
+            self.processar_lote(lote)
+        except Exception as e:
+            print(f"Erro ao processar lote da fila de escrita: {e}")
+            with self._lock:
+                self.erros += 1
+        with self._lock:
+            self.processados += len(lote)
+            self.lotes += 1
+
+    def encerrar(self, timeout=10):
+        """Drena o que estiver pendente e encerra o worker."""
+        if self._thread is None or not self._thread.is_alive():
+            return
+        self._fila.put(self._FIM)
+        self._thread.join(timeout)
+
+    def metricas(self):
+        with self._lock:
+            return {
+                "profundidade": self._fila.qsize(),
+                "capacidade": self._fila.maxsize,
+                "maior_profundidade": self.maior_profundidade,
+                "enfileirados": self.enfileirados,
+                "processados": self.processados,
+                "lotes": self.lotes,
+                "erros": self.erros,
+                "bloqueios": self.bloqueios,
+                "tempo_bloqueado": round(self.tempo_bloqueado, 3)
+            }
+
+# ===== POOL DE WORKERS POR UID =====
+
+class PoolPorUID:
+    """Pool fixo de workers com uma fila limitada por shard.
+
+    O shard é escolhido pelo UID, então os acessos de um mesmo cartão são
+    processados em ordem, enquanto cartões diferentes rodam em paralelo.
+    Quando a fila do shard está cheia a tarefa é rejeitada e contabilizada.
+    """
+
+    _FIM = object()
+
+    def __init__(self, num_workers=4, tamanho_fila=1000):
+        self._filas = [queue.Queue(maxsize=tamanho_fila) for _ in range(num_workers)]
+        self._threads = []
+        self._lock = threading.Lock()
+
+        self.submetidos = 0
+        self.executados = 0
+        self.rejeitados = 0
+        self.erros = 0
+
+    def iniciar(self):
+        with self._lock:
+            if self._threads:
+                return
+            for fila in self._filas:
+                thread = threading.Thread(target=self._loop, args=(fila,), daemon=True)
+                thread.start()
+                self._threads.append(thread)
+
+    def _shard(self, uid):
+        return self._filas[hash(uid) % len(self._filas)]
+
+    def submeter(self, uid, funcao, *args):
+        """Agenda funcao(*args) no shard do UID; retorna False se a fila estiver cheia."""
+        if not self._threads:
+            self.iniciar()
+        try:
+            self._shard(uid).put_nowait((funcao, args))
+        except queue.Full:
+            with self._lock:
+                self.rejeitados += 1
+            return False
+        with self._lock:
+            self.submetidos += 1
+        return True
+
+    def _loop(self, fila):
+        while True:
+            tarefa = fila.get()
+            if tarefa is self._FIM:
+                return
+            funcao, args = tarefa
+            try:
+                funcao(*args)
+            except Exception as e:
+                print(f"Erro no worker de acessos: {e}")
+                with self._lock:
+                    self.erros += 1
+            with self._lock:
+                self.executados += 1
+
+    def encerrar(self, timeout=10):
+        """Processa as tarefas pendentes e encerra os workers."""
+        for fila in self._filas:
+            fila.put(self._FIM)
+        for thread in self._threads:
+            thread.join(timeout)
+
+    def metricas(self):
+        with self._lock:
+            return {
+                "workers": len(self._filas),
+                "profundidade": sum(fila.qsize() for fila in self._filas),
+                "profundidade_por_worker": [fila.qsize() for fila in self._filas],
+                "submetidos": self.submetidos,
+                "executados": self.executados,
+                "rejeitados": self.rejeitados,
+                "erros": self.erros
+            }
+
+# ===== DEBOUNCE POR (UID, DISPOSITIVO) =====
+
+class TabelaDebounce:
+    """Filtro de leituras duplicadas por (uid, dispositivo_id).
+
+    Entradas mais antigas que a janela são despejadas por tempo (a tabela é
+    mantida em ordem de último uso), e um limite de entradas mantém a
+    memória limitada mesmo sob rajadas de cartões distintos.
+    """
+
+    def __init__(self, janela=3.0, max_entradas=100000):
+        self.janela = janela
+        self.max_entradas = max_entradas
+        self._vistos = OrderedDict()
+        self._lock = threading.Lock()
+        self.suprimidos = 0
+        self.aceitos = 0
+
+    def _despejar(self, agora):
+        """Remove entradas expiradas (chamado com o lock adquirido)."""
+        while self._vistos:
+            chave, instante = next(iter(self._vistos.items()))
+            if agora - instante < self.janela and len(self._vistos) < self.max_entradas:
+                break
+            self._vistos.popitem(last=False)
+
+    def registrar(self, uid, dispositivo_id, agora=None):
+        """Retorna True se a leitura deve ser processada, False se é duplicada."""
+        agora = time.monotonic() if agora is None else agora
+        chave = (uid, dispositivo_id)
+        with self._lock:
+            self._despejar(agora)
+            instante = self._vistos.get(chave)
+            if instante is not None and agora - instante < self.janela:
+                self.suprimidos += 1
+                return False
+            self._vistos[chave] = agora
+            self._vistos.move_to_end(chave)
+            self.aceitos += 1
+            return True
+
+    def metricas(self):
+        with self._lock:
+            return {
+                "janela": self.janela,
+                "entradas": len(self._vistos),
+                "aceitos": self.aceitos,
+                "suprimidos": self.suprimidos
+            }
+
+# ===== IDEMPOTÊNCIA =====
+
+class RegistroIdempotencia:
+    """Chaves de idempotência (id_evento) já processadas.
+
+    Limitado a `max_chaves`, descartando as mais antigas; basta cobrir a
+    janela em que um dispositivo pode reenviar um lote.
+    """
+
+    def __init__(self, max_chaves=200000):
+        self.max_chaves = max_chaves
+        self._chaves = OrderedDict()
+        self._lock = threading.Lock()
+        self.duplicados = 0
+
+    def reservar(self, chave):
+        """Marca a chave como processada; retorna False se ela já tinha sido vista."""
+        with self._lock:
+            if chave in self._chaves:
+                self.duplicados += 1
+                return False
+            self._chaves[chave] = True
+            if len(self._chaves) > self.max_chaves:
+                self._chaves.popitem(last=False)
+            return True
+
+    def liberar(self, chave):
+        """Desfaz a reserva (o processamento falhou e o evento pode ser reenviado)."""
+        with self._lock:
+            self._chaves.pop(chave, None)
+
+    def carregar(self, chaves):
+        """Recarrega chaves persistidas (na inicialização)."""
+        for chave in chaves:
+            self.reservar(chave)
+        with self._lock:
+            self.duplicados = 0
+
+    def metricas(self):
+        with self._lock:
+            return {"chaves": len(self._chaves), "duplicados": self.duplicados}
@@ -0,0 +1,181 @@
+import threading
+from collections.abc import Mapping
+
+from geolocalizacao import endereco_google_maps
+
+# ===== TABELAS DE INTERNAÇÃO =====
+
+class Internador:
+    """Tabelas de valores repetidos (dispositivos, resultados, localizações).
+
+    Cada valor distinto é guardado uma única vez; os registros apenas
+    referenciam a cópia da tabela. Localizações são guardadas como tuplas
+    de pares (chave, valor), imutáveis e compartilhadas.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._textos = {}
+        self._localizacoes = {}
+
+    def texto(self, valor):
+        if valor is None:
+            return None
+        internado = self._textos.get(valor)
+        if internado is None:
+            with self._lock:
+                internado = self._textos.setdefault(valor, valor)
+        return internado
+
+    def localizacao(self, valor):
+        if not valor:
+            return ()
+        return self.tupla_localizacao(tuple(valor.items()))
+
+    def tupla_localizacao(self, chave):
+        """Interna uma localização já em forma de tupla de pares (snapshot binário)."""
+        internada = self._localizacoes.get(chave)
+        if internada is None:
+            with self._lock:
+                internada = self._localizacoes.setdefault(chave, chave)
+        return internada
+
+    def metricas(self):
+        return {"textos": len(self._textos), "localizacoes": len(self._localizacoes)}
+
+INTERNADOR = Internador()
+
+# ===== REGISTRO DE ACESSO =====
+
+CAMPOS_REGISTRO = ("timestamp", "dispositivo", "resultado", "localizacao", "id_evento")
+
+class RegistroAcesso(Mapping):
+    """Acesso em memória: slots com referências para valores internados.
+
+    Se comporta como o dicionário de acesso somente leitura (get, [], dict());
+    a localização vira dicionário e o link do Google Maps é montado apenas
+    quando o acesso é servido.
+    """
+
+    __slots__ = ("timestamp", "dispositivo", "resultado", "_localizacao", "id_evento", "_extras")
+
+    def __init__(self, timestamp, dispositivo, resultado, localizacao=None, id_evento=None,
+                 extras=None, internador=INTERNADOR):
+        self.timestamp = timestamp
+        self.dispositivo = internador.texto(dispositivo)
+        self.resultado = internador.texto(resultado)
+        self._localizacao = internador.localizacao(localizacao)
+        self.id_evento = id_evento
+        self._extras = extras or None
+
+    @classmethod
+    def de_dict(cls, dados, internador=INTERNADOR):
+        """Converte um acesso do diário/snapshot; campos desconhecidos são preservados."""
+        if isinstance(dados, cls):
+            return dados
+        extras = {
+            chave: valor for chave, valor in dados.items()
+            if chave not in CAMPOS_REGISTRO and chave != "google_maps"
+        }
+        return cls(
+            dados.get("timestamp", ""),
+            dados.get("dispositivo"),
+            dados.get("resultado"),
+            dados.get("localizacao"),
+            dados.get("id_evento"),
+            extras,
+            internador
+        )
+
+    @property
+    def localizacao(self):
+        return dict(self._localizacao)
+
+    def coordenadas(self):
+        """(lat, lon) sem montar o dicionário de localização."""
+        lat = lon = None
+        for chave, valor in self._localizacao:
+            if chave == "lat":
+                lat = valor
+            elif chave == "lon":
+                lon = valor
+        return lat, lon
+
+    def para_tupla(self):
+        """Forma compacta do snapshot binário (inversa de de_tupla)."""
+        return (self.timestamp, self.dispositivo, self.resultado, self._localizacao, self.id_evento, self._extras)
+
+    @classmethod
+    def de_tupla(cls, tupla, internador=INTERNADOR):
+        registro = cls.__new__(cls)
+        timestamp, dispositivo, resultado, localizacao, registro.id_evento, registro._extras = tupla
+        registro.timestamp = timestamp
+        registro.dispositivo = internador.texto(dispositivo)
+        registro.resultado = internador.texto(resultado)
+        registro._localizacao = internador.tupla_localizacao(localizacao) if localizacao else ()
+        return registro
+
+    def para_json(self):
+        """Forma persistida: sem campos derivados."""
+        dados = {
+            "timestamp": self.timestamp,
+            "dispositivo": self.dispositivo,
+            "resultado": self.resultado,
+            "localizacao": dict(self._localizacao)
+        }
+        if self.id_evento is not None:
+            dados["id_evento"] = self.id_evento
+        if self._extras:
+            dados.update(self._extras)
+        return dados
+
+    # ----- Interface de dicionário (visão servida) -----
+
+    def __getitem__(self, chave):
+        if chave == "timestamp":
+            return self.timestamp
+        if chave == "dispositivo":
+            return self.dispositivo
+        if chave == "resultado":
+            return self.resultado
+        if chave == "localizacao":
+            return dict(self._localizacao)
+        if chave == "google_maps":
+            return endereco_google_maps(*self.coordenadas())
+        if chave == "id_evento" and self.id_evento is not None:
+            return self.id_evento
+        if self._extras and chave in self._extras:
+            return self._extras[chave]
+        raise KeyError(chave)
+
+    def get(self, chave, padrao=None):
+        # Campos em slots direto (caminho quente de índices e estatísticas)
+        if chave == "timestamp":
+            return self.timestamp
+        if chave == "dispositivo":
+            return self.dispositivo
+        if chave == "resultado":
+            return self.resultado
+        try:
+            return self[chave]
+        except KeyError:
+            return padrao
+
+    def __iter__(self):
+        yield from ("timestamp", "dispositivo", "resultado", "localizacao", "google_maps")
+        if self.id_evento is not None:
+            yield "id_evento"
+        if self._extras:
+            yield from self._extras
+
+    def __len__(self):
+        return 5 + (self.id_evento is not None) + len(self._extras or ())
+
+    def __repr__(self):
+        return f"RegistroAcesso({self.para_json()!r})"
+
+def serializar_registro(objeto):
+    """`default` do json.dumps para registros de acesso."""
+    if isinstance(objeto, RegistroAcesso):
+        return objeto.para_json()
+    raise TypeError(f"Objeto não serializável: {type(objeto).__name__}")
@@ -0,0 +1,674 @@
+import threading
+from itertools import chain
+from bisect import bisect_left, bisect_right, insort
+from collections import deque
+
+from armazenamento import aplicar_acesso
+from suspeita import JanelaDispositivos
+
+# ===== RESUMO DE CARTÃO =====
+
+def resumo_cartao(info):
+    """Resumo de um cartão no formato usado pela interface."""
+    acessos = info.get("acessos", [])
+    return {
+        "primeiro_acesso": info.get("primeiro_acesso", info.get("ultimo_acesso", "N/A")),
+        "ultimo_acesso": info.get("ultimo_acesso", "N/A"),
+        "vezes_usado": info.get("vezes_usado", 0),
+        "dispositivos_utilizados": list(info.get("dispositivos_utilizados", [])),
+        "ultimo_resultado": acessos[-1].get("resultado", "N/A") if acessos else "N/A"
+    }
+
+# ===== CURSORES =====
+
+def codificar_cursor(chave):
+    """Cursor opaco a partir da chave de ordenação do último item da página."""
+    return "|".join(str(parte) for parte in chave)
+
+def decodificar_cursor(cursor):
+    """Chave de ordenação a partir do cursor (ValueError se inválido)."""
+    partes = cursor.split("|")
+    if len(partes) not in (2, 3):
+        raise ValueError("cursor inválido")
+    return (partes[0], int(partes[1]), *partes[2:])
+
+# ===== ÍNDICES SECUNDÁRIOS =====
+
+class IndiceConsultas:
+    """Índices secundários para consultas paginadas de cartões e acessos.
+
+    Cada acesso recebe um id sequencial. Os índices (geral, por cartão,
+    por dispositivo e por resultado) são listas de ids ordenadas por
+    (timestamp, id); os cartões ficam numa lista ordenada por UID, geral e
+    por dispositivo. Uma página custa O(log n + tamanho da página) quando o
+    filtro principal tem índice próprio, sem varrer o log. Acessos
+    arquivados saem dos índices; os cartões continuam listados.
+
+    A remoção é imediata só no índice do cartão (pequeno); nos índices
+    geral, por dispositivo e por resultado o id vira lápide (sai de
+    `_acessos`, mas mantém o timestamp para as buscas binárias) e as listas
+    são compactadas quando as lápides passam das entradas vivas. Arquivar
+    custa O(1) amortizado em vez de O(acessos em memória) por acesso.
+    """
+
+    def __init__(self):
+        self._proximo_id = 0
+        self._acessos = {}  # id -> (uid, dados_acesso), só acessos vivos
+        self._ts = {}  # id -> timestamp ISO (inclui lápides até a compactação)
+        self._lapides = 0
+        self._todos = []
+        self._por_uid = {}
+        self._por_dispositivo = {}
+        self._por_resultado = {}
+        self._uids = []
+        self._uids_por_dispositivo = {}
+
+    def _chave(self, id_acesso):
+        return (self._ts[id_acesso], id_acesso)
+
+    def _remover(self, lista, id_acesso):
+        posicao = bisect_left(lista, self._chave(id_acesso), key=self._chave)
+        if posicao < len(lista) and lista[posicao] == id_acesso:
+            del lista[posicao]
+
+    def _inserir(self, lista, id_acesso):
+        # Caso comum: acesso mais recente que todos os do índice
+        if not lista or self._chave(lista[-1]) < self._chave(id_acesso):
+            lista.append(id_acesso)
+        else:
+            insort(lista, id_acesso, key=self._chave)
+
+    @staticmethod
+    def _inserir_uid(lista, uid):
+        posicao = bisect_left(lista, uid)
+        if posicao == len(lista) or lista[posicao] != uid:
+            lista.insert(posicao, uid)
+
+    def adicionar(self, uid, dados_acesso):
+        """Indexa um novo acesso."""
+        id_acesso = self._proximo_id
+        self._proximo_id += 1
+        self._acessos[id_acesso] = (uid, dados_acesso)
+        self._ts[id_acesso] = dados_acesso.get("timestamp", "")
+
+        if uid not in self._por_uid:
+            self._por_uid[uid] = []
+            self._inserir_uid(self._uids, uid)
+
+        dispositivo = dados_acesso.get("dispositivo")
+        self._inserir(self._todos, id_acesso)
+        self._inserir(self._por_uid[uid], id_acesso)
+        self._inserir(self._por_dispositivo.setdefault(dispositivo, []), id_acesso)
+        self._inserir(self._por_resultado.setdefault(dados_acesso.get("resultado"), []), id_acesso)
+        self._inserir_uid(self._uids_por_dispositivo.setdefault(dispositivo, []), uid)
+        return id_acesso
+
+    def remover(self, uid, acessos):
+        """Retira dos índices os acessos (os próprios objetos) de um cartão."""
+        alvos = {id(dados_acesso) for dados_acesso in acessos}
+        for id_acesso in [i for i in self._por_uid.get(uid, []) if id(self._acessos[i][1]) in alvos]:
+            self._remover(self._por_uid[uid], id_acesso)
+            del self._acessos[id_acesso]
+            self._lapides += 1
+        if self._lapides > len(self._acessos):
+            self._compactar()
+
+    def _compactar(self):
+        """Tira as lápides dos índices compartilhados (custo O(n), a cada n remoções)."""
+        vivos = self._acessos
+        self._todos = [i for i in self._todos if i in vivos]
+        for indices in (self._por_dispositivo, self._por_resultado):
+            for chave, lista in indices.items():
+                indices[chave] = [i for i in lista if i in vivos]
+        self._ts = {i: self._ts[i] for i in vivos}
+        self._lapides = 0
+
+    def construir(self, cartoes):
+        """Reconstrói os índices a partir do estado por cartão (em ordem cronológica).
+
+        Uma única ordenação: os ids seguem a ordem (timestamp, id), então
+        cada índice é preenchido só com anexos, sem busca binária.
+        """
+        self.__init__()
+        todos = [
+            (acesso.get("timestamp", ""), uid, acesso)
+            for uid, info in cartoes.items()
+            for acesso in info.get("acessos", [])
+        ]
+        todos.sort(key=lambda item: item[0])
+
+        uids_por_dispositivo = {}
+        for id_acesso, (timestamp, uid, acesso) in enumerate(todos):
+            dispositivo = acesso.get("dispositivo")
+            self._acessos[id_acesso] = (uid, acesso)
+            self._ts[id_acesso] = timestamp
+            self._todos.append(id_acesso)
+            self._por_uid.setdefault(uid, []).append(id_acesso)
+            self._por_dispositivo.setdefault(dispositivo, []).append(id_acesso)
+            self._por_resultado.setdefault(acesso.get("resultado"), []).append(id_acesso)
+            uids_por_dispositivo.setdefault(dispositivo, set()).add(uid)
+        self._proximo_id = len(todos)
+
+        for uid, info in cartoes.items():
+            # Cartões sem acessos em memória (log legado incompleto)
+            self._por_uid.setdefault(uid, [])
+            # Dispositivos de acessos já arquivados
+            for dispositivo in info.get("dispositivos_utilizados", []):
+                uids_por_dispositivo.setdefault(dispositivo, set()).add(uid)
+        self._uids = sorted(self._por_uid)
+        self._uids_por_dispositivo = {
+            dispositivo: sorted(uids) for dispositivo, uids in uids_por_dispositivo.items()
+        }
+
+    def consultar_acessos(self, limite, antes=None, uid=None, prefixo=None,
+                          dispositivo=None, resultado=None, desde=None, ate=None):
+        """Até `limite` acessos anteriores à chave `antes`, do mais recente ao mais antigo.
+
+        Retorna [(chave, uid, dados_acesso)].
+        """
+        # Índice principal: o filtro mais seletivo que tenha índice próprio
+        if uid is not None:
+            base = self._por_uid.get(uid, [])
+        elif dispositivo is not None:
+            base = self._por_dispositivo.get(dispositivo, [])
+        elif resultado is not None:
+            base = self._por_resultado.get(resultado, [])
+        else:
+            base = self._todos
+
+        fim = len(base)
+        if antes is not None:
+            fim = bisect_left(base, antes, key=self._chave)
+        if ate is not None:
+            fim = min(fim, bisect_right(base, (ate, float("inf")), key=self._chave))
+        inicio = bisect_left(base, (desde, -1), key=self._chave) if desde is not None else 0
+
+        itens = []
+        for posicao in range(fim - 1, inicio - 1, -1):
+            id_acesso = base[posicao]
+            entrada = self._acessos.get(id_acesso)
+            if entrada is None:
+                continue  # Lápide (acesso arquivado)
+            uid_acesso, dados_acesso = entrada
+            if prefixo is not None and not uid_acesso.startswith(prefixo):
+                continue
+            if dispositivo is not None and dados_acesso.get("dispositivo") != dispositivo:
+                continue
+            if resultado is not None and dados_acesso.get("resultado") != resultado:
+                continue
+            itens.append((self._chave(id_acesso), uid_acesso, dados_acesso))
+            if len(itens) == limite:
+                break
+        return itens
+
+    def consultar_uids(self, limite, aceitar, cursor=None, prefixo=None, dispositivo=None):
+        """Página de UIDs em ordem crescente; `aceitar(uid)` aplica os filtros sem índice."""
+        base = self._uids_por_dispositivo.get(dispositivo, []) if dispositivo is not None else self._uids
+
+        inicio = bisect_right(base, cursor) if cursor is not None else 0
+        fim = len(base)
+        if prefixo:
+            inicio = max(inicio, bisect_left(base, prefixo))
+            fim = bisect_left(base, prefixo[:-1] + chr(ord(prefixo[-1]) + 1))
+
+        uids = []
+        for posicao in range(inicio, fim):
+            uid = base[posicao]
+            if not aceitar(uid):
+                continue
+            uids.append(uid)
+            if len(uids) == limite:
+                return uids, (uid if posicao < fim - 1 else None)
+        return uids, None
+
+# ===== ESTATÍSTICAS POR DISPOSITIVO =====
+
+# Granularidade -> tamanho do prefixo do timestamp ISO que identifica o bucket
+PREFIXOS_GRANULARIDADE = {"minuto": 16, "hora": 13, "dia": 10}
+COMPLEMENTOS_GRANULARIDADE = {"minuto": ":00", "hora": ":00:00", "dia": "T00:00:00"}
+
+class EstatisticasDispositivos:
+    """Contadores por dispositivo mantidos a cada acesso registrado.
+
+    Total, suspeitos e último acesso são atualizados em O(1), então o
+    status dos dispositivos não depende do tamanho do histórico. Opcionalmente
+    mantém contagens por intervalo (minuto/hora/dia), limitadas a
+    `retencao[granularidade]` buckets por dispositivo, para séries de vazão.
+    """
+
+    def __init__(self, retencao=None):
+        self.retencao = dict(retencao or {})
+        for granularidade in self.retencao:
+            if granularidade not in PREFIXOS_GRANULARIDADE:
+                raise ValueError(f"granularidade desconhecida: {granularidade}")
+        self._dispositivos = {}
+        self._buckets = {}  # (dispositivo, granularidade) -> ([chaves ordenadas], {chave: [acessos, suspeitos]})
+
+    def adicionar(self, dados_acesso):
+        dispositivo = dados_acesso.get("dispositivo")
+        timestamp = dados_acesso.get("timestamp")
+        suspeito = dados_acesso.get("resultado") == "Suspeito"
+
+        contadores = self._dispositivos.get(dispositivo)
+        if contadores is None:
+            contadores = self._dispositivos[dispositivo] = {
+                "total_acessos": 0,
+                "ultimo_acesso": None,
+                "acessos_suspeitos": 0
+            }
+        contadores["total_acessos"] += 1
+        if suspeito:
+            contadores["acessos_suspeitos"] += 1
+        if timestamp and (not contadores["ultimo_acesso"] or timestamp > contadores["ultimo_acesso"]):
+            contadores["ultimo_acesso"] = timestamp
+
+        if timestamp:
+            for granularidade, limite in self.retencao.items():
+                self._contar_bucket(dispositivo, granularidade, limite, timestamp, suspeito)
+
+    def _contar_bucket(self, dispositivo, granularidade, limite, timestamp, suspeito):
+        chave = timestamp[:PREFIXOS_GRANULARIDADE[granularidade]]
+        chaves, contagens = self._buckets.setdefault((dispositivo, granularidade), ([], {}))
+
+        contagem = contagens.get(chave)
+        if contagem is None:
+            if len(chaves) >= limite and chave < chaves[0]:
+                return  # Mais antigo que a retenção
+            contagem = contagens[chave] = [0, 0]
+            # Caso comum: bucket mais recente que todos os anteriores
+            if not chaves or chaves[-1] < chave:
+                chaves.append(chave)
+            else:
+                insort(chaves, chave)
+            while len(chaves) > limite:
+                del contagens[chaves.pop(0)]
+
+        contagem[0] += 1
+        if suspeito:
+            contagem[1] += 1
+
+    def construir(self, acessos):
+        """Recalcula tudo a partir de uma sequência de dados de acesso."""
+        self._dispositivos = {}
+        self._buckets = {}
+        for dados_acesso in acessos:
+            self.adicionar(dados_acesso)
+
+    def prefixos(self):
+        """Tamanho do prefixo do timestamp que forma o bucket de cada granularidade mantida."""
+        return {granularidade: PREFIXOS_GRANULARIDADE[granularidade] for granularidade in self.retencao}
+
+    def estado(self):
+        """Estado para o snapshot binário (restaurado com restaurar())."""
+        return {"retencao": self.retencao, "dispositivos": self._dispositivos, "buckets": self._buckets}
+
+    def restaurar(self, estado):
+        """Adota o estado de um snapshot; False se a retenção configurada mudou."""
+        if estado.get("retencao") != self.retencao:
+            return False
+        self._dispositivos = estado["dispositivos"]
+        self._buckets = estado["buckets"]
+        return True
+
+    def status(self):
+        return {dispositivo: dict(contadores) for dispositivo, contadores in self._dispositivos.items()}
+
+    def vazao(self, granularidade, dispositivo=None, desde=None, ate=None):
+        """Séries de acessos por intervalo, em ordem cronológica, por dispositivo."""
+        if granularidade not in self.retencao:
+            raise ValueError(f"granularidade indisponível: {granularidade}")
+        prefixo = PREFIXOS_GRANULARIDADE[granularidade]
+        complemento = COMPLEMENTOS_GRANULARIDADE[granularidade]
+        desde = desde[:prefixo] if desde else None
+        ate = ate[:prefixo] if ate else None
+
+        series = {}
+        for (disp, gran), (chaves, contagens) in self._buckets.items():
+            if gran != granularidade or (dispositivo is not None and disp != dispositivo):
+                continue
+            inicio = bisect_left(chaves, desde) if desde else 0
+            fim = bisect_right(chaves, ate) if ate else len(chaves)
+            series[disp] = [
+                {"inicio": chave + complemento, "acessos": contagens[chave][0], "suspeitos": contagens[chave][1]}
+                for chave in chaves[inicio:fim]
+            ]
+        return series
+
+# ===== ÍNDICE DE CARTÕES EM MEMÓRIA =====
+
+class RepositorioCartoes:
+    """Índice de cartões residente no processo.
+
+    Carregado uma única vez na inicialização e atualizado a cada acesso.
+    É a única fonte de leitura do sistema; a persistência passa por ele
+    (diário append-only, em lotes), então a latência de leitura não
+    depende do tamanho do log. Se o diário tiver um limite de acessos por
+    cartão, os excedentes vão para o arquivo a cada lote persistido e as
+    consultas de histórico combinam memória e arquivo.
+
+    `pronto` é sinalizado ao fim da carga (mesmo com erro): os leitores
+    podem começar antes, e quem decide um acesso espera em aguardar_carga().
+
+    `colunas` (analitico.ColunasAcessos, opcional) recebe cada lote
+    persistido, fora do lock; o histórico anterior entra com
+    construir_colunas().
+    """
+
+    def __init__(self, diario, retencao_vazao=None, tamanho_janela_dispositivos=5, colunas=None):
+        self.diario = diario
+        self.retencao_vazao = retencao_vazao
+        self.lock = threading.RLock()
+        self._cartoes = {}
+        self.indice = IndiceConsultas()
+        self.estatisticas = EstatisticasDispositivos(retencao_vazao)
+        self.janela_dispositivos = JanelaDispositivos(tamanho_janela_dispositivos)
+        self.colunas = colunas
+        self.pronto = threading.Event()
+
+    def carregar(self):
+        """Carrega o estado persistido para a memória.
+
+        As estatísticas vêm do snapshot do diário (ou das tabelas do banco
+        SQLite) quando disponíveis; senão são recalculadas percorrendo o
+        arquivo e gravadas num novo snapshot, para que a próxima carga não
+        precise percorrê-lo.
+        """
+        try:
+            cartoes = self.diario.carregar()
+            indice = IndiceConsultas()
+            indice.construir(cartoes)
+            estatisticas = getattr(self.diario, "agregados_carregados", None)
+            if estatisticas is not None:
+                self.diario.agregados_carregados = None  # Mantidas daqui em diante pelo repositório
+            else:
+                estatisticas = EstatisticasDispositivos(self.retencao_vazao)
+                arquivo = self.diario.arquivo
+                estatisticas.construir(chain(
+                    (acesso for _, acesso in arquivo.iterar()) if arquivo is not None else (),
+                    (acesso for info in cartoes.values() for acesso in info.get("acessos", []))
+                ))
+                salvar_snapshot = getattr(self.diario, "salvar_snapshot", None)
+                if salvar_snapshot is not None and salvar_snapshot(cartoes, estatisticas):
+                    print("Snapshot binário gravado com as estatísticas recalculadas")
+            janela = JanelaDispositivos(self.janela_dispositivos.tamanho)
+            janela.construir(cartoes)
+            with self.lock:
+                self._cartoes = cartoes
+                self.indice = indice
+                self.estatisticas = estatisticas
+                self.janela_dispositivos = janela
+            return len(cartoes)
+        finally:
+            self.pronto.set()
+
+    def aguardar_carga(self, timeout=None):
+        """Bloqueia até o fim da carga; retorna False se o timeout expirar antes."""
+        return self.pronto.wait(timeout)
+
+    def aplicar(self, uid, dados_acesso):
+        """Aplica o acesso em memória (sem I/O); retorna as informações do cartão."""
+        with self.lock:
+            info = aplicar_acesso(self._cartoes, uid, dados_acesso)
+            self.indice.adicionar(uid, dados_acesso)
+            self.estatisticas.adicionar(dados_acesso)
+            self.janela_dispositivos.registrar(uid, dados_acesso)
+            return info
+
+    def construir_colunas(self):
+        """Preenche as colunas analíticas com o histórico completo (memória + arquivo).
+
+        Feita depois da carga, em segundo plano: a varredura do arquivo não
+        segura o lock, e os acessos persistidos enquanto isso entram no fim.
+        Retorna o número de linhas.
+        """
+        with self.lock:
+            em_memoria = [
+                (uid, acesso)
+                for uid, info in self._cartoes.items()
+                for acesso in info.get("acessos", [])
+            ]
+            self.colunas.iniciar_construcao()
+        arquivo = self.diario.arquivo
+        return self.colunas.construir(em_memoria, arquivo.iterar() if arquivo is not None else ())
+
+    def persistir(self, acessos):
+        """Anexa um lote de acessos [(uid, dados_acesso)] ao diário e arquiva os excedentes."""
+        if self.colunas is not None:
+            self.colunas.adicionar(acessos)  # Já estão em memória, mesmo se o diário falhar
+        try:
+            self.diario.anexar_lote(acessos)
+        except Exception as e:
+            print(f"Erro ao salvar log: {e}")
+            return False
+        self._arquivar_excedentes({uid for uid, _ in acessos})
+        return True
+
+    def _arquivar_excedentes(self, uids):
+        """Move para o arquivo os acessos além do limite por cartão.
+
+        Só é chamado depois que o lote foi gravado no diário, então uma
+        reprodução do diário chega aos mesmos excedentes. Os acessos são
+        gravados no arquivo antes de sair da memória; se a gravação falhar,
+        continuam em memória e são tentados de novo no próximo lote.
+        """
+        maximo = self.diario.max_acessos_por_cartao
+        arquivo = self.diario.arquivo
+        if maximo is None or arquivo is None:
+            return
+        with self.lock:
+            excedentes = {}
+            for uid in uids:
+                acessos = self._cartoes[uid].get("acessos", [])
+                if len(acessos) > maximo:
+                    excedentes[uid] = acessos[:-maximo]
+        if not excedentes:
+            return
+
+        try:
+            arquivo.arquivar([(uid, acesso) for uid, acessos in excedentes.items() for acesso in acessos])
+        except Exception as e:
+            print(f"Erro ao arquivar acessos antigos: {e}")
+            return
+
+        with self.lock:
+            for uid, acessos in excedentes.items():
+                # Só há anexos no fim da lista desde a cópia acima
+                del self._cartoes[uid]["acessos"][:len(acessos)]
+                self.indice.remover(uid, acessos)
+
+    def dispositivos_recentes(self, uid):
+        """Últimos (dispositivo, instante, lat, lon) do cartão, sem percorrer o histórico."""
+        with self.lock:
+            return tuple(self.janela_dispositivos.recentes(uid))
+
+    def consultar_acessos(self, limite, cursor=None, **filtros):
+        """Página de acessos (mais recentes primeiro), em memória e no arquivo.
+
+        Retorna (acessos, proximo_cursor); ValueError se o cursor for inválido.
+        """
+        antes = decodificar_cursor(cursor) if cursor else None
+        with self.lock:
+            itens = self.indice.consultar_acessos(limite + 1, antes, **filtros)
+        if self.diario.arquivo is not None and not self._pagina_so_em_memoria(itens, limite):
+            itens.extend(self.diario.arquivo.consultar(limite + 1, antes, **filtros))
+            itens.sort(key=lambda item: item[0], reverse=True)
+
+        pagina = itens[:limite]
+        proximo = codificar_cursor(pagina[-1][0]) if len(itens) > limite else None
+        return [dict(dados_acesso, uid=uid) for _, uid, dados_acesso in pagina], proximo
+
+    def _pagina_so_em_memoria(self, itens, limite):
+        """True se a página (e o próximo cursor) já saem da memória: tudo no arquivo é mais antigo."""
+        maior_chave = getattr(self.diario.arquivo, "maior_chave", None)
+        if maior_chave is None or len(itens) <= limite:
+            return False
+        arquivada = maior_chave()
+        return arquivada is None or arquivada < itens[-1][0]
+
+    def consultar_cartoes(self, limite, cursor=None, prefixo=None, dispositivo=None,
+                          resultado=None, desde=None, ate=None):
+        """Página de cartões em ordem de UID; resultado e período filtram pelo último acesso."""
+        with self.lock:
+            def aceitar(uid):
+                info = self._cartoes[uid]
+                if resultado is not None:
+                    acessos = info.get("acessos", [])
+                    if not acessos or acessos[-1].get("resultado") != resultado:
+                        return False
+                ultimo = info.get("ultimo_acesso", "")
+                if desde is not None and ultimo < desde:
+                    return False
+                if ate is not None and ultimo > ate:
+                    return False
+                return True
+
+            uids, proximo = self.indice.consultar_uids(limite, aceitar, cursor, prefixo, dispositivo)
+            cartoes = [dict(resumo_cartao(self._cartoes[uid]), uid=uid) for uid in uids]
+        return cartoes, proximo
+
+    def status_dispositivos(self):
+        """Contadores por dispositivo (total, suspeitos, último acesso)."""
+        with self.lock:
+            return self.estatisticas.status()
+
+    def vazao_dispositivos(self, granularidade, dispositivo=None, desde=None, ate=None):
+        """Acessos por intervalo de tempo, por dispositivo."""
+        with self.lock:
+            return self.estatisticas.vazao(granularidade, dispositivo, desde, ate)
+
+    def itens(self):
+        """Retorna uma cópia rasa de (uid, info) para iteração fora do lock."""
+        with self.lock:
+            return list(self._cartoes.items())
+
+    def __len__(self):
+        with self.lock:
+            return len(self._cartoes)
+
+# ===== AGREGADOS DO PAINEL =====
+
+class PainelAgregado:
+    """Estatísticas, resumos por cartão e feed de últimos acessos do painel.
+
+    Mantidos de forma incremental: cada acesso custa O(1) em contadores e
+    um deque limitado para o feed, independente do número de cartões.
+    Atualiza o dicionário recebido (dados_em_memoria) no lugar; a chave
+    "seq" é a versão do estado, incrementada a cada lote aplicado ou
+    reconstrução, para que os clientes detectem deltas perdidos.
+    """
+
+    def __init__(self, dados, tamanho_feed=10):
+        self.dados = dados
+        self.lock = threading.Lock()
+        self._feed = deque(maxlen=tamanho_feed)
+        self.dados.setdefault("seq", 0)
+
+    @staticmethod
+    def _item_feed(uid, acesso, vezes_usado):
+        return {
+            "uid": uid,
+            "timestamp": acesso.get("timestamp", "N/A"),
+            "resultado": acesso.get("resultado", "N/A"),
+            "dispositivo": acesso.get("dispositivo", "N/A"),
+            "localizacao": acesso.get("localizacao", {}),
+            "google_maps": acesso.get("google_maps", "#"),
+            "vezes_usado": vezes_usado
+        }
+
+    def reconstruir(self, itens):
+        """Recalcula tudo a partir do índice (inicialização ou /api/atualizar)."""
+        cartoes = {}
+        ultimos_acessos = []
+        for uid, info in itens:
+            resumo = resumo_cartao(info)
+            cartoes[uid] = resumo
+            for acesso in info.get("acessos", [])[-self._feed.maxlen:]:
+                ultimos_acessos.append(self._item_feed(uid, acesso, resumo["vezes_usado"]))
+
+        # Ordenar por data mais recente
+        ultimos_acessos.sort(key=lambda x: x["timestamp"], reverse=True)
+
+        stats = {
+            "total_cartoes": len(cartoes),
+            "total_acessos": sum(info["vezes_usado"] for info in cartoes.values()),
+            "total_suspeitos": sum(1 for info in cartoes.values() if len(info["dispositivos_utilizados"]) > 1),
+            "total_repetidos": sum(1 for info in cartoes.values() if info["vezes_usado"] > 1)
+        }
+
+        with self.lock:
+            self._feed.clear()
+            self._feed.extend(ultimos_acessos[:self._feed.maxlen])
+            self.dados["cards"] = cartoes
+            self.dados["last_accesses"] = list(self._feed)
+            self.dados["stats"] = stats
+            self.dados["seq"] += 1
+
+    def _aplicar(self, uid, info, dados_acesso):
+        """Atualiza resumo, contadores e feed com um acesso (chamado com o lock adquirido)."""
+        cartoes = self.dados["cards"]
+        stats = self.dados["stats"]
+        anterior = cartoes.get(uid)
+        resumo = resumo_cartao(info)
+        resumo["ultimo_resultado"] = dados_acesso.get("resultado", "N/A")
+
+        if anterior is None:
+            vezes_antes, dispositivos_antes = 0, 0
+            stats["total_cartoes"] += 1
+        else:
+            vezes_antes = anterior["vezes_usado"]
+            dispositivos_antes = len(anterior["dispositivos_utilizados"])
+
+        stats["total_acessos"] += resumo["vezes_usado"] - vezes_antes
+        if vezes_antes <= 1 < resumo["vezes_usado"]:
+            stats["total_repetidos"] += 1
+        if dispositivos_antes <= 1 < len(resumo["dispositivos_utilizados"]):
+            stats["total_suspeitos"] += 1
+
+        cartoes[uid] = resumo
+        item = self._item_feed(uid, dados_acesso, resumo["vezes_usado"])
+        return resumo, item if self._inserir_feed(item) else None
+
+    def _inserir_feed(self, item):
+        """Insere o item no feed pela data (um reenvio pode ser antigo); False se ficou de fora."""
+        feed = self._feed
+        instante = item["timestamp"]
+        if not feed or instante >= feed[0]["timestamp"]:
+            feed.appendleft(item)
+            return True
+        if len(feed) == feed.maxlen:
+            if instante < feed[-1]["timestamp"]:
+                return False  # Mais antigo que todo o feed: só no histórico do cartão
+            feed.pop()
+        posicao = next((i for i, atual in enumerate(feed) if instante >= atual["timestamp"]), len(feed))
+        feed.insert(posicao, item)
+        return True
+
+    def aplicar_lote(self, itens):
+        """Aplica um lote de acessos [(uid, info, dados_acesso)] e retorna o delta versionado.
+
+        O delta leva a versão anterior ("de") e a nova ("ate"), os acessos
+        que entraram no feed (mais recente primeiro, limitados ao tamanho do
+        feed; o cliente os intercala pela data), o resumo final de cada
+        cartão alterado e as estatísticas atuais.
+        """
+        with self.lock:
+            de = self.dados["seq"]
+            cartoes = {}
+            acessos = []
+            for uid, info, dados_acesso in itens:
+                resumo, item = self._aplicar(uid, info, dados_acesso)
+                cartoes[uid] = resumo
+                if item is not None:
+                    acessos.append(item)
+            acessos.sort(key=lambda x: x["timestamp"], reverse=True)
+            del acessos[self._feed.maxlen:]
+
+            self.dados["last_accesses"] = list(self._feed)
+            self.dados["seq"] = de + 1
+            return {
+                "de": de,
+                "ate": de + 1,
+                "acessos": list(acessos),
+                "cartoes": cartoes,
+                "stats": dict(self.dados["stats"])
+            }
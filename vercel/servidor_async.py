@@ -0,0 +1,178 @@
+"""Servidor assíncrono: leitura serial, ingestão remota, geolocalização e
+broadcasts do painel num único laço asyncio.
+
+Uso:
+    pip install uvicorn[standard]
+    python servidor_async.py
+
+Cada conexão (painel ou dispositivo remoto) custa uma corrotina em vez de
+uma thread. O que continua bloqueante fica fora do laço: a decisão dos
+taps seriais no pool de workers por UID, a ingestão remota e as demais
+rotas Flask no executor, a persistência com a fila de escrita (thread
+própria) e a consulta ao provedor de localização. Decidir um acesso toma
+o lock do repositório, que reconstruções do painel seguram por O(N).
+"""
+import asyncio
+import io
+import json
+import sys
+from concurrent.futures import ThreadPoolExecutor
+
+import socketio
+
+import app as aplicacao
+
+# ===== CONFIGURAÇÕES =====
+HOST = '0.0.0.0'
+PORTA_HTTP = 5000
+TAMANHO_EXECUTOR = 16  # Threads para as rotas Flask e chamadas bloqueantes
+
+# Rotas de ingestão dos dispositivos remotos: JSON tratado no executor, sem o Flask
+ROTAS_INGESTAO = {
+    ('POST', '/api/dispositivo/registrar_acesso'): aplicacao.tratar_acesso_remoto,
+    ('POST', '/api/dispositivo/registrar_acessos_lote'): aplicacao.tratar_lote_remoto
+}
+
+if aplicacao.MESSAGE_QUEUE_SOCKETIO:
+    sio = socketio.AsyncServer(
+        async_mode='asgi',
+        cors_allowed_origins='*',
+        client_manager=socketio.AsyncRedisManager(aplicacao.MESSAGE_QUEUE_SOCKETIO)
+    )
+else:
+    sio = socketio.AsyncServer(async_mode='asgi', cors_allowed_origins='*')
+
+# ===== WEB SOCKETS =====
+
+@sio.event
+async def connect(sid, ambiente):
+    await sio.emit('conexao_estabelecida', {'message': 'Conectado ao servidor'}, to=sid)
+
+@sio.event
+async def solicitar_dados(sid, dados=None):
+    await sio.emit('dados_atualizados', {'message': 'Dados enviados'}, to=sid)
+
+def emitir_no_laco(laco):
+    """Emissor para app.emitir: agenda o broadcast no laço a partir de qualquer thread."""
+    def emitir(evento, dados):
+        asyncio.run_coroutine_threadsafe(sio.emit(evento, dados), laco)
+    return emitir
+
+# ===== HTTP =====
+
+async def ler_corpo(receive):
+    partes = []
+    while True:
+        mensagem = await receive()
+        partes.append(mensagem.get('body', b''))
+        if not mensagem.get('more_body'):
+            return b''.join(partes)
+
+async def responder(send, codigo, corpo, cabecalhos):
+    await send({'type': 'http.response.start', 'status': codigo, 'headers': cabecalhos})
+    await send({'type': 'http.response.body', 'body': corpo})
+
+def ambiente_wsgi(scope, corpo):
+    """Ambiente WSGI equivalente à requisição ASGI."""
+    servidor = scope.get('server') or ('localhost', PORTA_HTTP)
+    ambiente = {
+        'REQUEST_METHOD': scope['method'],
+        'SCRIPT_NAME': scope.get('root_path', ''),
+        'PATH_INFO': scope['path'].encode('utf-8').decode('latin-1'),
+        'QUERY_STRING': scope.get('query_string', b'').decode('latin-1'),
+        'SERVER_NAME': servidor[0],
+        'SERVER_PORT': str(servidor[1]),
+        'SERVER_PROTOCOL': f"HTTP/{scope.get('http_version', '1.1')}",
+        'REMOTE_ADDR': (scope.get('client') or ('', 0))[0],
+        'CONTENT_LENGTH': str(len(corpo)),
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': scope.get('scheme', 'http'),
+        'wsgi.input': io.BytesIO(corpo),
+        'wsgi.errors': sys.stderr,
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': False,
+        'wsgi.run_once': False
+    }
+    for nome, valor in scope.get('headers', []):
+        nome = nome.decode('latin-1').lower()
+        valor = valor.decode('latin-1')
+        if nome == 'content-type':
+            ambiente['CONTENT_TYPE'] = valor
+        elif nome != 'content-length':
+            chave = 'HTTP_' + nome.upper().replace('-', '_')
+            ambiente[chave] = f"{ambiente[chave]},{valor}" if chave in ambiente else valor
+    return ambiente
+
+def executar_wsgi(ambiente):
+    """Executa a aplicação Flask (no executor); retorna (código, cabeçalhos, corpo)."""
+    resposta = {}
+
+    def start_response(status, cabecalhos, exc_info=None):
+        resposta['codigo'] = int(status.split(' ', 1)[0])
+        resposta['cabecalhos'] = cabecalhos
+
+    iteravel = aplicacao.app(ambiente, start_response)
+    try:
+        corpo = b''.join(iteravel)
+    finally:
+        if hasattr(iteravel, 'close'):
+            iteravel.close()
+    cabecalhos = [(nome.lower().encode('latin-1'), valor.encode('latin-1')) for nome, valor in resposta['cabecalhos']]
+    return resposta['codigo'], cabecalhos, corpo
+
+async def aplicacao_http(scope, receive, send):
+    """Ingestão remota direto nos tratadores; as demais rotas vão para o Flask. Ambas no executor."""
+    if scope['type'] != 'http':
+        return
+    corpo = await ler_corpo(receive)
+    laco = asyncio.get_running_loop()
+
+    tratar = ROTAS_INGESTAO.get((scope['method'], scope['path']))
+    if tratar is not None:
+        try:
+            resposta, codigo = await laco.run_in_executor(None, tratar, json.loads(corpo) if corpo else None)
+        except Exception as e:
+            resposta, codigo = {"status": "error", "message": str(e)}, 500
+        await responder(send, codigo, json.dumps(resposta).encode('utf-8'), [(b'content-type', b'application/json')])
+        return
+
+    codigo, cabecalhos, corpo = await laco.run_in_executor(None, executar_wsgi, ambiente_wsgi(scope, corpo))
+    await responder(send, codigo, corpo, cabecalhos)
+
+aplicacao_asgi = socketio.ASGIApp(sio, other_asgi_app=aplicacao_http)
+
+# ===== INICIALIZAÇÃO =====
+
+async def executar(uvicorn):
+    laco = asyncio.get_running_loop()
+    laco.set_default_executor(ThreadPoolExecutor(max_workers=TAMANHO_EXECUTOR))
+
+    aplicacao.emitir = emitir_no_laco(laco)
+
+    # Carga do armazenamento é bloqueante: executor
+    await laco.run_in_executor(None, aplicacao.iniciar_sistema, False)
+    aplicacao.cache_localizacao.iniciar_async()
+    aplicacao.leitores.iniciar_async()
+
+    print(f"🚀 Servidor Central (asyncio) iniciado em http://localhost:{PORTA_HTTP}")
+    print(f"🆔 ID do Sistema: {aplicacao.SISTEMA_ID}")
+    print(f"🔌 Leitores locais: {', '.join(l['porta'] + ' → ' + l['dispositivo_id'] for l in aplicacao.LEITORES_LOCAIS)}")
+
+    servidor = uvicorn.Server(uvicorn.Config(aplicacao_asgi, host=HOST, port=PORTA_HTTP, log_level='warning'))
+    try:
+        await servidor.serve()
+    finally:
+        aplicacao.leitores.fechar()
+        aplicacao.cache_localizacao.parar()
+
+def main():
+    try:
+        import uvicorn
+    except ImportError:
+        print("❌ O modo assíncrono precisa do uvicorn: pip install uvicorn[standard]")
+        return 1
+    asyncio.run(executar(uvicorn))
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
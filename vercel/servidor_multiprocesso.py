@@ -0,0 +1,85 @@
+"""Servidor com vários processos web na mesma porta.
+
+Uso:
+    python servidor_multiprocesso.py
+
+O processo coordenador carrega o estado, lê as portas seriais, persiste os
+acessos e expõe o serviço central por um broker local (app.ENDERECO_BROKER).
+Os processos web (app.PROCESSOS_WEB) compartilham o socket de escuta e
+atendem HTTP e Socket.IO chamando o serviço pelo broker; os broadcasts do
+painel passam pela fila de mensagens (app.MESSAGE_QUEUE_SOCKETIO) e chegam
+aos clientes de todos os processos.
+"""
+import multiprocessing
+import signal
+import socket
+import sys
+import time
+
+# ===== CONFIGURAÇÕES =====
+HOST = '0.0.0.0'
+PORTA_HTTP = 5000
+INTERVALO_SUPERVISAO = 1  # Segundos entre verificações dos processos web
+
+# ===== PROCESSO WEB =====
+
+def executar_processo_web(numero, sock):
+    """Atende HTTP/Socket.IO no socket compartilhado usando o serviço do coordenador."""
+    from werkzeug.serving import make_server
+
+    import app as aplicacao
+    from broker import conectar_broker
+
+    aplicacao.servico = conectar_broker(aplicacao.ENDERECO_BROKER, aplicacao.CHAVE_BROKER)
+    servidor = make_server(HOST, PORTA_HTTP, aplicacao.app, threaded=True, fd=sock.fileno())
+    print(f"🧵 Processo web {numero} atendendo em http://localhost:{PORTA_HTTP}")
+    servidor.serve_forever()
+
+# ===== COORDENADOR =====
+
+def main():
+    import app as aplicacao
+    from broker import iniciar_broker
+
+    if aplicacao.PROCESSOS_WEB > 1 and not aplicacao.MESSAGE_QUEUE_SOCKETIO:
+        print("❌ Configure MESSAGE_QUEUE_SOCKETIO para usar mais de um processo web")
+        return 1
+
+    # Coordenador: único processo que escreve no armazenamento e lê as portas seriais
+    aplicacao.iniciar_sistema()
+    iniciar_broker(aplicacao.servico, aplicacao.ENDERECO_BROKER, aplicacao.CHAVE_BROKER)
+
+    sock = socket.create_server((HOST, PORTA_HTTP))
+    # "spawn": os processos web não herdam threads nem locks do coordenador
+    contexto = multiprocessing.get_context("spawn")
+
+    def iniciar_processo(numero):
+        processo = contexto.Process(target=executar_processo_web, args=(numero, sock), daemon=True)
+        processo.start()
+        return processo
+
+    processos = [iniciar_processo(numero) for numero in range(aplicacao.PROCESSOS_WEB)]
+    print(f"🚀 Servidor Central iniciado em http://localhost:{PORTA_HTTP} com {len(processos)} processos web")
+    print(f"🆔 ID do Sistema: {aplicacao.SISTEMA_ID}")
+
+    # SIGTERM encerra como Ctrl+C, para que o atexit drene a fila de escrita
+    signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+    try:
+        while True:
+            time.sleep(INTERVALO_SUPERVISAO)
+            for numero, processo in enumerate(processos):
+                if not processo.is_alive():
+                    print(f"⚠️ Processo web {numero} terminou (código {processo.exitcode}); reiniciando")
+                    processos[numero] = iniciar_processo(numero)
+    except (KeyboardInterrupt, SystemExit):
+        print("Encerrando processos web...")
+    finally:
+        for processo in processos:
+            processo.terminate()
+        for processo in processos:
+            processo.join(5)
+        sock.close()
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
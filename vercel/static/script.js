@@ -1,23 +1,37 @@
 // Variáveis globais
 let socket;
+let estado = null;      // Cópia local de /api/dados, mantida por deltas
+let seqAtual = null;    // Versão do estado local (null = precisa sincronizar)
+let cartoesCarregados = {};  // Páginas de /api/cartoes já carregadas (uid -> resumo)
+let cursorCartoes = null;    // Cursor da próxima página (null = não há mais)
+let filtroPrefixo = '';
+let temporizadorFiltro = null;
 
 // Inicialização
 document.addEventListener('DOMContentLoaded', function() {
     conectarWebSocket();
     carregarDados();
     
-    // Atualizar a cada 3 segundos (fallback)
-    setInterval(carregarDados, 3000);
+    // Fallback: só consulta a API enquanto o WebSocket estiver desconectado
+    setInterval(function() {
+        if (!socket || !socket.connected) {
+            carregarDados();
+        }
+    }, 3000);
 });
 
 // Conectar WebSocket
 function conectarWebSocket() {
-    socket = io();
+    // WebSocket primeiro: com vários processos web o long-polling exigiria sessão fixa
+    socket = io({transports: ['websocket', 'polling']});
     
     socket.on('connect', function() {
         console.log('Conectado ao servidor');
         atualizarStatus(true, 'Conectado');
         mostrarAlerta('Conectado ao servidor', 'success');
+        
+        // Deltas podem ter sido perdidos enquanto desconectado
+        carregarDados();
     });
     
     socket.on('disconnect', function() {
@@ -26,22 +40,29 @@ function conectarWebSocket() {
         mostrarAlerta('Desconectado do servidor', 'warning');
     });
     
+    // Ressincronização completa pedida pelo servidor
     socket.on('dados_atualizados', function(data) {
         console.log('Dados atualizados recebidos');
         carregarDados();
-        mostrarAlerta('Novo acesso detectado!', 'info');
+    });
+    
+    // Delta versionado: aplicado localmente, sem buscar /api/dados
+    socket.on('delta', function(delta) {
+        aplicarDelta(delta);
     });
 }
 
-// Carregar dados da API
+// Carregar dados da API (sincronização completa)
 async function carregarDados() {
     try {
-        const response = await fetch('/api/dados');
+        // Revalida com ETag: sem mudanças o servidor responde 304 sem corpo
+        const response = await fetch('/api/dados?cartoes=0', {cache: 'no-cache'});
         const data = await response.json();
         
-        atualizarEstatisticas(data.stats);
-        atualizarTabelaAcessos(data.last_accesses);
-        atualizarTabelaCartoes(data.cards);
+        estado = data;
+        seqAtual = data.seq;
+        renderizar();
+        await carregarCartoes(true);
         atualizarStatus(true, 'Conectado');
         
     } catch (error) {
@@ -50,6 +71,84 @@ async function carregarDados() {
     }
 }
 
+// Aplicar delta recebido pelo WebSocket
+function aplicarDelta(delta) {
+    if (estado === null || seqAtual === null) {
+        return;  // Sincronização completa em andamento
+    }
+    
+    // Delta já contido no estado local (chegou depois de uma sincronização)
+    if (delta.ate <= seqAtual) {
+        return;
+    }
+    
+    // Lacuna na sequência: ressincronizar
+    if (delta.de !== seqAtual) {
+        console.log(`Lacuna nos deltas (local ${seqAtual}, recebido ${delta.de}), ressincronizando`);
+        seqAtual = null;
+        carregarDados();
+        return;
+    }
+    
+    const tamanhoFeed = Math.max(estado.last_accesses.length, 10);
+    // Intercalar pela data: um acesso reenviado pode ser mais antigo que os exibidos
+    estado.last_accesses = delta.acessos.concat(estado.last_accesses)
+        .sort((a, b) => (a.timestamp < b.timestamp ? 1 : a.timestamp > b.timestamp ? -1 : 0))
+        .slice(0, tamanhoFeed);
+    aplicarCartoesDelta(delta.cartoes);
+    estado.stats = delta.stats;
+    estado.seq = delta.ate;
+    seqAtual = delta.ate;
+    
+    renderizar();
+    mostrarAlerta('Novo acesso detectado!', 'info');
+}
+
+// Renderizar o estado local
+function renderizar() {
+    atualizarEstatisticas(estado.stats);
+    atualizarTabelaAcessos(estado.last_accesses);
+    atualizarTabelaCartoes(cartoesCarregados);
+}
+
+// Carregar cartões paginados (reiniciar = voltar à primeira página)
+async function carregarCartoes(reiniciar) {
+    try {
+        const params = new URLSearchParams({ limite: 50 });
+        if (filtroPrefixo) params.set('prefixo', filtroPrefixo);
+        if (!reiniciar && cursorCartoes) params.set('cursor', cursorCartoes);
+        
+        const response = await fetch(`/api/cartoes?${params}`);
+        const data = await response.json();
+        
+        if (reiniciar) cartoesCarregados = {};
+        data.cartoes.forEach(cartao => { cartoesCarregados[cartao.uid] = cartao; });
+        cursorCartoes = data.proximo_cursor;
+        
+        atualizarTabelaCartoes(cartoesCarregados);
+        document.getElementById('btnMaisCartoes').classList.toggle('d-none', !cursorCartoes);
+    } catch (error) {
+        console.error('Erro ao carregar cartões:', error);
+    }
+}
+
+// Filtrar cartões por prefixo de UID
+function filtrarCartoes(valor) {
+    filtroPrefixo = valor.trim().toUpperCase();
+    clearTimeout(temporizadorFiltro);
+    temporizadorFiltro = setTimeout(() => carregarCartoes(true), 300);
+}
+
+// Atualizar cartões recebidos no delta que estão dentro das páginas carregadas
+function aplicarCartoesDelta(cartoes) {
+    Object.entries(cartoes).forEach(([uid, resumo]) => {
+        if (filtroPrefixo && !uid.startsWith(filtroPrefixo)) return;
+        if (uid in cartoesCarregados || cursorCartoes === null || uid <= cursorCartoes) {
+            cartoesCarregados[uid] = { ...resumo, uid: uid };
+        }
+    });
+}
+
 // Atualizar estatísticas
 function atualizarEstatisticas(stats) {
     document.getElementById('totalCartoes').textContent = stats.total_cartoes;
@@ -113,7 +212,7 @@ function atualizarTabelaAcessos(acessos) {
 // Atualizar tabela de cartões
 function atualizarTabelaCartoes(cartoes) {
     const tbody = document.getElementById('tabelaCartoes');
-    const entries = Object.entries(cartoes);
+    const entries = Object.entries(cartoes).sort(([a], [b]) => (a < b ? -1 : a > b ? 1 : 0));
     
     if (entries.length === 0) {
         tbody.innerHTML = `
@@ -0,0 +1,144 @@
+import math
+import threading
+import time
+from collections import deque
+from datetime import datetime
+
+# ===== JANELA DE DISPOSITIVOS RECENTES =====
+
+def instante_epoch(timestamp):
+    """Converte um timestamp ISO em segundos desde a época (ou None se inválido)."""
+    try:
+        return datetime.fromisoformat(timestamp).timestamp()
+    except (TypeError, ValueError):
+        return None
+
+class JanelaDispositivos:
+    """Anel de tamanho fixo por cartão com os últimos (dispositivo, instante, lat, lon).
+
+    Mantido em memória a cada acesso, para que as regras de suspeita não
+    precisem percorrer o histórico do cartão.
+    """
+
+    def __init__(self, tamanho=5):
+        self.tamanho = tamanho
+        self._aneis = {}
+
+    def registrar(self, uid, registro):
+        """Registra um acesso (RegistroAcesso) no anel do cartão."""
+        anel = self._aneis.get(uid)
+        if anel is None:
+            anel = self._aneis[uid] = deque(maxlen=self.tamanho)
+        lat, lon = registro.coordenadas()
+        anel.append((registro.dispositivo, instante_epoch(registro.timestamp), lat, lon))
+
+    def recentes(self, uid):
+        """Entradas do cartão, da mais antiga à mais recente (vazio se não houver)."""
+        return self._aneis.get(uid, ())
+
+    def construir(self, cartoes):
+        self._aneis = {}
+        for uid, info in cartoes.items():
+            for dados_acesso in info.get("acessos", [])[-self.tamanho:]:
+                self.registrar(uid, dados_acesso)
+
+# ===== REGRAS =====
+
+RAIO_TERRA_KM = 6371.0
+
+def distancia_km(lat1, lon1, lat2, lon2):
+    """Distância em km entre dois pontos (fórmula de haversine)."""
+    fi1, fi2 = math.radians(lat1), math.radians(lat2)
+    dfi = fi2 - fi1
+    dlambda = math.radians(lon2 - lon1)
+    a = math.sin(dfi / 2) ** 2 + math.cos(fi1) * math.cos(fi2) * math.sin(dlambda / 2) ** 2
+    return 2 * RAIO_TERRA_KM * math.asin(math.sqrt(a))
+
+class RegrasSuspeita:
+    """Regras configuráveis avaliadas sobre a janela de dispositivos recentes.
+
+    - dispositivo diferente: o cartão passou por outro dispositivo dentro de
+      `janela_segundos` (None = qualquer entrada da janela), exceto se os dois
+      dispositivos estiverem no mesmo grupo permitido;
+    - viagem impossível: o deslocamento desde um acesso em outro dispositivo
+      exigiria mais que `velocidade_maxima_kmh` (None desativa).
+
+    A avaliação para ao estourar `orcamento_us` microssegundos; o acesso é
+    então decidido com as regras já avaliadas e o estouro é contabilizado.
+    """
+
+    def __init__(self, janela_segundos=None, velocidade_maxima_kmh=None,
+                 grupos_permitidos=None, orcamento_us=200):
+        self.janela_segundos = janela_segundos
+        self.velocidade_maxima_kmh = velocidade_maxima_kmh
+        self.orcamento_ns = int(orcamento_us * 1000)
+        self._grupos = {}
+        for indice, grupo in enumerate(grupos_permitidos or []):
+            for dispositivo in grupo:
+                self._grupos.setdefault(dispositivo, set()).add(indice)
+
+        self._lock = threading.Lock()
+        self.avaliacoes = 0
+        self.estouros_orcamento = 0
+        self.maior_tempo_ns = 0
+        self.por_motivo = {}
+
+    def _mesmo_grupo(self, dispositivo_a, dispositivo_b):
+        grupos_a = self._grupos.get(dispositivo_a)
+        return bool(grupos_a) and not grupos_a.isdisjoint(self._grupos.get(dispositivo_b, ()))
+
+    def _dispositivo_diferente(self, recentes, dispositivo, instante, lat, lon):
+        for disp, momento, _, _ in reversed(recentes):
+            if self.janela_segundos is not None:
+                if instante is None or momento is None or instante - momento > self.janela_segundos:
+                    break
+            if disp != dispositivo and not self._mesmo_grupo(disp, dispositivo):
+                return True
+        return False
+
+    def _viagem_impossivel(self, recentes, dispositivo, instante, lat, lon):
+        if self.velocidade_maxima_kmh is None or lat is None or lon is None or instante is None:
+            return False
+        for disp, momento, lat_anterior, lon_anterior in reversed(recentes):
+            if disp == dispositivo or momento is None or lat_anterior is None or lon_anterior is None:
+                continue
+            distancia = distancia_km(lat_anterior, lon_anterior, lat, lon)
+            horas = max(instante - momento, 1.0) / 3600
+            # Só o acesso em outro dispositivo mais recente com coordenadas importa
+            return distancia / horas > self.velocidade_maxima_kmh
+        return False
+
+    def avaliar(self, recentes, dispositivo, instante, lat=None, lon=None):
+        """Retorna o motivo da suspeita ("dispositivo_diferente", "viagem_impossivel") ou None."""
+        inicio = time.perf_counter_ns()
+        motivo = None
+        estourou = False
+        for nome, regra in (("dispositivo_diferente", self._dispositivo_diferente),
+                            ("viagem_impossivel", self._viagem_impossivel)):
+            if time.perf_counter_ns() - inicio > self.orcamento_ns:
+                estourou = True
+                break
+            if regra(recentes, dispositivo, instante, lat, lon):
+                motivo = nome
+                break
+        decorrido = time.perf_counter_ns() - inicio
+
+        with self._lock:
+            self.avaliacoes += 1
+            if estourou:
+                self.estouros_orcamento += 1
+            if decorrido > self.maior_tempo_ns:
+                self.maior_tempo_ns = decorrido
+            if motivo:
+                self.por_motivo[motivo] = self.por_motivo.get(motivo, 0) + 1
+        return motivo
+
+    def metricas(self):
+        with self._lock:
+            return {
+                "avaliacoes": self.avaliacoes,
+                "suspeitos_por_motivo": dict(self.por_motivo),
+                "estouros_orcamento": self.estouros_orcamento,
+                "orcamento_us": self.orcamento_ns / 1000,
+                "maior_tempo_us": round(self.maior_tempo_ns / 1000, 3)
+            }
@@ -0,0 +1,56 @@
+import importlib
+import os
+import sys
+
+import pytest
+
+from broker import BrokerLocal
+
+LOCALIZACAO = {"lat": -23.55, "lon": -46.63}
+
+@pytest.fixture(scope="module")
+def aplicacao(tmp_path_factory):
+    """app importado num diretório temporário (diário, snapshot e arquivo ficam lá)."""
+    diretorio_anterior = os.getcwd()
+    os.chdir(tmp_path_factory.mktemp("app"))
+    sys.modules.pop("app", None)
+    aplicacao = importlib.import_module("app")
+    aplicacao.repositorio.carregar()
+    aplicacao.fila_escrita.iniciar()
+    yield aplicacao
+    aplicacao.fila_escrita.encerrar()
+    aplicacao.diario.fechar()
+    sys.modules.pop("app", None)
+    os.chdir(diretorio_anterior)
+
+@pytest.fixture
+def servico(aplicacao):
+    return BrokerLocal(aplicacao.ServicoCentral())
+
+def test_registrar_acesso_e_status(aplicacao, servico):
+    assert servico.registrar_acesso("A1B2C3D4", "DISPOSITIVO_REMOTO_01", LOCALIZACAO, "evt-1") == "registrado"
+
+    status = servico.status()
+    assert status["cartoes_cadastrados"] == 1
+    assert status["sistema_id"] == aplicacao.SISTEMA_ID
+    assert status["idempotencia"]["chaves"] == 1
+
+    # Drenar a fila de escrita: o painel é atualizado pelo worker
+    aplicacao.fila_escrita.encerrar()
+    aplicacao.fila_escrita.iniciar()
+    dados = servico.dados_painel()
+    assert dados["stats"]["total_acessos"] == 1
+    assert dados["last_accesses"][0]["uid"] == "A1B2C3D4"
+    assert dados["last_accesses"][0]["dispositivo"] == "DISPOSITIVO_REMOTO_01"
+
+def test_reenvio_duplicado(servico):
+    assert servico.registrar_acesso("E5F6A7B8", "DISPOSITIVO_REMOTO_01", LOCALIZACAO, "evt-2") == "registrado"
+    assert servico.registrar_acesso("E5F6A7B8", "DISPOSITIVO_REMOTO_01", LOCALIZACAO, "evt-2") == "duplicado"
+
+def test_registrar_lote(servico):
+    resultados = servico.registrar_lote("DISPOSITIVO_REMOTO_01", [
+        {"uid": "C0FFEE01", "id_evento": "lote-1", "timestamp": "2024-05-01T10:00:00", "localizacao": LOCALIZACAO},
+        {"uid": "C0FFEE01", "id_evento": "lote-1", "timestamp": "2024-05-01T10:00:00", "localizacao": LOCALIZACAO},
+        {"uid": "C0FFEE01"}
+    ])
+    assert [r["status"] for r in resultados] == ["registrado", "duplicado", "rejeitado"]
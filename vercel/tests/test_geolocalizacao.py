@@ -0,0 +1,118 @@
+import json
+import time
+
+from geolocalizacao import CacheGeolocalizacao, localizacao_desconhecida
+
+def localizacao(cidade):
+    return {"ip": "203.0.113.7", "cidade": cidade, "regiao": "SP", "pais": "Brasil",
+            "lat": -23.55, "lon": -46.63, "isp": "Teste"}
+
+class ProvedorFalso:
+    """Devolve as respostas configuradas em ordem (a última se repete)."""
+
+    def __init__(self, *respostas):
+        self.respostas = list(respostas)
+        self.consultas = 0
+
+    def consultar(self):
+        self.consultas += 1
+        resposta = self.respostas[min(self.consultas, len(self.respostas)) - 1]
+        if isinstance(resposta, Exception):
+            raise resposta
+        return resposta
+
+def esperar(condicao, limite=2.0):
+    fim = time.monotonic() + limite
+    while not condicao():
+        if time.monotonic() > fim:
+            return False
+        time.sleep(0.01)
+    return True
+
+def test_sem_consulta_bem_sucedida_usa_localizacao_desconhecida():
+    cache = CacheGeolocalizacao(ProvedorFalso(ConnectionError("sem rede")), intervalo_retentativa=60)
+    try:
+        assert cache.obter() == localizacao_desconhecida()
+        assert esperar(lambda: cache.provedor.consultas == 1)
+        assert cache.obter() == localizacao_desconhecida()
+        assert cache.expirado()
+    finally:
+        cache.parar()
+
+def test_falha_mantem_ultimo_valor():
+    cache = CacheGeolocalizacao(ProvedorFalso(localizacao("São Paulo"), None, ValueError("resposta inválida")))
+    try:
+        cache.iniciar()
+        assert esperar(lambda: cache.obter()["cidade"] == "São Paulo")
+        assert not cache.atualizar()  # provedor sem resultado
+        assert not cache.atualizar()  # provedor com erro
+        assert cache.obter()["cidade"] == "São Paulo"
+        assert not cache.expirado()
+    finally:
+        cache.parar()
+
+def test_ttl_expira_e_thread_renova():
+    provedor = ProvedorFalso(localizacao("Campinas"), localizacao("Santos"))
+    cache = CacheGeolocalizacao(provedor, ttl=0.2)
+    try:
+        cache.iniciar()
+        assert esperar(lambda: cache.obter()["cidade"] == "Campinas")
+        assert not cache.expirado()
+        # Vencido o TTL, a thread consulta de novo sem ninguém pedir
+        assert esperar(lambda: cache.obter()["cidade"] == "Santos")
+        assert provedor.consultas >= 2
+    finally:
+        cache.parar()
+
+def test_retentativa_apos_falha():
+    provedor = ProvedorFalso(ConnectionError("sem rede"), localizacao("Sorocaba"))
+    cache = CacheGeolocalizacao(provedor, ttl=60, intervalo_retentativa=0.05)
+    try:
+        cache.iniciar()
+        assert esperar(lambda: cache.obter()["cidade"] == "Sorocaba")
+        assert provedor.consultas == 2
+    finally:
+        cache.parar()
+
+def test_cache_em_disco(tmp_path):
+    arquivo = str(tmp_path / "cache.json")
+    cache = CacheGeolocalizacao(ProvedorFalso(localizacao("Recife")), ttl=60, arquivo_cache=arquivo)
+    assert cache.atualizar()
+
+    # Reinício dentro do TTL: valor do disco, sem consultar o provedor
+    provedor = ProvedorFalso(localizacao("Olinda"))
+    reiniciado = CacheGeolocalizacao(provedor, ttl=60, arquivo_cache=arquivo)
+    try:
+        reiniciado.iniciar()
+        assert reiniciado.obter()["cidade"] == "Recife"
+        assert not reiniciado.expirado()
+        time.sleep(0.1)
+        assert provedor.consultas == 0
+    finally:
+        reiniciado.parar()
+
+    # Valor do disco vencido: continua servido até a renovação (que falha aqui)
+    with open(arquivo, encoding="utf-8") as f:
+        dados = json.load(f)
+    dados["atualizado_em"] -= 120
+    with open(arquivo, "w", encoding="utf-8") as f:
+        json.dump(dados, f)
+    provedor = ProvedorFalso(ConnectionError("sem rede"))
+    vencido = CacheGeolocalizacao(provedor, ttl=60, arquivo_cache=arquivo, intervalo_retentativa=60)
+    try:
+        vencido.iniciar()
+        assert esperar(lambda: provedor.consultas == 1)
+        assert vencido.expirado()
+        assert vencido.obter()["cidade"] == "Recife"
+    finally:
+        vencido.parar()
+
+def test_cache_em_disco_corrompido(tmp_path):
+    arquivo = tmp_path / "cache.json"
+    arquivo.write_text("{não é json", encoding="utf-8")
+    cache = CacheGeolocalizacao(ProvedorFalso(None), arquivo_cache=str(arquivo), intervalo_retentativa=60)
+    try:
+        cache.iniciar()
+        assert cache.obter() == localizacao_desconhecida()
+    finally:
+        cache.parar()
@@ -0,0 +1,119 @@
+import asyncio
+import os
+import pty
+import sys
+import time
+
+import pytest
+
+from leitor_serial import GerenciadorLeitores
+
+pytestmark = pytest.mark.skipif(sys.platform == "win32", reason="requer pseudo-terminais (pty)")
+
+OPCOES = {"timeout_leitura": 0.1, "espera_inicializacao": 0, "backoff_inicial": 0.05, "backoff_maximo": 0.2}
+
+def esperar(condicao, limite=3.0):
+    fim = time.monotonic() + limite
+    while not condicao():
+        if time.monotonic() > fim:
+            return False
+        time.sleep(0.01)
+    return True
+
+class Arduino:
+    """Lado "Arduino" de um pty; a porta é um link simbólico, como um /dev/serial/by-id."""
+
+    def __init__(self, link):
+        self.link = link
+        self.conectar()
+
+    def conectar(self):
+        self.mestre, self._escravo = pty.openpty()
+        if os.path.lexists(self.link):
+            os.remove(self.link)
+        os.symlink(os.ttyname(self._escravo), self.link)
+
+    def desconectar(self):
+        if self.mestre is not None:
+            os.close(self.mestre)
+            os.close(self._escravo)
+            self.mestre = None
+
+    def escrever(self, dados):
+        os.write(self.mestre, dados)
+
+@pytest.fixture
+def arduino(tmp_path):
+    arduino = Arduino(str(tmp_path / "ttyACM0"))
+    yield arduino
+    arduino.desconectar()
+
+def test_callback_uma_vez_por_linha_e_reconexao(arduino):
+    recebidas = []
+    gerenciador = GerenciadorLeitores(
+        [{"porta": arduino.link, "dispositivo_id": "PORTARIA_A"}],
+        lambda dispositivo_id, linha, instante: recebidas.append((dispositivo_id, linha)),
+        **OPCOES
+    )
+    leitor = gerenciador.leitores["PORTARIA_A"]
+    try:
+        gerenciador.iniciar()
+        assert esperar(lambda: gerenciador.algum_conectado)
+
+        # Linha partida entre duas escritas e linhas vazias
+        arduino.escrever(b"A1B2C3D4\r\nE5F6")
+        arduino.escrever(b"A7B8\n\n")
+        assert esperar(lambda: len(recebidas) == 2)
+        time.sleep(0.2)
+        assert recebidas == [("PORTARIA_A", "A1B2C3D4"), ("PORTARIA_A", "E5F6A7B8")]
+
+        # Resposta ao Arduino pela mesma porta
+        assert gerenciador.enviar("PORTARIA_A", b"OK\n")
+        assert os.read(arduino.mestre, 16) == b"OK\n"
+
+        # Cabo desconectado: a leitura falha e o leitor volta ao ciclo de reconexão
+        arduino.desconectar()
+        assert esperar(lambda: not leitor.conectado)
+        arduino.conectar()
+        assert esperar(lambda: leitor.reconexoes == 1 and leitor.conectado)
+
+        arduino.escrever(b"C0FFEE01\n")
+        assert esperar(lambda: len(recebidas) == 3)
+        assert recebidas[-1] == ("PORTARIA_A", "C0FFEE01")
+        assert leitor.linhas_recebidas == 3
+    finally:
+        gerenciador.fechar()
+
+def test_leitura_no_laco_asyncio(arduino):
+    recebidas = []
+
+    async def cenario():
+        gerenciador = GerenciadorLeitores(
+            [{"porta": arduino.link, "dispositivo_id": "PORTARIA_B"}],
+            lambda dispositivo_id, linha, instante: recebidas.append((dispositivo_id, linha)),
+            **OPCOES
+        )
+        leitor = gerenciador.leitores["PORTARIA_B"]
+        gerenciador.iniciar_async()
+        try:
+            while not leitor.conectado:
+                await asyncio.sleep(0.01)
+            arduino.escrever(b"A1B2C3D4\n")
+            while not recebidas:
+                await asyncio.sleep(0.01)
+
+            arduino.desconectar()
+            while leitor.conectado:
+                await asyncio.sleep(0.01)
+            arduino.conectar()
+            while not (leitor.conectado and leitor.reconexoes == 1):
+                await asyncio.sleep(0.01)
+            arduino.escrever(b"C0FFEE01\n")
+            while len(recebidas) < 2:
+                await asyncio.sleep(0.01)
+        finally:
+            gerenciador.fechar()
+            await asyncio.sleep(0)
+
+    asyncio.run(asyncio.wait_for(cenario(), 5))
+    assert recebidas == [("PORTARIA_B", "A1B2C3D4"), ("PORTARIA_B", "C0FFEE01")]